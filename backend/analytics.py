@@ -0,0 +1,230 @@
+import asyncio
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+DAY_FORMAT = "%Y-%m-%d"
+
+# Materialized rollups: a single counters document plus one document per
+# day (keyed by DAY_FORMAT) holding the number of messages created that day.
+ROLLUP_ID = "global"
+COUNTER_FIELDS = (
+    "total_targets",
+    "connections_sent",
+    "connections_accepted",
+    "messages_sent",
+    "messages_replied",
+)
+
+
+def target_counts_pipeline() -> List[Dict[str, Any]]:
+    return [
+        {"$group": {
+            "_id": None,
+            "total_targets": {"$sum": 1},
+            "connections_accepted": {"$sum": {"$cond": [{"$eq": ["$connection_status", "connected"]}, 1, 0]}},
+        }},
+    ]
+
+
+def message_counts_pipeline(start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Status totals and per-day activity for ``[start, end)`` in one pass over ``messages``
+
+    Without a range the daily facet covers the whole collection.
+    """
+    daily_match = {"$match": {"created_at": {"$gte": start, "$lt": end}}} if start and end else None
+    return [
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "connections_sent": {"$sum": {"$cond": [
+                        {"$and": [
+                            {"$eq": ["$message_type", "connection_request"]},
+                            {"$eq": ["$status", "sent"]},
+                        ]}, 1, 0,
+                    ]}},
+                    "messages_sent": {"$sum": {"$cond": [{"$eq": ["$status", "sent"]}, 1, 0]}},
+                    "messages_replied": {"$sum": {"$cond": [{"$eq": ["$status", "replied"]}, 1, 0]}},
+                }},
+            ],
+            "daily": ([daily_match] if daily_match else []) + [
+                {"$group": {
+                    "_id": {"$dateToString": {"format": DAY_FORMAT, "date": "$created_at"}},
+                    "count": {"$sum": 1},
+                }},
+            ],
+        }},
+    ]
+
+
+def day_range(start_date: date, end_date: date) -> List[str]:
+    """Day keys from ``end_date`` back to ``start_date``, newest first"""
+    days = (end_date - start_date).days
+    return [(end_date - timedelta(days=i)).strftime(DAY_FORMAT) for i in range(days + 1)]
+
+
+async def compute_analytics(db, start_date: date, end_date: date) -> Dict[str, Any]:
+    """Dashboard counters with daily message activity for ``start_date..end_date`` (UTC, inclusive).
+
+    Runs one aggregation over ``targets`` and one over ``messages``
+    concurrently instead of a ``count_documents`` round trip per counter.
+    """
+    start = datetime.combine(start_date, time.min)
+    end = datetime.combine(end_date + timedelta(days=1), time.min)
+
+    target_rows, message_rows = await asyncio.gather(
+        db.targets.aggregate(target_counts_pipeline()).to_list(1),
+        db.messages.aggregate(message_counts_pipeline(start, end)).to_list(1),
+    )
+    targets = target_rows[0] if target_rows else {}
+    facets = message_rows[0] if message_rows else {"totals": [], "daily": []}
+    totals = facets["totals"][0] if facets["totals"] else {}
+    daily_counts = {row["_id"]: row["count"] for row in facets["daily"]}
+
+    counters = {field: totals.get(field, targets.get(field, 0)) for field in COUNTER_FIELDS}
+    return analytics_response(counters, daily_counts, start_date, end_date)
+
+
+def counter_summary(counters: Dict[str, int]) -> Dict[str, Any]:
+    """The counters plus the acceptance and reply rates derived from them"""
+    counters = {field: counters.get(field, 0) for field in COUNTER_FIELDS}
+    return {
+        **counters,
+        "acceptance_rate": round((counters["connections_accepted"] / max(counters["connections_sent"], 1)) * 100, 2),
+        "reply_rate": round((counters["messages_replied"] / max(counters["messages_sent"], 1)) * 100, 2),
+    }
+
+
+def analytics_response(counters: Dict[str, int], daily_counts: Dict[str, int], start_date: date, end_date: date) -> Dict[str, Any]:
+    return {
+        **counter_summary(counters),
+        "daily_activity": {day: daily_counts.get(day, 0) for day in day_range(start_date, end_date)},
+    }
+
+
+# Rollup maintenance
+def message_counter_deltas(message: Dict[str, Any]) -> Counter:
+    deltas = Counter()
+    if message.get("status") == "sent":
+        deltas["messages_sent"] += 1
+        if message.get("message_type") == "connection_request":
+            deltas["connections_sent"] += 1
+    elif message.get("status") == "replied":
+        deltas["messages_replied"] += 1
+    return deltas
+
+
+async def increment_counters(db, deltas: Dict[str, int]):
+    deltas = {field: value for field, value in deltas.items() if value}
+    if deltas:
+        await db.analytics_counters.update_one({"_id": ROLLUP_ID}, {"$inc": deltas}, upsert=True)
+
+
+async def record_target_created(db, target: Dict[str, Any]):
+    deltas = Counter(total_targets=1)
+    if target.get("connection_status") == "connected":
+        deltas["connections_accepted"] += 1
+    await increment_counters(db, deltas)
+
+
+async def record_target_status_change(db, old_status: Optional[str], new_status: Optional[str]):
+    if old_status == new_status:
+        return
+    delta = int(new_status == "connected") - int(old_status == "connected")
+    await increment_counters(db, {"connections_accepted": delta})
+
+
+async def record_messages_created(db, messages: Iterable[Dict[str, Any]]):
+    """Bump status counters and the per-day buckets for newly inserted messages"""
+    deltas = Counter()
+    per_day = Counter()
+    for message in messages:
+        deltas.update(message_counter_deltas(message))
+        per_day[message["created_at"].strftime(DAY_FORMAT)] += 1
+    day_updates = [
+        UpdateOne({"_id": day}, {"$inc": {"messages": count}}, upsert=True)
+        for day, count in per_day.items()
+    ]
+    await asyncio.gather(
+        increment_counters(db, deltas),
+        db.analytics_daily.bulk_write(day_updates, ordered=False) if day_updates else asyncio.sleep(0),
+    )
+
+
+async def read_analytics(db, start_date: date, end_date: date) -> Dict[str, Any]:
+    """Dashboard analytics from the rollup documents: one counters read plus one ranged daily read"""
+    counters, daily = await asyncio.gather(
+        db.analytics_counters.find_one({"_id": ROLLUP_ID}),
+        db.analytics_daily.find({
+            "_id": {"$gte": start_date.strftime(DAY_FORMAT), "$lte": end_date.strftime(DAY_FORMAT)}
+        }).to_list(None),
+    )
+    return analytics_response(counters or {}, {row["_id"]: row["messages"] for row in daily}, start_date, end_date)
+
+
+async def reconcile_rollups(db) -> Dict[str, Any]:
+    """Recompute the rollups from ``targets``/``messages`` and overwrite them.
+
+    Returns the drift that was corrected, as ``field -> (rollup, actual)``
+    for counters and ``day -> (rollup, actual)`` for daily buckets.
+    """
+    target_rows, message_rows, stored_counters, stored_daily = await asyncio.gather(
+        db.targets.aggregate(target_counts_pipeline()).to_list(1),
+        db.messages.aggregate(message_counts_pipeline()).to_list(1),
+        db.analytics_counters.find_one({"_id": ROLLUP_ID}),
+        db.analytics_daily.find({}).to_list(None),
+    )
+    targets = target_rows[0] if target_rows else {}
+    facets = message_rows[0] if message_rows else {"totals": [], "daily": []}
+    totals = facets["totals"][0] if facets["totals"] else {}
+    actual_counters = {field: totals.get(field, targets.get(field, 0)) for field in COUNTER_FIELDS}
+    actual_daily = {row["_id"]: row["count"] for row in facets["daily"] if row["_id"]}
+
+    stored_counters = stored_counters or {}
+    stored_daily = {row["_id"]: row["messages"] for row in stored_daily}
+    counter_drift = {
+        field: (stored_counters.get(field, 0), actual)
+        for field, actual in actual_counters.items()
+        if stored_counters.get(field, 0) != actual
+    }
+    daily_drift = {
+        day: (stored_daily.get(day, 0), actual_daily.get(day, 0))
+        for day in set(stored_daily) | set(actual_daily)
+        if stored_daily.get(day, 0) != actual_daily.get(day, 0)
+    }
+
+    await db.analytics_counters.replace_one({"_id": ROLLUP_ID}, actual_counters, upsert=True)
+    if daily_drift:
+        await db.analytics_daily.bulk_write([
+            UpdateOne({"_id": day}, {"$set": {"messages": actual}}, upsert=True)
+            for day, (_, actual) in daily_drift.items()
+        ], ordered=False)
+    return {"counters": counter_drift, "daily": daily_drift}
+
+
+async def ensure_rollups(db):
+    """Build the rollups on first start against a database that predates them"""
+    if await db.analytics_counters.find_one({"_id": ROLLUP_ID}) is None:
+        await reconcile_rollups(db)
+
+
+if __name__ == "__main__":
+    import os
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        drift = await reconcile_rollups(client[os.environ['DB_NAME']])
+        print(f"Counter drift corrected: {drift['counters'] or 'none'}")
+        print(f"Daily buckets corrected: {len(drift['daily'])}")
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Keep the job document bounded even when a whole campaign fails
+MAX_RECORDED_ERRORS = 100
+
+
+async def run_message_batch(
+    db,
+    job_id: str,
+    targets: AsyncIterator[Dict[str, Any]],
+    generate: Callable[[Dict[str, Any], str], Awaitable[Dict[str, Any]]],
+    providers: List[str],
+    concurrency: int = 16,
+    flush_size: int = 100,
+    flush_interval: float = 1.0,
+    after_insert: Optional[Callable[[List[Dict[str, Any]]], Awaitable[Any]]] = None,
+):
+    """Generate one message per target with a bounded pool of workers.
+
+    Targets are streamed from ``targets`` into a bounded queue so large
+    campaigns never sit in memory at once. Worker ``i`` sends its requests
+    to ``providers[i % len(providers)]``, spreading load across the
+    configured LLM backends. Generated messages are written with
+    ``insert_many`` every ``flush_size`` rows (or ``flush_interval`` seconds),
+    and progress counters on the ``batch_jobs`` document are bumped with each
+    flush. ``after_insert`` is awaited with each inserted chunk.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    pending: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    failed = 0
+    flush_lock = asyncio.Lock()
+    last_flush = time.monotonic()
+
+    async def flush(force: bool = False):
+        nonlocal failed, errors, last_flush
+        async with flush_lock:
+            due = time.monotonic() - last_flush >= flush_interval
+            if not force and not due and len(pending) < flush_size:
+                return
+            last_flush = time.monotonic()
+            batch, pending[:] = pending[:], []
+            batch_failed, failed = failed, 0
+            batch_errors, errors = errors, []
+            if batch:
+                await db.messages.insert_many(batch, ordered=False)
+                if after_insert is not None:
+                    await after_insert(batch)
+            update: Dict[str, Any] = {"$inc": {"completed": len(batch), "failed": batch_failed}}
+            if batch_errors:
+                update["$push"] = {"errors": {"$each": batch_errors, "$slice": MAX_RECORDED_ERRORS}}
+            await db.batch_jobs.update_one({"id": job_id}, update)
+
+    async def worker(provider: str):
+        nonlocal failed
+        while True:
+            target = await queue.get()
+            try:
+                if target is None:
+                    return
+                try:
+                    pending.append(await generate(target, provider))
+                except Exception as e:
+                    failed += 1
+                    errors.append({"target_id": target.get("id"), "provider": provider, "error": str(e)})
+                await flush()
+            finally:
+                queue.task_done()
+
+    await db.batch_jobs.update_one(
+        {"id": job_id}, {"$set": {"status": "running", "started_at": datetime.utcnow()}}
+    )
+    workers = [
+        asyncio.create_task(worker(providers[i % len(providers)]))
+        for i in range(concurrency)
+    ]
+    try:
+        async for target in targets:
+            await queue.put(target)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        await flush(force=True)
+        await db.batch_jobs.update_one(
+            {"id": job_id}, {"$set": {"status": "completed", "finished_at": datetime.utcnow()}}
+        )
+    except Exception as e:
+        logger.error(f"Batch job {job_id} failed: {e}")
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Keep what was generated before the failure, and counters that match it
+        try:
+            await flush(force=True)
+        except Exception as flush_error:
+            logger.error(f"Batch job {job_id} could not save its generated messages: {flush_error}")
+        await db.batch_jobs.update_one(
+            {"id": job_id},
+            {"$set": {"status": "failed", "finished_at": datetime.utcnow(), "error": str(e)}},
+        )
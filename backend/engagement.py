@@ -0,0 +1,139 @@
+"""Time-decayed engagement ranking for viral posts.
+
+A post's engagement is a weighted sum of its reactions, comments and shares
+that halves every ``half_life_hours`` after it was scraped. Exponential
+decay shrinks every post by the same factor as time passes, so ranking by
+decayed engagement is the same as ranking by
+
+    hot_score = log1p(weighted) + scraped_at_seconds * ln(2) / half_life_seconds
+
+which stays fixed while a post's counts do. Scores are written once per
+post, and ``EngagementRanker.rescore`` recomputes the whole collection with
+NumPy and bulk-writes only the scores that changed (new posts, counts
+updated by a scraper, or new weights/half-life). Top-K lists per time
+window are served from a short-lived in-process cache.
+"""
+import math
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+DEFAULT_WEIGHTS = {"reactions": 1.0, "comments": 3.0, "shares": 5.0}
+
+_WINDOW = re.compile(r"^(\d+)([hdw])$")
+_WINDOW_UNITS = {"h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """``"reactions:1,comments:3,shares:5"`` -> weights; fields left out keep their default"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        field, _, weight = part.partition(":")
+        if field not in DEFAULT_WEIGHTS:
+            raise ValueError(f"Unknown engagement field '{field}'")
+        weights[field] = float(weight)
+    return weights
+
+
+def parse_window(window: Optional[str]) -> Optional[timedelta]:
+    """``"24h"``, ``"7d"`` or ``"2w"`` -> timedelta; None or ``"all"`` means no window"""
+    if window is None or window == "all":
+        return None
+    match = _WINDOW.match(window)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid window '{window}', expected e.g. 24h, 7d, 2w or all")
+    return timedelta(**{_WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def epoch_seconds(values: Sequence[Optional[datetime]]) -> np.ndarray:
+    """Naive-UTC datetimes to float seconds, truncated to the milliseconds BSON keeps; missing values become 0"""
+    stamps = np.array(values, dtype="datetime64[ms]")
+    return np.where(np.isnat(stamps), 0, stamps.astype(np.int64)) / 1e3
+
+
+def weighted_engagement(reactions, comments, shares, weights: Dict[str, float] = DEFAULT_WEIGHTS) -> np.ndarray:
+    return (
+        weights["reactions"] * np.asarray(reactions, dtype=np.float64)
+        + weights["comments"] * np.asarray(comments, dtype=np.float64)
+        + weights["shares"] * np.asarray(shares, dtype=np.float64)
+    )
+
+
+def hot_scores(reactions, comments, shares, scraped_at: np.ndarray, weights: Dict[str, float] = DEFAULT_WEIGHTS, half_life_hours: float = 48.0) -> np.ndarray:
+    """Time-invariant ranking scores; ``scraped_at`` is in epoch seconds (see ``epoch_seconds``)"""
+    engagement = np.maximum(weighted_engagement(reactions, comments, shares, weights), 0)
+    return np.log1p(engagement) + scraped_at * (math.log(2) / (half_life_hours * 3600))
+
+
+class EngagementRanker:
+    """Computes, stores and serves ``hot_score`` rankings for a posts collection"""
+
+    FIELDS = ("reactions", "comments", "shares", "scraped_at")
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, half_life_hours: float = 48.0, cache_seconds: float = 60.0, batch_size: int = 5000):
+        self.weights = weights or dict(DEFAULT_WEIGHTS)
+        self.half_life_hours = half_life_hours
+        self.cache_seconds = cache_seconds
+        self.batch_size = batch_size
+        self._top: Dict[Tuple[Optional[float], int], Tuple[float, List[Dict[str, Any]]]] = {}
+
+    def score(self, posts: Sequence[Dict[str, Any]]) -> np.ndarray:
+        return hot_scores(
+            [post.get("reactions") or 0 for post in posts],
+            [post.get("comments") or 0 for post in posts],
+            [post.get("shares") or 0 for post in posts],
+            epoch_seconds([post.get("scraped_at") for post in posts]),
+            self.weights,
+            self.half_life_hours,
+        )
+
+    def weighted(self, post: Dict[str, Any]) -> float:
+        return float(weighted_engagement(post.get("reactions") or 0, post.get("comments") or 0, post.get("shares") or 0, self.weights))
+
+    def invalidate(self):
+        self._top.clear()
+
+    async def rescore(self, collection) -> Dict[str, int]:
+        """Recompute every post's ``hot_score``; only changed scores are written back"""
+        scored = updated = 0
+        batch: List[Dict[str, Any]] = []
+
+        async def flush():
+            nonlocal scored, updated
+            scores = self.score(batch)
+            stored = np.array([post.get("hot_score", np.nan) for post in batch], dtype=np.float64)
+            changed = np.flatnonzero(~np.isclose(scores, stored, rtol=0, atol=1e-9))
+            if len(changed):
+                await collection.bulk_write(
+                    [UpdateOne({"id": batch[i]["id"]}, {"$set": {"hot_score": float(scores[i])}}) for i in changed],
+                    ordered=False,
+                )
+            scored += len(batch)
+            updated += len(changed)
+            batch.clear()
+
+        projection = {"_id": 0, "id": 1, "hot_score": 1, **{field: 1 for field in self.FIELDS}}
+        async for post in collection.find({}, projection).batch_size(self.batch_size):
+            batch.append(post)
+            if len(batch) >= self.batch_size:
+                await flush()
+        if batch:
+            await flush()
+        if updated:
+            self.invalidate()
+        return {"scored": scored, "updated": updated}
+
+    async def top(self, collection, window: Optional[timedelta] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Highest ``hot_score`` posts scraped within ``window``, cached for ``cache_seconds``"""
+        key = (window.total_seconds() if window else None, limit)
+        cached = self._top.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        query = {"scraped_at": {"$gte": datetime.utcnow() - window}} if window else {}
+        posts = await collection.find(query, {"_id": 0}).sort("hot_score", -1).limit(limit).to_list(limit)
+        self._top[key] = (time.monotonic() + self.cache_seconds, posts)
+        return posts
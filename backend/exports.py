@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Encoded rows are buffered up to this many bytes before each yield
+CHUNK_BYTES = 64 * 1024
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _csv_cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=_json_default)
+    return value
+
+
+async def iter_export_chunks(
+    documents: AsyncIterator[Dict[str, Any]],
+    fmt: str,
+    columns: Optional[List[str]] = None,
+    gzip: bool = False,
+) -> AsyncIterator[bytes]:
+    """Encode documents as NDJSON or CSV, yielding ~``CHUNK_BYTES`` byte chunks.
+
+    The first row is flushed on its own so clients start receiving bytes
+    as soon as the cursor returns its first batch. CSV output uses
+    ``columns`` as the header and column order. With ``gzip`` the stream is
+    a single gzip member compressed incrementally, so memory stays bounded
+    by the cursor batch plus one output chunk.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+
+    def drain(sync: bool = False) -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor is None:
+            return data
+        return compressor.compress(data) + (compressor.flush(zlib.Z_SYNC_FLUSH) if sync else b"")
+
+    first = True
+    async for doc in documents:
+        if writer is not None:
+            writer.writerow([_csv_cell(doc.get(column)) for column in columns])
+        else:
+            buffer.write(json.dumps(doc, default=_json_default, separators=(",", ":")))
+            buffer.write("\n")
+        if first or buffer.tell() >= CHUNK_BYTES:
+            chunk = drain(sync=first)
+            first = False
+            if chunk:
+                yield chunk
+
+    tail = drain()
+    if compressor:
+        tail += compressor.flush()
+    if tail:
+        yield tail
@@ -0,0 +1,227 @@
+"""MongoDB index declarations and query-plan verification.
+
+Indexes are created idempotently at startup. ``verify_query_plans`` runs
+``explain`` for every query shape the API issues and reports the ones that
+fall back to a collection scan:
+
+    python indexes.py            # create indexes
+    python indexes.py --verify   # create indexes, then fail on any COLLSCAN
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+def _unique_id() -> IndexModel:
+    return IndexModel([("id", ASCENDING)], unique=True, name="id_unique")
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "status_checks": [
+        _unique_id(),
+        IndexModel([("timestamp", ASCENDING), ("id", ASCENDING)], name="timestamp_id"),
+    ],
+    "targets": [
+        _unique_id(),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel([("connection_status", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="connection_status_created_at_id"),
+        IndexModel([("company", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="company_created_at_id"),
+        # Imports upsert on linkedin_url; unique so racing imports or POST /targets cannot duplicate a profile
+        IndexModel(
+            [("linkedin_url", ASCENDING)], unique=True, partialFilterExpression={"linkedin_url": {"$type": "string"}},
+            name="linkedin_url_unique",
+        ),
+        IndexModel([("updated_at", ASCENDING), ("id", ASCENDING)], name="updated_at_id"),
+        # /api/targets/search?mode=text; a collection allows one text index
+        IndexModel(
+            [(field, TEXT) for field in ("name", "company", "title", "location", "profile_summary")],
+            weights={"name": 10, "company": 5, "title": 5, "location": 2, "profile_summary": 1},
+            default_language="english",
+            name="targets_text",
+        ),
+    ],
+    "messages": [
+        _unique_id(),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel([("target_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="target_id_created_at_id"),
+        IndexModel([("status", ASCENDING), ("message_type", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="status_message_type_created_at_id"),
+        IndexModel([("message_type", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="message_type_created_at_id"),
+    ],
+    "viral_posts": [
+        _unique_id(),
+        IndexModel([("hot_score", DESCENDING), ("scraped_at", DESCENDING)], name="hot_score_desc_scraped_at_desc"),
+        # Imports upsert on linkedin_url; unique so racing imports cannot store a post twice
+        IndexModel([("linkedin_url", ASCENDING)], unique=True, name="linkedin_url_unique"),
+    ],
+    "generated_posts": [
+        _unique_id(),
+        IndexModel([("created_at", DESCENDING)], name="created_at_desc"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="status_created_at_id"),
+    ],
+    "batch_jobs": [
+        _unique_id(),
+    ],
+    "outreach_queue": [
+        IndexModel([("target_id", ASCENDING)], unique=True, name="target_id_unique"),
+        IndexModel([("status", ASCENDING), ("priority", DESCENDING), ("target_id", ASCENDING)], name="status_priority"),
+        IndexModel([("status", ASCENDING), ("planned_for", ASCENDING)], name="status_planned_for"),
+    ],
+    "send_plans": [
+        _unique_id(),
+    ],
+    "jobs": [
+        _unique_id(),
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease_expires_at"),
+        IndexModel([("created_at", DESCENDING)], name="created_at_desc"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at_desc"),
+    ],
+}
+
+_NOW = datetime(2024, 1, 1)
+_BY_CREATED = [("created_at", ASCENDING), ("id", ASCENDING)]
+
+# (collection, filter, sort) for every query the API issues; values are placeholders
+QUERY_SHAPES: List[Tuple[str, Dict[str, Any], List[Tuple[str, int]]]] = [
+    ("status_checks", {}, [("timestamp", ASCENDING), ("id", ASCENDING)]),
+    ("targets", {"id": "x"}, []),
+    ("targets", {"linkedin_url": "https://linkedin.com/in/x"}, []),
+    ("targets", {}, _BY_CREATED),
+    ("targets", {"connection_status": "connected"}, _BY_CREATED),
+    ("targets", {"company": "Acme"}, _BY_CREATED),
+    ("targets", {"$or": [{"created_at": {"$gt": _NOW}}, {"created_at": _NOW, "id": {"$gt": "x"}}]}, _BY_CREATED),
+    ("messages", {}, _BY_CREATED),
+    ("messages", {"target_id": "x"}, _BY_CREATED),
+    ("messages", {"target_id": "x"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("messages", {"status": "sent"}, _BY_CREATED),
+    ("messages", {"message_type": "follow_up"}, _BY_CREATED),
+    ("messages", {"created_at": {"$gte": _NOW, "$lt": _NOW}}, []),
+    ("viral_posts", {}, [("hot_score", DESCENDING)]),
+    ("viral_posts", {"scraped_at": {"$gte": _NOW}}, [("hot_score", DESCENDING)]),
+    ("viral_posts", {"linkedin_url": "https://www.linkedin.com/posts/x"}, []),
+    ("generated_posts", {}, [("created_at", DESCENDING)]),
+    ("generated_posts", {}, _BY_CREATED),
+    ("generated_posts", {"status": "draft"}, _BY_CREATED),
+    ("batch_jobs", {"id": "x"}, []),
+    ("outreach_queue", {"status": "queued"}, [("priority", DESCENDING), ("target_id", ASCENDING)]),
+    ("outreach_queue", {"status": "planned", "planned_for": "2024-01-01"}, []),
+    ("outreach_queue", {"target_id": {"$in": ["x"]}}, []),
+    ("targets", {"connection_status": {"$in": ["not_connected", "connected"]}}, []),
+    ("send_plans", {"id": "2024-01-01"}, []),
+    ("jobs", {"id": "x"}, []),
+    ("jobs", {"$or": [
+        {"status": "queued", "run_at": {"$lte": _NOW}},
+        {"status": "running", "lease_expires_at": {"$lt": _NOW}, "$expr": {"$lt": ["$attempts", "$max_attempts"]}},
+    ]}, [("run_at", ASCENDING)]),
+    ("jobs", {"status": "running", "lease_expires_at": {"$lt": _NOW}, "$expr": {"$gte": ["$attempts", "$max_attempts"]}}, []),
+    ("jobs", {}, [("created_at", DESCENDING)]),
+    ("jobs", {"status": "dead_letter"}, [("created_at", DESCENDING)]),
+    ("analytics_daily", {"_id": {"$gte": "2024-01-01", "$lte": "2024-01-07"}}, []),
+    # Live update polling (standalone MongoDB without change streams)
+    ("targets", {"updated_at": {"$gte": _NOW}}, [("updated_at", ASCENDING), ("id", ASCENDING)]),
+    ("messages", {"created_at": {"$gte": _NOW}}, _BY_CREATED),
+    ("generated_posts", {"created_at": {"$gte": _NOW}}, _BY_CREATED),
+    ("analytics_daily", {"_id": {"$in": ["2024-01-01"]}}, []),
+    # Target search
+    ("targets", {"$text": {"$search": "x"}}, []),
+    ("targets", {"id": {"$in": ["x"]}}, []),
+]
+
+
+async def ensure_indexes(db):
+    """Create every declared index; existing indexes with the same spec are left alone.
+
+    ``createIndexes`` is all-or-nothing, so each unique index is built in a
+    call of its own: values already stored more than once only cost that
+    index, and are logged so they can be cleaned up.
+    """
+    for collection, models in INDEXES.items():
+        unique = [model for model in models if model.document.get("unique")]
+        batches = [[model for model in models if not model.document.get("unique")]] + [[model] for model in unique]
+        for batch in batches:
+            if not batch:
+                continue
+            try:
+                await db[collection].create_indexes(batch)
+            except DuplicateKeyError:
+                name = batch[0].document["name"]
+                duplicates = await duplicate_keys(db[collection], batch[0])
+                logger.error(
+                    f"Index {name} on {collection} not created: these values are stored more than once "
+                    f"(showing up to {len(duplicates)}): {duplicates}"
+                )
+            except Exception as e:
+                logger.error(f"Index creation failed for {collection}: {e}")
+
+
+async def duplicate_keys(collection, model: IndexModel, limit: int = 20) -> List[Any]:
+    """Up to ``limit`` key values held by more than one document the index ``model`` covers"""
+    keys = list(model.document["key"])
+    group_id = f"${keys[0]}" if len(keys) == 1 else {key: f"${key}" for key in keys}
+    rows = await collection.aggregate([
+        {"$match": model.document.get("partialFilterExpression", {})},
+        {"$group": {"_id": group_id, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]).to_list(limit)
+    return [row["_id"] for row in rows]
+
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """All stage names in an explain plan tree"""
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    return stages
+
+
+async def verify_query_plans(db) -> List[str]:
+    """Explain each query shape; returns a description of every shape whose plan uses COLLSCAN"""
+    problems = []
+    for collection, query, sort in QUERY_SHAPES:
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = await db.command("explain", command, verbosity="queryPlanner")
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in plan_stages(winning_plan):
+            problems.append(f"{collection} filter={query} sort={sort}: COLLSCAN")
+    return problems
+
+
+if __name__ == "__main__":
+    import asyncio
+    import os
+    import sys
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    async def main() -> int:
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        await ensure_indexes(db)
+        print(f"Indexes ensured for {len(INDEXES)} collections")
+        status = 0
+        if "--verify" in sys.argv:
+            problems = await verify_query_plans(db)
+            for problem in problems:
+                print(problem)
+            print(f"{len(QUERY_SHAPES) - len(problems)}/{len(QUERY_SHAPES)} query shapes use an index")
+            status = 1 if problems else 0
+        client.close()
+        return status
+
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job cannot succeed"""
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, bursting up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class JobQueue:
+    """Mongo-backed job queue with leased claims and exponential backoff.
+
+    A worker claims a job by atomically flipping it to ``running`` with a
+    lease. Jobs whose lease has expired (the worker crashed or was
+    restarted) are claimable again, so queued work survives restarts.
+    Failed jobs go back to ``queued`` with a backoff delay until
+    ``max_attempts`` is exhausted, then move to ``dead_letter``; so do jobs
+    whose last attempt ended in an expired lease.
+    """
+
+    def __init__(
+        self,
+        collection,
+        lease_seconds: float = 120.0,
+        max_attempts: int = 5,
+        base_backoff: float = 2.0,
+        max_backoff: float = 300.0,
+    ):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next attempt: exponential with full jitter"""
+        ceiling = min(self.max_backoff, self.base_backoff * (2 ** max(attempts - 1, 0)))
+        return random.uniform(ceiling / 2, ceiling)
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], provider: Optional[str] = None) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "provider": provider,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "run_at": now,
+            "lease_expires_at": None,
+            "worker_id": None,
+            "result": None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.collection.insert_one(dict(job))
+        return job
+
+    async def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        # A job whose every attempt ended in an expired lease (it kills or hangs its worker) is not retried again
+        await self.collection.update_many(
+            {"status": "running", "lease_expires_at": {"$lt": now}, "$expr": {"$gte": ["$attempts", "$max_attempts"]}},
+            {"$set": {"status": "dead_letter", "last_error": "lease expired", "lease_expires_at": None, "updated_at": now}},
+        )
+        claimed = {
+            "status": "running",
+            "worker_id": worker_id,
+            "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+            "updated_at": now,
+        }
+        job = await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {"status": "running", "lease_expires_at": {"$lt": now}, "$expr": {"$lt": ["$attempts", "$max_attempts"]}},
+            ]},
+            {"$set": claimed, "$inc": {"attempts": 1}},
+            sort=[("run_at", 1)],
+            projection={"_id": 0},
+        )
+        if job is not None:
+            job.update(claimed)
+            job["attempts"] += 1
+        return job
+
+    async def extend_lease(self, job: Dict[str, Any]):
+        await self.collection.update_one(
+            {"id": job["id"], "worker_id": job["worker_id"], "status": "running"},
+            {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+        )
+
+    async def complete(self, job: Dict[str, Any], result: Any = None):
+        await self.collection.update_one(
+            {"id": job["id"], "worker_id": job["worker_id"]},
+            {"$set": {
+                "status": "completed",
+                "result": result,
+                "lease_expires_at": None,
+                "updated_at": datetime.utcnow(),
+            }},
+        )
+
+    async def fail(self, job: Dict[str, Any], error: str, retryable: bool = True):
+        now = datetime.utcnow()
+        update: Dict[str, Any] = {"last_error": error, "lease_expires_at": None, "updated_at": now}
+        if retryable and job["attempts"] < job.get("max_attempts", self.max_attempts):
+            update["status"] = "queued"
+            update["run_at"] = now + timedelta(seconds=self.backoff(job["attempts"]))
+        else:
+            update["status"] = "dead_letter"
+        await self.collection.update_one({"id": job["id"], "worker_id": job["worker_id"]}, {"$set": update})
+
+    async def requeue(self, job_id: str) -> bool:
+        """Move a dead-lettered job back onto the queue with a fresh attempt budget"""
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"id": job_id, "status": "dead_letter"},
+            {"$set": {"status": "queued", "attempts": 0, "run_at": now, "updated_at": now}},
+        )
+        return result.modified_count == 1
+
+
+class JobWorker:
+    """Runs queued jobs with up to ``concurrency`` in flight.
+
+    ``handlers`` maps a job ``kind`` to a coroutine taking the payload.
+    Before a handler runs, the job waits on the token bucket registered for
+    its ``provider`` so bursts of work are smoothed below the provider's
+    rate limits instead of surfacing as 429s. ``resolve_provider`` maps a
+    job's provider to the one that will serve it (e.g. "auto" to the
+    router's current choice) before the bucket is picked.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]],
+        rate_limiters: Optional[Dict[str, TokenBucket]] = None,
+        concurrency: int = 4,
+        poll_interval: float = 1.0,
+        resolve_provider: Optional[Callable[[str], str]] = None,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.rate_limiters = rate_limiters or {}
+        self.resolve_provider = resolve_provider
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"worker-{uuid.uuid4().hex[:8]}"
+        self._stopping = asyncio.Event()
+        self._tasks = []
+
+    def start(self):
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._run_slot()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        self._stopping.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_forever(self):
+        self.start()
+        await asyncio.gather(*self._tasks)
+
+    async def _run_slot(self):
+        while not self._stopping.is_set():
+            try:
+                job = await self.queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"Job claim error: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.process(job)
+            except Exception as e:
+                # e.g. Mongo unreachable while recording the outcome; the lease expires and the job is retried
+                logger.error(f"Job {job['id']} processing error: {e}")
+
+    async def process(self, job: Dict[str, Any]):
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await self.queue.fail(job, f"No handler for job kind '{job['kind']}'", retryable=False)
+            return
+
+        provider = job.get("provider")
+        if provider is not None and self.resolve_provider is not None:
+            provider = self.resolve_provider(provider)
+        limiter = self.rate_limiters.get(provider)
+
+        # Started before the rate limit wait, which can outlast the lease on a busy bucket
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if limiter is not None:
+                await limiter.acquire()
+            result = await handler(job["payload"])
+        except PermanentJobError as e:
+            await self.queue.fail(job, str(e), retryable=False)
+        except Exception as e:
+            logger.warning(f"Job {job['id']} attempt {job['attempts']} failed: {e}")
+            await self.queue.fail(job, str(e))
+        else:
+            await self.queue.complete(job, result)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: Dict[str, Any]):
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            await self.queue.extend_lease(job)
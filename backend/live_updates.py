@@ -0,0 +1,381 @@
+"""Live change feed for the dashboard.
+
+``LiveFeed`` turns writes to ``targets``, ``messages`` and
+``generated_posts``, and to the analytics rollups, into compact deltas and
+fans them out to subscribers (the ``/api/live`` Server-Sent Events stream):
+
+* ``{"collection": "targets", "op": "upsert", "id": ..., "doc": {...}}`` for new or replaced documents
+* ``{"collection": "targets", "op": "update", "id": ..., "fields": {...}, "removed": [...]}`` for partial updates
+* ``{"collection": "analytics", "op": "update", "fields": {...}}`` with the counters, rates and the
+  ``daily_activity`` days that changed
+* ``{"collection": "targets", "op": "resync"}`` when a client has to reload a list (deletes, or it
+  missed events)
+
+Changes come from a MongoDB change stream where the server supports one
+(replica sets, sharded clusters) and otherwise from polling each
+collection's timestamp field. Deltas are gathered for ``flush_interval``
+seconds and published as one batch with repeated changes to a document
+merged, so a batch generation of a thousand messages reaches clients as a
+handful of events. Batches carry increasing ids; a reconnecting client
+that sends the last id it saw is replayed what it missed from a bounded
+history, or told to resync.
+
+The source only runs while someone is subscribed, and stops
+``idle_timeout`` seconds after the last subscriber leaves. Database errors
+are retried; if the source fails anyway, open streams are ended so that
+clients reconnect and start it again.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from analytics import DAY_FORMAT, ROLLUP_ID, counter_summary
+
+logger = logging.getLogger(__name__)
+
+# Collection -> the timestamp field polling follows (set on insert, and on every update for targets)
+POLL_FIELDS = {"targets": "updated_at", "messages": "created_at", "generated_posts": "created_at"}
+ANALYTICS_COLLECTIONS = ("analytics_counters", "analytics_daily")
+# Server errors meaning change streams are unavailable (standalone mongod, old server)
+CHANGE_STREAM_UNSUPPORTED = {40573, 40324}
+CHANGE_STREAM_HISTORY_LOST = 286
+
+Batch = Tuple[int, List[Dict[str, Any]]]
+# Queued to subscribers when the source stops, ending their streams
+CLOSED = object()
+
+
+class ChangeStreamsUnsupported(Exception):
+    pass
+
+
+def change_stream_pipeline(collections) -> List[Dict[str, Any]]:
+    return [
+        {"$match": {
+            "ns.coll": {"$in": list(collections) + list(ANALYTICS_COLLECTIONS)},
+            "operationType": {"$in": ["insert", "replace", "update", "delete"]},
+        }},
+        {"$project": {
+            "operationType": 1, "ns": 1, "documentKey": 1, "fullDocument": 1,
+            "updateDescription.updatedFields": 1, "updateDescription.removedFields": 1,
+        }},
+    ]
+
+
+def change_delta(change: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The delta for one change stream event; None when there is nothing to send"""
+    collection = change["ns"]["coll"]
+    operation = change["operationType"]
+    if collection in ANALYTICS_COLLECTIONS:
+        day = change["documentKey"]["_id"] if collection == "analytics_daily" else None
+        return {"collection": "analytics", "op": "update", "day": day}
+    if operation == "delete":
+        return {"collection": collection, "op": "resync"}
+    document = change.get("fullDocument")
+    if document is None:
+        # Updated and then deleted before the lookup; the delete event follows
+        return None
+    document = {key: value for key, value in document.items() if key != "_id"}
+    if operation in ("insert", "replace"):
+        return {"collection": collection, "op": "upsert", "id": document["id"], "doc": document}
+    description = change.get("updateDescription") or {}
+    return {
+        "collection": collection,
+        "op": "update",
+        "id": document["id"],
+        "fields": {key: value for key, value in description.get("updatedFields", {}).items() if key != "_id"},
+        "removed": list(description.get("removedFields", [])),
+    }
+
+
+class LiveFeed:
+    """Collects deltas from a change stream (``mode="change_stream"``), polling (``"poll"``) or whichever works (``"auto"``)"""
+
+    STAT_KEYS = ("changes", "batches", "resyncs", "overflows")
+
+    def __init__(
+        self,
+        db,
+        collections=tuple(POLL_FIELDS),
+        mode: str = "auto",
+        poll_interval: float = 1.0,
+        poll_overlap: float = 2.0,
+        poll_limit: int = 500,
+        flush_interval: float = 0.25,
+        history: int = 1000,
+        queue_size: int = 100,
+        idle_timeout: float = 60.0,
+    ):
+        self.db = db
+        self.collections = tuple(collections)
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.poll_overlap = timedelta(seconds=poll_overlap)
+        self.poll_limit = poll_limit
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.idle_timeout = idle_timeout
+        self.source: Optional[str] = None  # "change_stream" or "poll" while running
+        # Ids continue from the clock, so an id from before a restart never looks current
+        self.last_event_id = int(time.time() * 1000)
+        self.stats = dict.fromkeys(self.STAT_KEYS, 0)
+        self._history: Deque[Batch] = deque(maxlen=history)
+        # Ids up to this one were published before the source last (re)started, so changes may be missing after them
+        self._gap_after = self.last_event_id
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._idle_since: Optional[float] = None
+        self._pending: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+        self._analytics_dirty = False
+        self._analytics_days: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    # Subscribers
+    async def subscribe(self, last_event_id: Optional[int] = None, heartbeat: float = 15.0) -> AsyncIterator[Optional[Batch]]:
+        """Yield ``(event_id, deltas)`` batches as they are published, and None after ``heartbeat`` quiet seconds.
+
+        With ``last_event_id`` the batches published since are replayed
+        first, or a resync of everything if they are no longer available.
+        The stream ends if the source fails.
+        """
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        self._idle_since = None
+        self._ensure_running()
+        backlog = self._replay(last_event_id) if last_event_id is not None else []
+        try:
+            for batch in backlog:
+                yield batch
+            while True:
+                try:
+                    batch = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if batch is CLOSED:
+                    return
+                yield batch
+        finally:
+            self._subscribers.discard(queue)
+            if not self._subscribers:
+                self._idle_since = time.monotonic()
+
+    def _replay(self, last_event_id: int) -> List[Batch]:
+        if self._gap_after < last_event_id <= self.last_event_id:
+            oldest = self._history[0][0] if self._history else self.last_event_id + 1
+            if oldest <= last_event_id + 1:
+                return [batch for batch in self._history if batch[0] > last_event_id]
+        self.stats["resyncs"] += 1
+        return [(self.last_event_id, self.resync_deltas())]
+
+    def resync_deltas(self) -> List[Dict[str, Any]]:
+        return [{"collection": collection, "op": "resync"} for collection in self.collections + ("analytics",)]
+
+    def _publish(self, deltas: List[Dict[str, Any]]):
+        self.last_event_id += 1
+        batch = (self.last_event_id, deltas)
+        self._history.append(batch)
+        self.stats["batches"] += 1
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(batch)
+            except asyncio.QueueFull:
+                # A client this far behind reloads instead of receiving a backlog
+                self.stats["overflows"] += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait((self.last_event_id, self.resync_deltas()))
+
+    def _close_subscribers(self):
+        for queue in self._subscribers:
+            if queue.full():
+                # Reconnecting with the last id they saw gets them a resync anyway
+                while not queue.empty():
+                    queue.get_nowait()
+            queue.put_nowait(CLOSED)
+
+    # Delta collection
+    def record(self, delta: Dict[str, Any]):
+        """Queue a delta for the next batch, merging it with pending changes to the same document"""
+        self.stats["changes"] += 1
+        collection = delta["collection"]
+        if collection == "analytics":
+            self._analytics_dirty = True
+            if delta.get("day"):
+                self._analytics_days.add(delta["day"])
+            return
+        if delta["op"] == "resync":
+            self._pending = {key: value for key, value in self._pending.items() if key[0] != collection}
+            self._pending[(collection, None)] = delta
+            return
+        if (collection, None) in self._pending:
+            return
+        key = (collection, delta["id"])
+        current = self._pending.get(key)
+        if current is None or delta["op"] == "upsert":
+            self._pending[key] = delta
+        elif current["op"] == "upsert":
+            current["doc"].update(delta["fields"])
+            for field in delta["removed"]:
+                current["doc"].pop(field, None)
+        else:
+            current["fields"].update(delta["fields"])
+            removed = [field for field in current["removed"] if field not in delta["fields"]]
+            current["removed"] = removed + [field for field in delta["removed"] if field not in removed]
+            for field in delta["removed"]:
+                current["fields"].pop(field, None)
+
+    async def flush(self):
+        """Publish everything recorded since the last flush as one batch"""
+        if not self._pending and not self._analytics_dirty:
+            return
+        deltas, self._pending = list(self._pending.values()), {}
+        if self._analytics_dirty:
+            days, self._analytics_days, self._analytics_dirty = sorted(self._analytics_days), set(), False
+            deltas.append(await self._analytics_delta(days))
+        self._publish(deltas)
+
+    async def _analytics_delta(self, days: List[str]) -> Dict[str, Any]:
+        counters = await self.db.analytics_counters.find_one({"_id": ROLLUP_ID}) or {}
+        fields = counter_summary(counters)
+        if days:
+            rows = await self.db.analytics_daily.find({"_id": {"$in": days}}).to_list(len(days))
+            counts = {row["_id"]: row.get("messages", 0) for row in rows}
+            fields["daily_activity"] = {day: counts.get(day, 0) for day in days}
+        return {"collection": "analytics", "op": "update", "fields": fields}
+
+    # Sources
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._gap_after = self.last_event_id
+            self._task = asyncio.create_task(self._run())
+
+    def _idle(self) -> bool:
+        return not self._subscribers and self._idle_since is not None and time.monotonic() - self._idle_since >= self.idle_timeout
+
+    async def _run(self):
+        flusher = asyncio.create_task(self._flush_loop())
+        try:
+            if self.mode in ("auto", "change_stream"):
+                try:
+                    await self._watch()
+                    return
+                except ChangeStreamsUnsupported as e:
+                    if self.mode == "change_stream":
+                        raise
+                    logger.info(f"Change streams unavailable ({e}); polling for live updates")
+            await self._poll()
+        except Exception as e:
+            logger.error(f"Live update feed stopped: {e}")
+            self._pending = {}
+            self._publish(self.resync_deltas())
+            # End the open streams; clients reconnect, which starts the source again
+            self._close_subscribers()
+        finally:
+            flusher.cancel()
+            self.source = None
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except PyMongoError as e:
+                logger.error(f"Live update flush failed: {e}")
+
+    async def _watch(self):
+        resume_token = None
+        while not self._idle():
+            try:
+                async with self.db.watch(
+                    change_stream_pipeline(self.collections),
+                    full_document="updateLookup",
+                    resume_after=resume_token,
+                    max_await_time_ms=int(self.poll_interval * 1000),
+                ) as stream:
+                    self.source = "change_stream"
+                    while stream.alive and not self._idle():
+                        change = await stream.try_next()
+                        if change is not None:
+                            resume_token = stream.resume_token
+                            delta = change_delta(change)
+                            if delta is not None:
+                                self.record(delta)
+            except NotImplementedError as e:
+                raise ChangeStreamsUnsupported(str(e) or "not implemented by this client")
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAM_UNSUPPORTED:
+                    raise ChangeStreamsUnsupported(str(e))
+                if e.code != CHANGE_STREAM_HISTORY_LOST:
+                    raise
+                # Resuming is impossible; start from now and have clients reload what they missed
+                logger.error(f"Change stream history lost, resyncing clients: {e}")
+                resume_token = None
+                for delta in self.resync_deltas():
+                    self.record(delta)
+                await asyncio.sleep(self.poll_interval)
+            except PyMongoError as e:
+                logger.error(f"Change stream interrupted, resuming: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self):
+        """Follow each collection's timestamp field; re-reading ``poll_overlap`` seconds catches writes that commit out of order"""
+        self.source = "poll"
+        watermarks = {collection: datetime.utcnow() for collection in self.collections}
+        # Per collection: id -> timestamp already sent, for documents inside the overlap window
+        sent: Dict[str, Dict[str, datetime]] = {collection: {} for collection in self.collections}
+        while not self._idle():
+            for collection in self.collections:
+                field = POLL_FIELDS[collection]
+                try:
+                    docs = await self.db[collection].find(
+                        {field: {"$gte": watermarks[collection] - self.poll_overlap}}, {"_id": 0}
+                    ).sort([(field, 1), ("id", 1)]).to_list(self.poll_limit)
+                except PyMongoError as e:
+                    # The watermark stays put, so the next pass re-reads what this one missed
+                    logger.error(f"Live update poll of {collection} failed, retrying: {e}")
+                    continue
+                if len(docs) >= self.poll_limit:
+                    # More changes than one read covers: skip ahead and have clients reload
+                    self.record({"collection": collection, "op": "resync"})
+                    watermarks[collection] = datetime.utcnow()
+                    sent[collection] = {}
+                    self._analytics_dirty = True
+                    continue
+                for doc in docs:
+                    if sent[collection].get(doc["id"]) == doc[field]:
+                        continue
+                    sent[collection][doc["id"]] = doc[field]
+                    self.record({"collection": collection, "op": "upsert", "id": doc["id"], "doc": doc})
+                    # Rollups move with target and message writes; messages also touch their day
+                    if collection == "messages":
+                        self.record({"collection": "analytics", "op": "update", "day": doc["created_at"].strftime(DAY_FORMAT)})
+                    elif collection == "targets":
+                        self.record({"collection": "analytics", "op": "update", "day": None})
+                if docs:
+                    watermarks[collection] = max(watermarks[collection], docs[-1][field])
+                horizon = watermarks[collection] - self.poll_overlap
+                sent[collection] = {doc_id: stamp for doc_id, stamp in sent[collection].items() if stamp >= horizon}
+            await asyncio.sleep(self.poll_interval)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "source": self.source,
+            "subscribers": len(self._subscribers),
+            "last_event_id": self.last_event_id,
+            **self.stats,
+        }
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """Two-tier cache for LLM completions keyed on the rendered request.
+
+    Keys are a SHA-256 over the provider, model, rendered prompt and
+    sampling parameters, so any change to the prompt text produces a new
+    entry. Lookups hit an in-process LRU first and then the Mongo
+    collection (expired by a TTL index on ``created_at``); Mongo hits are
+    promoted into the LRU. Concurrent misses for the same key share one
+    upstream call.
+    """
+
+    def __init__(self, collection=None, max_entries: int = 1024, ttl_seconds: float = 7 * 24 * 3600):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"memory_hits": 0, "mongo_hits": 0, "coalesced": 0, "misses": 0, "bypassed": 0, "refreshed": 0}
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: Any, **params) -> str:
+        payload = json.dumps(
+            {"provider": provider, "model": model, "prompt": prompt, "params": params},
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_memory(self, key: str, value: str, ttl: Optional[float] = None):
+        self._entries[key] = (value, time.monotonic() + (ttl if ttl is not None else self.ttl_seconds))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._get_memory(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+        if self.collection is not None:
+            doc = await self.collection.find_one({"key": key}, {"_id": 0, "response": 1, "created_at": 1})
+            if doc is not None:
+                remaining = self.ttl_seconds - (datetime.utcnow() - doc["created_at"]).total_seconds()
+                if remaining > 0:
+                    self.stats["mongo_hits"] += 1
+                    self._set_memory(key, doc["response"], remaining)
+                    return doc["response"]
+        return None
+
+    async def set(self, key: str, value: str, **metadata):
+        self._set_memory(key, value)
+        if self.collection is not None:
+            await self.collection.update_one(
+                {"key": key},
+                {"$set": {"key": key, "response": value, "created_at": datetime.utcnow(), **metadata}},
+                upsert=True,
+            )
+
+    async def get_or_generate(
+        self,
+        key: str,
+        generate: Callable[[], Awaitable[str]],
+        use_cache: bool = True,
+        refresh: bool = False,
+        **metadata,
+    ) -> str:
+        """Return the cached response for ``key`` or call ``generate`` and store it.
+
+        ``use_cache=False`` bypasses both reading and writing;
+        ``refresh=True`` skips the read but stores the fresh response.
+        """
+        if not use_cache:
+            self.stats["bypassed"] += 1
+            return await generate()
+        if refresh:
+            self.stats["refreshed"] += 1
+        else:
+            cached = await self.get(key)
+            if cached is not None:
+                return cached
+            if key in self._inflight:
+                self.stats["coalesced"] += 1
+                return await asyncio.shield(self._inflight[key])
+            self.stats["misses"] += 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await generate()
+            try:
+                await self.set(key, value, **metadata)
+            except Exception as e:
+                logger.warning(f"LLM cache write failed: {e}")
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when no one else is waiting on it
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def ensure_indexes(self):
+        if self.collection is None:
+            return
+        await self.collection.create_index("key", unique=True)
+        await self.collection.create_index("created_at", expireAfterSeconds=int(self.ttl_seconds))
+
+    async def clear(self):
+        self._entries.clear()
+        if self.collection is not None:
+            await self.collection.delete_many({})
+
+    def snapshot(self) -> Dict[str, Any]:
+        hits = self.stats["memory_hits"] + self.stats["mongo_hits"] + self.stats["coalesced"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
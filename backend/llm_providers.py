@@ -0,0 +1,238 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+import httpx
+from openai import AsyncOpenAI
+
+from metrics import record_llm_call
+
+
+class OpenAIProvider:
+    """Async OpenAI chat provider backed by a shared, pooled HTTP client.
+
+    A single instance is created per process so every generation reuses the
+    same keep-alive connections. ``max_concurrency`` caps the number of
+    requests in flight against the API; callers beyond that wait on the
+    semaphore without blocking the event loop.
+    """
+
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 32,
+        max_connections: int = 64,
+        timeout: float = 60.0,
+        max_retries: int = 2,
+    ):
+        self.max_concurrency = max_concurrency
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+        )
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client,
+            max_retries=max_retries,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4.1",
+        max_tokens: int = 300,
+        temperature: float = 0.7,
+        response_format: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        extra = {"response_format": response_format} if response_format else {}
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    **extra,
+                )
+            except Exception as e:
+                record_llm_call(self.name, model, time.perf_counter() - started, error=e)
+                raise
+        usage = response.usage
+        record_llm_call(
+            self.name, model, time.perf_counter() - started,
+            usage.prompt_tokens if usage else None, usage.completion_tokens if usage else None,
+        )
+        return response.choices[0].message.content.strip()
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4.1",
+        max_tokens: int = 300,
+        temperature: float = 0.7,
+    ) -> AsyncIterator[str]:
+        """Yield completion text fragments as the API streams them; usage arrives in a final chunk without choices"""
+        async with self._semaphore:
+            started = time.perf_counter()
+            usage = error = None
+            try:
+                stream = await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                async for chunk in stream:
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                record_llm_call(
+                    self.name, model, time.perf_counter() - started,
+                    usage.prompt_tokens if usage else None, usage.completion_tokens if usage else None, error,
+                )
+
+    async def aclose(self):
+        await self.client.close()
+
+
+class OllamaProvider:
+    """Ollama ``/api/generate`` client on one long-lived aiohttp session.
+
+    The session (and its keep-alive connection pool) is created lazily on
+    first use, inside the running event loop, and reused until ``aclose``.
+    ``max_connections`` also bounds how many generations run at once.
+    """
+
+    name = "ollama"
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        model: str = "llama3.1",
+        max_connections: int = 16,
+        timeout: float = 120.0,
+        connect_timeout: float = 10.0,
+        keepalive_timeout: float = 60.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=self.keepalive_timeout),
+                timeout=self.timeout,
+            )
+        return self._session
+
+    def _payload(
+        self, prompt: str, model: Optional[str], stream: bool, options: Optional[Dict[str, Any]], format: Optional[str] = None
+    ) -> Dict[str, Any]:
+        payload = {"model": model or self.model, "prompt": prompt, "stream": stream}
+        if options:
+            payload["options"] = options
+        if format:
+            payload["format"] = format
+        return payload
+
+    async def generate(
+        self, prompt: str, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None, format: Optional[str] = None
+    ) -> str:
+        """Complete ``prompt``; ``format="json"`` constrains the output to valid JSON"""
+        payload = self._payload(prompt, model, False, options, format)
+        started = time.perf_counter()
+        try:
+            async with self.session.post(f"{self.base_url}/api/generate", json=payload) as response:
+                response.raise_for_status()
+                result = await response.json()
+        except Exception as e:
+            record_llm_call(self.name, payload["model"], time.perf_counter() - started, error=e)
+            raise
+        record_llm_call(
+            self.name, payload["model"], time.perf_counter() - started,
+            result.get("prompt_eval_count"), result.get("eval_count"),
+        )
+        return result.get("response", "").strip()
+
+    async def stream(
+        self, prompt: str, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """Yield response fragments from Ollama's NDJSON stream as they arrive; the final chunk carries token counts"""
+        payload = self._payload(prompt, model, True, options)
+        started = time.perf_counter()
+        final: Dict[str, Any] = {}
+        error = None
+        try:
+            async with self.session.post(f"{self.base_url}/api/generate", json=payload) as response:
+                response.raise_for_status()
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise RuntimeError(f"Ollama error: {chunk['error']}")
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        final = chunk
+                        break
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            record_llm_call(
+                self.name, payload["model"], time.perf_counter() - started,
+                final.get("prompt_eval_count"), final.get("eval_count"), error,
+            )
+
+    async def aclose(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+def openai_provider_from_env(env: Dict[str, Any] = os.environ) -> OpenAIProvider:
+    """Build the OpenAI provider from ``OPENAI_*`` environment settings"""
+    return OpenAIProvider(
+        api_key=env.get('OPENAI_API_KEY'),
+        base_url=env.get('OPENAI_BASE_URL') or None,
+        max_concurrency=int(env.get('OPENAI_MAX_CONCURRENCY', 32)),
+        max_connections=int(env.get('OPENAI_MAX_CONNECTIONS', 64)),
+        timeout=float(env.get('OPENAI_TIMEOUT', 60)),
+        max_retries=int(env.get('OPENAI_MAX_RETRIES', 2)),
+    )
+
+
+def ollama_provider_from_env(env: Dict[str, Any] = os.environ) -> OllamaProvider:
+    """Build the Ollama provider from ``OLLAMA_*`` environment settings"""
+    return OllamaProvider(
+        base_url=env.get('OLLAMA_BASE_URL', 'http://localhost:11434'),
+        model=env.get('OLLAMA_MODEL', 'llama3.1'),
+        max_connections=int(env.get('OLLAMA_MAX_CONNECTIONS', 16)),
+        timeout=float(env.get('OLLAMA_TIMEOUT', 120)),
+        connect_timeout=float(env.get('OLLAMA_CONNECT_TIMEOUT', 10)),
+        keepalive_timeout=float(env.get('OLLAMA_KEEPALIVE_TIMEOUT', 60)),
+    )
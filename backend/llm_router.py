@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AllBackendsFailed(Exception):
+    """Every candidate backend failed; ``errors`` holds ``(backend, exception)`` pairs"""
+
+    def __init__(self, errors: List[Tuple[str, BaseException]]):
+        self.errors = errors
+        super().__init__("; ".join(f"{backend}: {error}" for backend, error in errors) or "No backends to try")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values`` (``q`` in 0..100), None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class BackendStats:
+    """Rolling latency and outcome window for one ``provider:model`` backend.
+
+    Percentiles are over successful calls only, so fast failures do not make
+    a backend look quick. ``failure_threshold`` consecutive failures open the
+    circuit for ``cooldown`` seconds; after that the backend is tried again.
+    """
+
+    def __init__(self, window: int = 200, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    def record(self, latency: float, ok: bool):
+        self.calls += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = time.monotonic() + self.cooldown
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def p50(self) -> Optional[float]:
+        return percentile(list(self.latencies), 50)
+
+    def p95(self) -> Optional[float]:
+        return percentile(list(self.latencies), 95)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "p50_seconds": self.p50(),
+            "p95_seconds": self.p95(),
+            "error_rate": round(self.error_rate, 4),
+            "samples": len(self.outcomes),
+            "calls": self.calls,
+            "failures": self.failures,
+        }
+
+
+class LLMRouter:
+    """Latency-aware routing, failover and hedging across LLM backends.
+
+    Backends are opaque names (``"openai:gpt-4.1"``); the caller supplies a
+    coroutine that runs one request against a named backend. Candidates are
+    ordered healthy first, then by error rate bucket and rolling p95 latency;
+    backends without samples sort first so each gets measured. A failed or
+    timed-out attempt moves on to the next candidate. With ``hedge_after``
+    set, a second candidate is started when the first has not answered in
+    that many seconds and whichever finishes first wins.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        timeout: Optional[float] = None,
+        hedge_after: Optional[float] = None,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        max_error_rate: float = 0.5,
+    ):
+        self.window = window
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_error_rate = max_error_rate
+        self.backends: Dict[str, BackendStats] = {}
+        self.counters = {"requests": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0, "exhausted": 0}
+
+    def stats(self, backend: str) -> BackendStats:
+        if backend not in self.backends:
+            self.backends[backend] = BackendStats(self.window, self.failure_threshold, self.cooldown)
+        return self.backends[backend]
+
+    def rank(self, backends: List[str]) -> List[str]:
+        """``backends`` best first; ties keep the caller's order"""
+        def score(backend: str):
+            stats = self.stats(backend)
+            p95 = stats.p95()
+            return (not stats.healthy, stats.error_rate > self.max_error_rate, p95 if p95 is not None else 0.0)
+        return sorted(dict.fromkeys(backends), key=score)
+
+    def order(self, backends: List[str], preferred: Optional[str] = None) -> List[str]:
+        """Candidate order for one request: ``preferred`` first while it is healthy, then by rank"""
+        backends = list(dict.fromkeys(backends))
+        if preferred is not None and self.stats(preferred).healthy:
+            return [preferred] + self.rank([backend for backend in backends if backend != preferred])
+        return self.rank(backends)
+
+    async def _attempt(self, backend: str, call: Callable[[str], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        try:
+            if self.timeout:
+                result = await asyncio.wait_for(call(backend), self.timeout)
+            else:
+                result = await call(backend)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats(backend).record(time.monotonic() - started, ok=False)
+            raise
+        self.stats(backend).record(time.monotonic() - started, ok=True)
+        return result
+
+    async def call(
+        self,
+        backends: List[str],
+        call: Callable[[str], Awaitable[T]],
+        preferred: Optional[str] = None,
+        hedge: bool = True,
+    ) -> T:
+        """Run ``call`` on the best candidate, failing over (and hedging) as configured"""
+        self.counters["requests"] += 1
+        candidates = iter(self.order(backends, preferred))
+        pending: Dict[asyncio.Future, str] = {}
+        errors: List[Tuple[str, BaseException]] = []
+        launched: List[str] = []
+        hedged = not (hedge and self.hedge_after is not None)
+        hedge_started = False
+
+        def launch() -> bool:
+            backend = next(candidates, None)
+            if backend is None:
+                return False
+            launched.append(backend)
+            pending[asyncio.ensure_future(self._attempt(backend, call))] = backend
+            return True
+
+        launch()
+        try:
+            while pending:
+                wait_for = self.hedge_after if not hedged else None
+                done, _ = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if launch():
+                        hedge_started = True
+                        self.counters["hedges"] += 1
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is None:
+                        if hedge_started and backend != launched[0]:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    errors.append((backend, task.exception()))
+                    logger.warning(f"LLM backend {backend} failed: {task.exception()}")
+                if not pending and launch():
+                    self.counters["failovers"] += 1
+        finally:
+            for task in pending:
+                if task.done() and not task.cancelled():
+                    task.exception()
+                task.cancel()
+        self.counters["exhausted"] += 1
+        raise AllBackendsFailed(errors)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "backends": {backend: stats.snapshot() for backend, stats in sorted(self.backends.items())},
+        }
@@ -0,0 +1,338 @@
+"""Request, Mongo and LLM instrumentation with a Prometheus text endpoint.
+
+Counters and histograms are kept in-process and rendered in the Prometheus
+text exposition format (0.0.4) by ``Registry.render``, so scraping needs no
+client library. Values that already live elsewhere (cache hit counters, say)
+are read at scrape time by collectors registered with ``Registry.collector``.
+
+Each HTTP request gets a ``RequestTimings`` in the ``request_timings``
+context variable. Instrumentation adds to it with ``record_phase`` (Motor
+runs commands on executor threads with a copy of the caller's context, so
+the Mongo listener sees the same object), and ``MetricsMiddleware`` turns
+the totals into a ``Server-Timing`` header when asked to.
+"""
+import asyncio
+import bisect
+import functools
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+from starlette.datastructures import Headers, MutableHeaders
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 2.5)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+# USD per million (prompt, completion) tokens; models not listed (e.g. local Ollama ones) cost nothing
+DEFAULT_LLM_PRICES = {
+    "gpt-4.1": (2.0, 8.0),
+    "gpt-4.1-mini": (0.4, 1.6),
+    "gpt-4.1-nano": (0.1, 0.4),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+}
+
+# Driver housekeeping that is not an application query
+_IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "buildInfo", "saslStart", "saslContinue"}
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Labels, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][position] += 1
+            entry[1] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(tuple(str(labels[name]) for name in self.labelnames))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+# A collector returns (name, kind, help, [(labels, value), ...]) families read at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+        self.collectors: List[Collector] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def collector(self, collect: Collector) -> Collector:
+        self.collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collect in self.collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+HTTP_DURATION = REGISTRY.histogram("http_request_duration_seconds", "Time to the end of the response body", ("method", "route"))
+HTTP_EXCEPTIONS = REGISTRY.counter("http_unhandled_exceptions_total", "Exceptions that escaped a route handler", ("route", "exception"))
+MONGO_OPERATIONS = REGISTRY.counter("mongo_operations_total", "MongoDB commands by collection", ("collection", "command", "outcome"))
+MONGO_DURATION = REGISTRY.histogram("mongo_operation_duration_seconds", "MongoDB command round trips", ("collection", "command"), MONGO_BUCKETS)
+LLM_REQUESTS = REGISTRY.counter("llm_requests_total", "LLM calls; outcome is ok or the exception type", ("provider", "model", "outcome"))
+LLM_DURATION = REGISTRY.histogram("llm_request_duration_seconds", "LLM call latency, to the last token when streaming", ("provider", "model"), LLM_BUCKETS)
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Tokens reported by the provider", ("provider", "model", "kind"))
+LLM_COST = REGISTRY.counter("llm_cost_usd_total", "Estimated spend from token usage and LLM_PRICES", ("provider", "model"))
+
+llm_prices: Dict[str, Tuple[float, float]] = dict(DEFAULT_LLM_PRICES)
+
+
+def parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    """``"gpt-4.1:2/8,my-model:0.5/1.5"`` -> USD per million (prompt, completion) tokens, on top of the defaults"""
+    prices = dict(DEFAULT_LLM_PRICES)
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, price = part.rpartition(":")
+        prompt, _, completion = price.partition("/")
+        prices[model] = (float(prompt), float(completion or prompt))
+    return prices
+
+
+def llm_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = llm_prices.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+
+class RequestTimings:
+    """Seconds and call counts per phase (``mongo``, ``llm``, ``handler``...) of one request"""
+
+    def __init__(self):
+        self.phases: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            totals = self.phases.setdefault(phase, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def header(self, total: float) -> str:
+        """``Server-Timing`` value; ``app`` is the time the framework spent outside the handler (validation, serialization)"""
+        with self._lock:
+            phases = {phase: list(totals) for phase, totals in self.phases.items()}
+        entries = [f'{phase};dur={seconds * 1000:.2f};desc="{count} calls"' for phase, (seconds, count) in phases.items() if phase != "handler"]
+        if "handler" in phases:
+            entries.append(f"handler;dur={phases['handler'][0] * 1000:.2f}")
+            entries.append(f"app;dur={max(total - phases['handler'][0], 0.0) * 1000:.2f}")
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record_phase(phase: str, seconds: float):
+    timings = request_timings.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+def record_llm_call(provider: str, model: str, seconds: float, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None, error: Optional[BaseException] = None):
+    """Latency, outcome, token usage and estimated cost of one provider call"""
+    LLM_REQUESTS.inc(provider=provider, model=model, outcome="ok" if error is None else type(error).__name__)
+    LLM_DURATION.observe(seconds, provider=provider, model=model)
+    record_phase("llm", seconds)
+    if prompt_tokens is None and completion_tokens is None:
+        return
+    prompt_tokens, completion_tokens = prompt_tokens or 0, completion_tokens or 0
+    LLM_TOKENS.inc(prompt_tokens, provider=provider, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, provider=provider, model=model, kind="completion")
+    LLM_COST.inc(llm_cost(model, prompt_tokens, completion_tokens), provider=provider, model=model)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Per-collection command counts and durations; pass to the client as ``event_listeners=[...]``"""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        target = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else "-"
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, event.command_name)
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        collection, command = pending
+        seconds = event.duration_micros / 1e6
+        MONGO_OPERATIONS.inc(collection=collection, command=command, outcome=outcome)
+        MONGO_DURATION.observe(seconds, collection=collection, command=command)
+        record_phase("mongo", seconds)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+def route_label(scope) -> str:
+    """The matched route's path template, so ``/targets/{target_id}`` is one series"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request.
+
+    ``Server-Timing`` is added when ``server_timing`` is on or the request
+    carries ``X-Server-Timing: 1``. For streamed responses it reflects the
+    time until the headers were sent.
+    """
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        want_timing = self.server_timing or Headers(scope=scope).get("x-server-timing") == "1"
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if want_timing:
+                    MutableHeaders(scope=message).append("Server-Timing", timings.header(time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception as e:
+            HTTP_EXCEPTIONS.inc(route=route_label(scope), exception=type(e).__name__)
+            raise
+        finally:
+            route = route_label(scope)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status)
+            HTTP_DURATION.observe(time.perf_counter() - started, method=scope["method"], route=route)
+            request_timings.reset(token)
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that records the endpoint function's own run time as the ``handler`` phase"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        call = self.dependant.call
+        if not asyncio.iscoroutinefunction(call):
+            return
+
+        @functools.wraps(call)
+        async def timed_call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                record_phase("handler", time.perf_counter() - started)
+
+        # The request handler built by APIRoute reads dependant.call per request
+        self.dependant.call = timed_call
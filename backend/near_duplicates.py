@@ -0,0 +1,261 @@
+"""MinHash/LSH index for spotting near-duplicate drafts.
+
+Texts are reduced to word 3-gram shingles and summarised by a MinHash
+signature whose values are truncated to 16 bits (b-bit MinHash), so each
+document costs ``num_perm * 2`` bytes. Signatures are split
+into bands; two texts that agree on every row of any band become candidates
+and are confirmed by the fraction of matching signature values, which
+estimates their Jaccard similarity.
+
+Band keys for all bands live in one sorted NumPy array, so a lookup is two
+vectorized ``searchsorted`` calls. New documents go into a small dict that
+is merged into the sorted array once it grows past a tenth of the index,
+which keeps lookups well under a millisecond at a million documents while
+inserts stay cheap.
+"""
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9']+")
+_SHINGLE_MIX = np.uint64(0x9E3779B1)
+_EMPTY = 0xFFFF
+# Texts hashed per vectorized pass; bounds the (shingles x num_perm) scratch matrix
+_SIGNATURE_CHUNK = 2048
+
+
+def shingle_hashes(texts: Sequence[str], size: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """32-bit hashes of the word ``size``-grams of each text, concatenated, plus per-text counts.
+
+    Words are hashed once with the built-in ``hash`` (salted per process,
+    which is fine because the index lives in memory and is rebuilt on
+    startup) and combined into shingles with array arithmetic.
+    A text shorter than ``size`` words yields a single shingle of all its
+    words; an empty text yields none.
+    """
+    words: List[int] = []
+    lengths = np.zeros(len(texts), dtype=np.int64)
+    for i, text in enumerate(texts):
+        tokens = _WORD.findall(text.lower())
+        lengths[i] = len(tokens)
+        words.extend(map(hash, tokens))
+    word_hashes = np.array(words, dtype=np.int64).view(np.uint64) & np.uint64(0xFFFFFFFF)
+    counts = np.where(lengths > 0, np.maximum(lengths - size + 1, 1), 0)
+    if not counts.sum():
+        return np.zeros(0, dtype=np.uint64), counts
+
+    ends = np.cumsum(lengths)
+    shingle_starts = np.cumsum(counts) - counts
+    positions = np.repeat(ends - lengths, counts) + np.arange(counts.sum()) - np.repeat(shingle_starts, counts)
+    text_ends = np.repeat(ends, counts)
+    hashes = np.zeros(len(positions), dtype=np.uint64)
+    for offset in range(size):
+        index = positions + offset
+        word = np.where(index < text_ends, word_hashes[np.minimum(index, len(word_hashes) - 1)], 0)
+        hashes = hashes * _SHINGLE_MIX + word.astype(np.uint64)
+    return hashes & np.uint64(0xFFFFFFFF), counts
+
+
+def choose_bands(num_perm: int, threshold: float, recall: float = 0.95) -> Tuple[int, int]:
+    """``(bands, rows)`` with the most rows per band that still finds a pair at ``threshold`` with ``recall``"""
+    for rows in range(num_perm, 0, -1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+    return num_perm, 1
+
+
+class NearDuplicateIndex:
+    """Find documents whose estimated Jaccard similarity is at least ``threshold``.
+
+    Templated drafts share boilerplate, so some band keys end up shared by
+    thousands of documents; ``find`` only verifies the ``max_bucket`` most
+    recent entries of such a bucket, which bounds lookup cost while a real
+    near-copy is still caught through its other, smaller buckets.
+
+    ``find``, ``add`` and ``check`` are synchronous, so checking a draft and
+    recording it cannot interleave with another coroutine.
+    """
+
+    STAT_KEYS = ("checked", "duplicates", "regenerated")
+
+    def __init__(self, threshold: float = 0.7, num_perm: int = 64, shingle_size: int = 3, max_bucket: int = 256, seed: int = 1):
+        self.threshold = threshold
+        self.max_bucket = max_bucket
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: (a * x + b) mod 2**64, keeping the high 32 bits
+        self._a = rng.integers(1, 1 << 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+        # Separate multipliers per band, so every band's keys can share one sorted array
+        self._band_mix = rng.integers(1, 1 << 63, (self.bands, self.rows), dtype=np.uint64) | np.uint64(1)
+
+        self.ids: List[str] = []
+        self.signatures = np.zeros((1024, num_perm), dtype=np.uint16)
+        self._sorted_keys = np.zeros(0, dtype=np.uint64)
+        self._sorted_rows = np.zeros(0, dtype=np.int32)
+        self._recent: Dict[int, List[int]] = {}
+        self._recent_rows = 0
+        self.stats = dict.fromkeys(self.STAT_KEYS, 0)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.signatures_for([text])[0]
+
+    def signatures_for(self, texts: Sequence[str]) -> np.ndarray:
+        """``(len(texts), num_perm)`` 16-bit MinHash signatures; empty texts get all ``0xFFFF``"""
+        signatures = np.full((len(texts), self.num_perm), _EMPTY, dtype=np.uint16)
+        for first in range(0, len(texts), _SIGNATURE_CHUNK):
+            hashes, counts = shingle_hashes(texts[first:first + _SIGNATURE_CHUNK], self.shingle_size)
+            if len(hashes) == 0:
+                continue
+            # (num_perm, shingles) so each per-text minimum reduces over contiguous memory
+            with np.errstate(over="ignore"):
+                permuted = (self._a[:, None] * hashes + self._b[:, None]) >> np.uint64(32)
+            present = np.flatnonzero(counts)
+            offsets = (np.cumsum(counts) - counts)[present]
+            minimums = np.minimum.reduceat(permuted, offsets, axis=1)
+            signatures[first + present] = (minimums.T & np.uint64(0xFFFF)).astype(np.uint16)
+        return signatures
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """``(len(signatures), bands)`` uint64 keys; arithmetic wraps modulo 2**64 on purpose"""
+        shaped = signatures[:, :self.bands * self.rows].astype(np.uint64).reshape(len(signatures), self.bands, self.rows)
+        with np.errstate(over="ignore"):
+            return (shaped * self._band_mix).sum(axis=2, dtype=np.uint64)
+
+    def find(self, text: str = None, signature: Optional[np.ndarray] = None) -> Optional[Tuple[str, float]]:
+        """Most similar indexed ``(id, similarity)`` at or above the threshold, else None"""
+        if signature is None:
+            signature = self.signature(text)
+        if not self.ids or (signature == _EMPTY).all():
+            return None
+        keys = self._band_keys(signature[None, :])[0]
+        starts = self._sorted_keys.searchsorted(keys, side="left")
+        stops = self._sorted_keys.searchsorted(keys, side="right")
+        hit = stops > starts
+        # Rows under one key are in insertion order, so this keeps the newest entries of oversized buckets
+        starts = np.maximum(starts, stops - self.max_bucket)
+        chunks = [self._sorted_rows[start:stop] for start, stop in zip(starts[hit].tolist(), stops[hit].tolist())]
+        if self._recent:
+            chunks.extend(np.array(self._recent[key], dtype=np.int32) for key in keys.tolist() if key in self._recent)
+        if not chunks:
+            return None
+        rows = np.unique(np.concatenate(chunks))
+        similarities = np.count_nonzero(self.signatures[rows] == signature, axis=1) / self.num_perm
+        best = int(similarities.argmax())
+        if similarities[best] < self.threshold:
+            return None
+        return self.ids[rows[best]], float(similarities[best])
+
+    def add(self, doc_id: str, text: str = None, signature: Optional[np.ndarray] = None):
+        if signature is None:
+            signature = self.signature(text)
+        self.add_many([doc_id], signature[None, :])
+
+    def add_many(self, ids: Sequence[str], signatures: np.ndarray):
+        """Index documents by precomputed signatures (see ``signatures_for``); empty texts are skipped"""
+        keep = ~(signatures == _EMPTY).all(axis=1)
+        ids = [doc_id for doc_id, kept in zip(ids, keep) if kept]
+        signatures = signatures[keep]
+        if not ids:
+            return
+        start = len(self.ids)
+        needed = start + len(ids)
+        if needed > len(self.signatures):
+            grown = np.zeros((max(needed, 2 * len(self.signatures)), self.num_perm), dtype=np.uint16)
+            grown[:start] = self.signatures[:start]
+            self.signatures = grown
+        self.signatures[start:needed] = signatures
+        self.ids.extend(ids)
+
+        keys = self._band_keys(signatures)
+        if len(ids) >= 1024:
+            self._merge(keys.reshape(-1), np.repeat(np.arange(start, needed, dtype=np.int32), self.bands))
+            return
+        for offset, row_keys in enumerate(keys.tolist()):
+            for key in row_keys:
+                self._recent.setdefault(key, []).append(start + offset)
+        self._recent_rows += len(ids)
+        if self._recent_rows >= max(1024, len(self.ids) // 10):
+            self._merge(np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int32))
+
+    def check(self, doc_id: str, text: str = None, signature: Optional[np.ndarray] = None) -> Optional[Tuple[str, float]]:
+        """Record ``text`` under ``doc_id`` and return the ``(id, similarity)`` it duplicates, if any"""
+        if signature is None:
+            signature = self.signature(text)
+        match = self.find(signature=signature)
+        self.add(doc_id, signature=signature)
+        self.stats["checked"] += 1
+        if match is not None:
+            self.stats["duplicates"] += 1
+        return match
+
+    def _merge(self, keys: np.ndarray, rows: np.ndarray):
+        """Fold the recent dict and ``keys``/``rows`` into the sorted arrays"""
+        recent_keys = np.fromiter(
+            (key for key, key_rows in self._recent.items() for _ in key_rows), dtype=np.uint64
+        )
+        recent_rows = np.fromiter(
+            (row for key_rows in self._recent.values() for row in key_rows), dtype=np.int32
+        )
+        all_keys = np.concatenate([self._sorted_keys, keys, recent_keys])
+        all_rows = np.concatenate([self._sorted_rows, rows, recent_rows])
+        order = np.argsort(all_keys, kind="stable")
+        self._sorted_keys = all_keys[order]
+        self._sorted_rows = all_rows[order]
+        self._recent = {}
+        self._recent_rows = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.ids),
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "rows_per_band": self.rows,
+            **self.stats,
+        }
+
+
+async def build_index(collection, index: NearDuplicateIndex, text_field: str = "content", batch_size: int = 5000) -> int:
+    """Bulk-load every document in ``collection`` into ``index``; returns how many were read"""
+    loaded = 0
+    ids: List[str] = []
+    texts: List[str] = []
+    async for doc in collection.find({}, {"_id": 0, "id": 1, text_field: 1}).batch_size(batch_size):
+        ids.append(doc["id"])
+        texts.append(doc.get(text_field) or "")
+        if len(ids) >= batch_size:
+            index.add_many(ids, index.signatures_for(texts))
+            loaded += len(ids)
+            ids, texts = [], []
+    if ids:
+        index.add_many(ids, index.signatures_for(texts))
+        loaded += len(ids)
+    return loaded
+
+
+async def generate_distinct(
+    index: NearDuplicateIndex,
+    doc_id: str,
+    generate: Callable[[int], Awaitable[str]],
+    retries: int = 0,
+) -> Tuple[str, Optional[Tuple[str, float]]]:
+    """Generate a draft, regenerating it up to ``retries`` times while it is a near-duplicate.
+
+    ``generate(attempt)`` produces one draft; attempts after the first should
+    skip any response cache. The last draft is recorded under ``doc_id`` and
+    returned with the ``(id, similarity)`` it still duplicates, if any.
+    """
+    for attempt in range(retries + 1):
+        content = await generate(attempt)
+        signature = index.signature(content)
+        if attempt == retries or index.find(signature=signature) is None:
+            return content, index.check(doc_id, signature=signature)
+        index.stats["regenerated"] += 1
@@ -0,0 +1,79 @@
+import asyncio
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(doc: Dict[str, Any], sort_field: str) -> str:
+    value = doc[sort_field]
+    payload = {"v": value.isoformat() if isinstance(value, datetime) else value, "id": doc["id"]}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    """Inverse of ``encode_cursor``; raises ``ValueError`` for a malformed cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["v"]), str(payload["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_filter(cursor: str, sort_field: str) -> Dict[str, Any]:
+    """Match documents strictly after the cursor in ``(sort_field, id)`` order"""
+    value, last_id = decode_cursor(cursor)
+    return {"$or": [
+        {sort_field: {"$gt": value}},
+        {sort_field: value, "id": {"$gt": last_id}},
+    ]}
+
+
+def build_projection(fields: Optional[str], sort_field: str) -> Dict[str, int]:
+    """Projection for a comma-separated ``fields`` list; ``id`` and the sort key are always kept.
+
+    Operators and Mongo's ``_id`` (an ObjectId, which cannot be serialized) are skipped.
+    """
+    projection = {"_id": 0}
+    if fields:
+        for field in fields.split(","):
+            field = field.strip()
+            if field and not field.startswith("$") and field.split(".")[0] != "_id":
+                projection[field] = 1
+        projection.update({"id": 1, sort_field: 1})
+    return projection
+
+
+async def fetch_page(
+    collection,
+    filters: Dict[str, Any],
+    sort_field: str,
+    limit: int = MAX_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_total: bool = False,
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]:
+    """One keyset page ordered by ``(sort_field, id)``.
+
+    Returns ``(documents, next_cursor, total)``; ``next_cursor`` is None on
+    the last page and ``total`` is only counted when ``include_total`` is set.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = dict(filters)
+    if cursor:
+        query = {"$and": [filters, keyset_filter(cursor, sort_field)]} if filters else keyset_filter(cursor, sort_field)
+
+    find = collection.find(query, build_projection(fields, sort_field)).sort([(sort_field, 1), ("id", 1)]).limit(limit + 1)
+    if include_total:
+        docs, total = await asyncio.gather(find.to_list(limit + 1), collection.count_documents(filters))
+    else:
+        docs, total = await find.to_list(limit + 1), None
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor, total
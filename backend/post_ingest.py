@@ -0,0 +1,458 @@
+"""Parallel offline ingestion of saved LinkedIn posts into ``viral_posts``.
+
+Reads files, directories and archives (.zip, .tar, .tar.gz, .tgz) of saved
+post pages (.html, .htm) or exported posts (.json objects or lists,
+.jsonl), parses them across a process pool and writes the posts in
+unordered ``bulk_write`` chunks of upserts keyed on ``linkedin_url``, so
+re-ingesting a scrape refreshes the counts of posts already stored instead
+of duplicating them. Other files (images and scripts saved alongside a
+page) are skipped.
+
+From HTML the author, text, reaction/comment/repost counts and URL are
+taken from the page's JSON-LD ``SocialMediaPosting`` when present (public
+post pages), then from the feed markup of signed-in pages, then from the
+Open Graph tags. A file's modification time stands in for ``scraped_at``
+unless the document carries one; a post with neither gets the import time
+when it is first stored, and keeps it when re-ingested. Parsing uses lxml
+when it is installed.
+
+    python post_ingest.py saved_posts/ scrape-2024-05.zip --workers 8
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+from urllib.parse import urlsplit, urlunsplit
+
+from bs4 import BeautifulSoup
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from target_import import DUPLICATE_KEY
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+logger = logging.getLogger(__name__)
+
+HTML_SUFFIXES = (".html", ".htm")
+JSON_SUFFIXES = (".json", ".jsonl", ".ndjson")
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+
+# Rows reported individually in the error report; the failure count is always exact
+MAX_REPORTED_ERRORS = 1000
+
+# (name, content, modification time) of one saved document
+Source = Tuple[str, bytes, Optional[datetime]]
+
+POSTING_TYPES = {"SocialMediaPosting", "DiscussionForumPosting", "Article", "BlogPosting"}
+INTERACTION_FIELDS = {"LikeAction": "reactions", "CommentAction": "comments", "ShareAction": "shares"}
+# Field -> keys it goes by in exported JSON, first match wins
+JSON_ALIASES = {
+    "original_content": ("original_content", "content", "text", "commentary", "articleBody"),
+    "author": ("author", "author_name", "actor"),
+    "reactions": ("reactions", "num_likes", "numLikes", "likes", "reaction_count"),
+    "comments": ("comments", "num_comments", "numComments", "comment_count"),
+    "shares": ("shares", "num_shares", "numShares", "reposts", "repost_count"),
+    "linkedin_url": ("linkedin_url", "url", "post_url", "postUrl", "share_url"),
+    "scraped_at": ("scraped_at",),
+}
+# Feed markup of signed-in pages, then the public post page, for each field
+SELECTORS = {
+    "author": (
+        ".update-components-actor__name span[aria-hidden=true]", ".update-components-actor__name",
+        ".feed-shared-actor__name", "[data-tracking-control-name=public_post_feed-actor-name]",
+    ),
+    "original_content": (
+        ".update-components-text", ".feed-shared-update-v2__description", ".feed-shared-text",
+        "[data-test-id=main-feed-activity-card__commentary]", ".attributed-text-segment-list__content",
+    ),
+    "reactions": (".social-details-social-counts__reactions-count", "[data-test-id=social-actions__reaction-count]"),
+    "comments": (".social-details-social-counts__comments", "[data-test-id=social-actions__comments]"),
+}
+COUNT_PATTERN = re.compile(r"(\d[\d,.]*)\s*([KkMm])?")
+SOCIAL_COUNT_PATTERN = re.compile(r"(\d[\d,.]*\s*[KkMm]?)\s+(comments?|reposts?|shares?)\b", re.IGNORECASE)
+
+
+def parse_count(text: Union[str, int, float, None]) -> Optional[int]:
+    """``"1,234 reactions"`` -> 1234, ``"1.2K"`` -> 1200; None when there is no number"""
+    if isinstance(text, (int, float)):
+        return int(text)
+    match = COUNT_PATTERN.search(text or "")
+    if not match:
+        return None
+    number, scale = match.groups()
+    if scale:
+        return int(float(number.replace(",", "")) * (1000 if scale in "Kk" else 1_000_000))
+    return int(number.replace(",", "").replace(".", ""))
+
+
+def canonical_url(url: Optional[str]) -> Optional[str]:
+    """Dedupe key for a post URL: no query string, fragment or trailing slash"""
+    if not url:
+        return None
+    parts = urlsplit(url.strip())
+    if not parts.scheme or not parts.netloc:
+        return None
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path.rstrip("/"), "", ""))
+
+
+def clean_text(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    text = re.sub(r"[ \t\u00a0]+", " ", text)
+    text = re.sub(r"\s*\n\s*", "\n", text).strip()
+    return text or None
+
+
+def as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def json_ld_post(soup: BeautifulSoup) -> Dict[str, Any]:
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or "")
+        except ValueError:
+            continue
+        items = [entry for item in as_list(data) if isinstance(item, dict) for entry in as_list(item.get("@graph", item))]
+        for item in items:
+            if not isinstance(item, dict) or not POSTING_TYPES.intersection(as_list(item.get("@type"))):
+                continue
+            author = next(iter(as_list(item.get("author"))), None)
+            post = {
+                "author": author.get("name") if isinstance(author, dict) else author,
+                "original_content": item.get("articleBody") or item.get("text"),
+                "linkedin_url": item.get("url") or item.get("mainEntityOfPage"),
+            }
+            for stat in as_list(item.get("interactionStatistic")):
+                kind = stat.get("interactionType") if isinstance(stat, dict) else None
+                kind = kind.get("@type") if isinstance(kind, dict) else str(kind).rstrip("/").rsplit("/", 1)[-1]
+                if kind in INTERACTION_FIELDS:
+                    post[INTERACTION_FIELDS[kind]] = parse_count(stat.get("userInteractionCount"))
+            return {key: value for key, value in post.items() if value is not None}
+    return {}
+
+
+def markup_post(soup: BeautifulSoup) -> Dict[str, Any]:
+    post: Dict[str, Any] = {}
+    for field, selectors in SELECTORS.items():
+        for selector in selectors:
+            element = soup.select_one(selector)
+            if element is None:
+                continue
+            if field == "comments" and element.get("data-num-comments"):
+                post[field] = parse_count(element["data-num-comments"])
+            elif field in ("reactions", "comments"):
+                post[field] = parse_count(element.get_text(" ", strip=True))
+            elif field == "original_content":
+                for line_break in element.find_all("br"):
+                    line_break.replace_with("\n")
+                post[field] = element.get_text()
+            else:
+                post[field] = element.get_text(" ", strip=True)
+            if post[field] is not None:
+                break
+    # Comment and repost counts otherwise only appear as "12 comments" / "3 reposts" labels
+    for element in soup.select(".social-details-social-counts__item, [aria-label]"):
+        for number, kind in SOCIAL_COUNT_PATTERN.findall(element.get("aria-label") or element.get_text(" ", strip=True)):
+            field = "comments" if kind.lower().startswith("comment") else "shares"
+            if post.get(field) is None:
+                post[field] = parse_count(number)
+
+    canonical = soup.find("link", rel="canonical")
+    if canonical and canonical.get("href"):
+        post["linkedin_url"] = canonical["href"]
+    else:
+        activity = soup.find(attrs={"data-urn": re.compile(r"^urn:li:activity:\d+$")})
+        if activity is not None:
+            post["linkedin_url"] = f"https://www.linkedin.com/feed/update/{activity['data-urn']}"
+    return {key: value for key, value in post.items() if value is not None}
+
+
+def meta_post(soup: BeautifulSoup) -> Dict[str, Any]:
+    def meta(*names):
+        for name in names:
+            tag = soup.find("meta", attrs={"property": name}) or soup.find("meta", attrs={"name": name})
+            if tag and tag.get("content"):
+                return tag["content"]
+        return None
+
+    post = {"linkedin_url": meta("og:url"), "original_content": meta("og:description", "description"), "author": meta("author")}
+    title = meta("og:title")
+    if not post["author"] and title and " on LinkedIn" in title:
+        # "Jane Doe on LinkedIn: Shipping our eval harness..."
+        post["author"] = title.split(" on LinkedIn", 1)[0]
+    return {key: value for key, value in post.items() if value}
+
+
+def parse_post_html(content: bytes) -> Dict[str, Any]:
+    """Post fields found in a saved post page; structured data wins over markup, markup over meta tags"""
+    soup = BeautifulSoup(content, HTML_PARSER)
+    post = {**meta_post(soup), **markup_post(soup), **json_ld_post(soup)}
+    for field in ("author", "original_content"):
+        if field in post:
+            post[field] = clean_text(post[field])
+    return post
+
+
+def json_post(row: Dict[str, Any]) -> Dict[str, Any]:
+    post = {}
+    for field, aliases in JSON_ALIASES.items():
+        value = next((row[key] for key in aliases if row.get(key) is not None), None)
+        if field == "author" and isinstance(value, dict):
+            value = value.get("name")
+        if field in ("reactions", "comments", "shares") and isinstance(value, (str, int, float)):
+            value = parse_count(value)
+        if value is not None:
+            post[field] = value
+    return post
+
+
+def parse_source(source: Source) -> List[Tuple[str, Union[Dict[str, Any], str]]]:
+    """``(name, post fields or error message)`` for every post in one document"""
+    name, content, modified = source
+    lower = name.lower()
+    try:
+        if lower.endswith(HTML_SUFFIXES):
+            parsed = [(name, parse_post_html(content))]
+        elif lower.endswith(".json"):
+            data = json.loads(content)
+            rows = data if isinstance(data, list) else [data]
+            parsed = [(f"{name}[{i}]" if isinstance(data, list) else name, row) for i, row in enumerate(rows)]
+        else:
+            parsed = []
+            for line_number, line in enumerate(content.decode("utf-8-sig").splitlines(), start=1):
+                if line.strip():
+                    try:
+                        parsed.append((f"{name}:{line_number}", json.loads(line)))
+                    except json.JSONDecodeError as e:
+                        parsed.append((f"{name}:{line_number}", f"Invalid JSON: {e}"))
+    except (ValueError, UnicodeDecodeError) as e:
+        return [(name, f"Could not parse: {e}")]
+
+    posts = []
+    for post_name, row in parsed:
+        if not isinstance(row, (dict, str)):
+            row = "Expected a JSON object"
+        elif isinstance(row, dict) and not lower.endswith(HTML_SUFFIXES):
+            row = json_post(row)
+        elif isinstance(row, dict):
+            # Pages leave out zero counts rather than showing them
+            for field in ("reactions", "comments", "shares"):
+                row.setdefault(field, 0)
+        if isinstance(row, dict):
+            row["linkedin_url"] = canonical_url(row.get("linkedin_url")) or row.get("linkedin_url")
+            if modified is not None:
+                row.setdefault("scraped_at", modified)
+        posts.append((post_name, row))
+    return posts
+
+
+def parse_sources(batch: List[Source]) -> List[Tuple[str, Union[Dict[str, Any], str]]]:
+    """Process pool entry point; one call per batch keeps pickling overhead low"""
+    return [post for source in batch for post in parse_source(source)]
+
+
+def is_document(name: str) -> bool:
+    return name.lower().endswith(HTML_SUFFIXES + JSON_SUFFIXES)
+
+
+def iter_archive(name: str, fileobj: BinaryIO) -> Iterator[Source]:
+    if name.lower().endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and is_document(member.filename):
+                    yield f"{name}/{member.filename}", archive.read(member), datetime(*member.date_time)
+        return
+    with tarfile.open(fileobj=fileobj, mode="r:*") as archive:
+        for member in archive:
+            if member.isfile() and is_document(member.name):
+                yield f"{name}/{member.name}", archive.extractfile(member).read(), datetime.utcfromtimestamp(member.mtime)
+
+
+def iter_upload(name: str, fileobj: BinaryIO, modified: Optional[datetime] = None) -> Iterator[Source]:
+    """The documents in one uploaded or opened file: an archive's members, or the file itself"""
+    if name.lower().endswith(ARCHIVE_SUFFIXES):
+        yield from iter_archive(name, fileobj)
+    elif is_document(name):
+        yield name, fileobj.read(), modified
+
+
+def iter_sources(paths: Iterable[Union[str, Path]]) -> Iterator[Source]:
+    """The documents under ``paths``: files, directories (recursively) and archives"""
+    for path in map(Path, paths):
+        files = sorted(child for child in path.rglob("*") if child.is_file()) if path.is_dir() else [path]
+        for file in files:
+            if not file.name.lower().endswith(ARCHIVE_SUFFIXES) and not is_document(file.name):
+                continue
+            with open(file, "rb") as fileobj:
+                yield from iter_upload(str(file), fileobj, datetime.utcfromtimestamp(file.stat().st_mtime))
+
+
+def post_upsert(fields: Dict[str, Any], new_id: str, defaults: Optional[Dict[str, Any]] = None) -> UpdateOne:
+    """Insert or update the post at ``fields["linkedin_url"]``; ``defaults`` are only written when inserting"""
+    return UpdateOne(
+        {"linkedin_url": fields["linkedin_url"]}, {"$set": fields, "$setOnInsert": {"id": new_id, **(defaults or {})}}, upsert=True
+    )
+
+
+async def ingest_posts(
+    collection,
+    sources: Iterable[Source],
+    model: Type[BaseModel],
+    ranker,
+    workers: Optional[int] = None,
+    batch_size: int = 64,
+    chunk_size: int = 1000,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """Parse ``sources`` across ``workers`` processes and upsert the posts into ``collection``.
+
+    Every post is validated against ``model``; ``engagement_score`` (unless
+    given) and ``hot_score`` come from ``ranker``. Posts repeating a
+    ``linkedin_url`` already seen in the run are counted as duplicates and
+    the last one wins. ``workers=0`` parses in this process. Sources are
+    read in a thread so the event loop stays free.
+    """
+    started = time.perf_counter()
+    report: Dict[str, Any] = {
+        "documents": 0, "posts": 0, "inserted": 0, "updated": 0, "duplicates": 0, "failed": 0, "errors": [],
+    }
+    loop = asyncio.get_running_loop()
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    chunk: Dict[str, Any] = {}
+    seen = set()
+
+    def record_error(source: str, errors: List[str]):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"source": source, "errors": errors})
+
+    async def flush():
+        if not chunk:
+            return
+        posts = [post.model_dump() for post in chunk.values()]
+        # A scraped_at the model filled in is the time of this import; re-ingesting must not move it
+        defaulted = ["scraped_at" not in post.model_fields_set for post in chunk.values()]
+        chunk.clear()
+        for post, score in zip(posts, ranker.score(posts).tolist()):
+            if post.get("engagement_score") is None:
+                post["engagement_score"] = round(ranker.weighted(post))
+            post["hot_score"] = score
+        if dry_run:
+            return
+        operations = [
+            post_upsert(post, post.pop("id"), {"scraped_at": post.pop("scraped_at")} if default else None)
+            for post, default in zip(posts, defaulted)
+        ]
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # An upsert that lost an insert race with another import hits the unique index; retried, it updates
+            raced = [operations[error["index"]] for error in e.details["writeErrors"] if error["code"] == DUPLICATE_KEY]
+            if len(raced) < len(e.details["writeErrors"]):
+                raise
+            report["inserted"] += e.details["nUpserted"]
+            report["updated"] += e.details["nMatched"]
+            result = await collection.bulk_write(raced, ordered=False)
+        report["inserted"] += result.upserted_count
+        report["updated"] += result.matched_count
+
+    async def handle(parsed: List[Tuple[str, Union[Dict[str, Any], str]]]):
+        for name, row in parsed:
+            report["posts"] += 1
+            if isinstance(row, str):
+                record_error(name, [row])
+                continue
+            try:
+                post = model(**row)
+            except ValidationError as e:
+                record_error(name, [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()])
+                continue
+            if post.linkedin_url in seen:
+                report["duplicates"] += 1
+            seen.add(post.linkedin_url)
+            chunk[post.linkedin_url] = post
+            if len(chunk) >= chunk_size:
+                await flush()
+
+    source_iter = iter(sources)
+    batches = iter(lambda: list(islice(source_iter, batch_size)), [])
+    if workers == 0:
+        while batch := await loop.run_in_executor(None, next, batches, None):
+            report["documents"] += len(batch)
+            await handle(parse_sources(batch))
+    else:
+        # spawn rather than fork: the parent runs Motor's and the event loop's threads
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            in_flight: List[asyncio.Future] = []
+            while batch := await loop.run_in_executor(None, next, batches, None):
+                report["documents"] += len(batch)
+                in_flight.append(loop.run_in_executor(pool, parse_sources, batch))
+                # Keep every worker busy while bounding how many parsed batches wait in memory
+                if len(in_flight) >= 2 * workers:
+                    await handle(await in_flight.pop(0))
+            for future in in_flight:
+                await handle(await future)
+    await flush()
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["documents_per_second"] = round(report["documents"] / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from engagement import EngagementRanker, parse_weights
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    parser = argparse.ArgumentParser(description="Ingest saved LinkedIn post HTML/JSON into viral_posts")
+    parser.add_argument("paths", nargs="+", help="files, directories or archives")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count, 0 parses in-process)")
+    parser.add_argument("--batch-size", type=int, default=64, help="documents per worker task")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="parse and validate only, write nothing")
+    args = parser.parse_args()
+
+    async def main():
+        from server import ViralPost
+
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        ranker = EngagementRanker(
+            weights=parse_weights(os.environ.get('ENGAGEMENT_WEIGHTS', '')),
+            half_life_hours=float(os.environ.get('ENGAGEMENT_HALF_LIFE_HOURS', 48)),
+        )
+        report = await ingest_posts(
+            db.viral_posts, iter_sources(args.paths), ViralPost, ranker,
+            workers=args.workers, batch_size=args.batch_size, chunk_size=args.chunk_size, dry_run=args.dry_run,
+        )
+        client.close()
+        for error in report.pop("errors"):
+            print(f"{error['source']}: {'; '.join(error['errors'])}")
+        print(json.dumps(report, indent=2))
+
+    asyncio.run(main())
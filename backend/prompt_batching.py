@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Appended to the batched user prompt; parse_batch_response reads this shape back
+BATCH_OUTPUT_INSTRUCTIONS = """Respond with a single JSON object and nothing else, in exactly this shape:
+{"messages": [{"target_id": "<target id>", "content": "<message text>"}, ...]}
+Write one entry per profile above, using the profile's target id verbatim."""
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def parse_batch_response(text: str, target_ids: List[str]) -> Dict[str, str]:
+    """Extract ``{target_id: content}`` from a batched completion.
+
+    Accepts the ``{"messages": [...]}`` object or a bare array, optionally
+    wrapped in a code fence or surrounded by prose. Entries for unknown ids,
+    repeated ids and empty contents are dropped, so the caller can fall back
+    to single generations for whatever is missing.
+    """
+    text = _FENCE.sub("", text.strip())
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return {}
+    start = min(starts)
+    end = text.rfind("}" if text[start] == "{" else "]")
+    try:
+        payload = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+
+    entries = payload.get("messages") if isinstance(payload, dict) else payload
+    if not isinstance(entries, list):
+        return {}
+    expected: Set[str] = set(target_ids)
+    results: Dict[str, str] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        target_id = str(entry.get("target_id", ""))
+        content = entry.get("content")
+        if target_id in expected and target_id not in results and isinstance(content, str) and content.strip():
+            results[target_id] = content.strip()
+    return results
+
+
+class PromptBatcher:
+    """Coalesce per-target generations into multi-target LLM calls.
+
+    Callers await ``generate(target)`` one target at a time (as the batch
+    workers do); targets are grouped until ``batch_size`` are waiting or
+    ``linger`` seconds pass, then sent as one request through
+    ``generate_batch``. Targets missing from the parsed response, or all of
+    them when the batched call fails, are retried with ``generate_single``.
+    """
+
+    STAT_KEYS = ("batches", "batched_rows", "fallback_rows", "failed_batches")
+
+    def __init__(
+        self,
+        generate_batch: Callable[[List[Dict[str, Any]]], Awaitable[str]],
+        generate_single: Callable[[Dict[str, Any]], Awaitable[str]],
+        batch_size: int = 8,
+        linger: float = 0.05,
+    ):
+        self.generate_batch = generate_batch
+        self.generate_single = generate_single
+        self.batch_size = batch_size
+        self.linger = linger
+        self._waiting: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = dict.fromkeys(self.STAT_KEYS, 0)
+
+    async def generate(self, target: Dict[str, Any]) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((target, future))
+        if len(self._waiting) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._waiting = self._waiting, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        targets = [target for target, _ in batch]
+        self.stats["batches"] += 1
+        try:
+            results = parse_batch_response(await self.generate_batch(targets), [t["id"] for t in targets])
+        except Exception as e:
+            logger.warning(f"Batched generation of {len(targets)} targets failed, falling back to singles: {e}")
+            self.stats["failed_batches"] += 1
+            results = {}
+        self.stats["batched_rows"] += len(results)
+
+        async def settle(target: Dict[str, Any], future: asyncio.Future):
+            content = results.get(target["id"])
+            if content is None:
+                self.stats["fallback_rows"] += 1
+                try:
+                    content = await self.generate_single(target)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    return
+            if not future.done():
+                future.set_result(content)
+
+        await asyncio.gather(*(settle(target, future) for target, future in batch))
@@ -0,0 +1,380 @@
+"""Versioned prompt templates with token budgeting.
+
+Templates are parsed once at import into literal/field segments, so
+rendering is a single join. Each version is immutable once shipped: the
+rendered prompt feeds the LLM cache key, and the version is stored on every
+``Message``/``GeneratedPost`` so prompt variants can be compared. ``v1``
+reproduces the original inline prompts byte for byte; ``v2`` is shorter and
+fits free-text profile fields and viral-post excerpts into token budgets.
+A profile carrying a ``message_history`` summary (see ``target_context``)
+gets it appended after the profile; without one, prompts are unchanged.
+
+Token counts use ``tiktoken``'s cl100k_base encoding (a requirement). It is
+loaded on first use, not at import: the first load may download the BPE
+file (cached under ``TIKTOKEN_CACHE_DIR``), so the API warms it in a
+background thread at startup. If tiktoken is missing or the file cannot be
+fetched, counts fall back to a ~4 characters per token estimate and a
+warning is logged once.
+"""
+import hashlib
+import logging
+import math
+import string
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ELLIPSIS = "…"
+
+
+@lru_cache(maxsize=None)
+def encoding():
+    """The cl100k_base encoding, or None when tiktoken is unavailable"""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating ~4 characters per token: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if encoding() is not None:
+        return len(encoding().encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to at most ``max_tokens`` tokens, on a word boundary where possible"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 1:
+        return ""
+    if encoding() is not None:
+        cut = encoding().decode(encoding().encode(text, disallowed_special=())[:max_tokens - 1])
+    else:
+        cut = text[:(max_tokens - 1) * 4]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,;:.-") + ELLIPSIS
+
+
+def fit_to_budget(texts: List[str], budget: int) -> List[str]:
+    """Truncate ``texts`` so together they fit ``budget`` tokens.
+
+    The budget is shared evenly, and texts shorter than their share hand the
+    remainder to the longer ones, so short excerpts are never cut.
+    """
+    counts = [count_tokens(text) for text in texts]
+    if sum(counts) <= budget:
+        return list(texts)
+    limits = [0] * len(texts)
+    remaining = budget
+    for position, index in enumerate(sorted(range(len(texts)), key=counts.__getitem__)):
+        limits[index] = min(counts[index], remaining // (len(texts) - position))
+        remaining -= limits[index]
+    return [truncate_to_tokens(text, limit) for text, limit in zip(texts, limits)]
+
+
+class CompiledTemplate:
+    """A ``str.format``-style template parsed once; format specs are not supported"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.segments = [(literal, field) for literal, field, _, _ in string.Formatter().parse(text)]
+        self.fields = {field for _, field in self.segments if field}
+
+    def render(self, values: Dict[str, Any]) -> str:
+        parts = []
+        for literal, field in self.segments:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        return "".join(parts)
+
+
+class MessageTemplate:
+    """System/user prompt pair for one message type at one version.
+
+    ``budgets`` caps free-text profile fields in tokens; ``history`` is
+    appended to the profile when it has a ``message_history``. ``legacy_values``
+    keeps v1's ``dict.get`` defaults (a present-but-None field renders as
+    "None") so v1 prompts, and their cache keys, stay unchanged.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        system: str,
+        user: str,
+        profile: str,
+        batch_user: str,
+        budgets: Optional[Dict[str, int]] = None,
+        legacy_values: bool = False,
+        history: Optional[str] = None,
+    ):
+        self.version = version
+        self.system = CompiledTemplate(system)
+        self.user = CompiledTemplate(user)
+        self.profile = CompiledTemplate(profile)
+        self.batch_user = CompiledTemplate(batch_user)
+        self.history = CompiledTemplate(history or _HISTORY)
+        self.budgets = budgets or {}
+        self.legacy_values = legacy_values
+
+    def values(self, profile_data: Dict[str, Any], message_type: str) -> Dict[str, Any]:
+        defaults = {
+            "name": "Unknown",
+            "title": "Unknown",
+            "company": "Unknown",
+            "profile_summary": "No summary available",
+            "recent_activity": "No recent activity",
+        }
+        if self.legacy_values:
+            values = {field: profile_data.get(field, default) for field, default in defaults.items()}
+        else:
+            values = {field: profile_data.get(field) or default for field, default in defaults.items()}
+        for field, budget in self.budgets.items():
+            values[field] = truncate_to_tokens(str(values[field]), budget)
+        values["message_type"] = message_type
+        values["target_id"] = profile_data.get("id", "")
+        values["message_history"] = profile_data.get("message_history") or ""
+        return values
+
+    def render(self, profile_data: Dict[str, Any], message_type: str) -> Tuple[str, str]:
+        values = self.values(profile_data, message_type)
+        user = self.user.render(values)
+        if values["message_history"]:
+            user = f"{user.rstrip()}\n\n{self.history.render(values)}"
+        return self.system.render(values), user
+
+    def render_profile(self, values: Dict[str, Any]) -> str:
+        profile = self.profile.render(values)
+        if values["message_history"]:
+            profile = f"{profile}\n{self.history.render(values)}"
+        return profile
+
+    def render_batch(self, targets: List[Dict[str, Any]], message_type: str, output_instructions: str) -> Tuple[str, str]:
+        profiles = "\n\n".join(self.render_profile(self.values(target, message_type)) for target in targets)
+        values = {"message_type": message_type, "profiles": profiles, "output_instructions": output_instructions}
+        return self.system.render(values), self.batch_user.render(values)
+
+
+class PostTemplate:
+    """Viral post prompt; excerpts are cut to ``excerpt_chars`` each or share ``excerpt_budget`` tokens"""
+
+    def __init__(
+        self,
+        version: str,
+        system: str,
+        user: str,
+        excerpt: str,
+        excerpt_chars: Optional[int] = None,
+        excerpt_budget: Optional[int] = None,
+    ):
+        self.version = version
+        self.system = CompiledTemplate(system)
+        self.user = CompiledTemplate(user)
+        self.excerpt = CompiledTemplate(excerpt)
+        self.excerpt_chars = excerpt_chars
+        self.excerpt_budget = excerpt_budget
+
+    def render(self, viral_posts: List[Dict[str, Any]], topic: Optional[str] = None) -> Tuple[str, str]:
+        contents = [post.get("original_content", "") for post in viral_posts]
+        if self.excerpt_chars is not None:
+            contents = [content[:self.excerpt_chars] for content in contents]
+        if self.excerpt_budget is not None:
+            contents = fit_to_budget(contents, self.excerpt_budget)
+        excerpts = "\n\n".join(
+            self.excerpt.render({"number": i + 1, "content": content, "engagement_score": post.get("engagement_score", 0)})
+            for i, (post, content) in enumerate(zip(viral_posts, contents))
+        )
+        values = {"viral_content": excerpts, "topic": topic or "AI/ML trends"}
+        return self.system.render(values), self.user.render(values)
+
+
+_HISTORY = """Earlier messages to them (build on these, never repeat them):
+{message_history}"""
+
+
+def _legacy(*lines: str) -> str:
+    """Join lines with the 8-space indentation the original inline f-strings carried"""
+    return "\n        ".join(lines)
+
+
+_V1_MESSAGE = MessageTemplate(
+    "v1",
+    system=_legacy(
+        "You are an expert at writing personalized LinkedIn {message_type} messages.",
+        "",
+        "Guidelines:",
+        "- Keep messages under 250 words",
+        "- Be professional but friendly",
+        "- Reference specific details from their profile",
+        "- Focus on AI/ML expertise and hiring",
+        "- Include a clear call to action",
+        "- Avoid generic phrases",
+        "",
+    ),
+    user=_legacy(
+        "Generate a {message_type} message for this LinkedIn profile:",
+        "",
+        "Name: {name}",
+        "Title: {title}",
+        "Company: {company}",
+        "Profile Summary: {profile_summary}",
+        "Recent Activity: {recent_activity}",
+        "",
+        "The message should be personalized and mention their AI/ML work and hiring expertise.",
+        "",
+    ),
+    profile=_legacy(
+        "Target id: {target_id}",
+        "Name: {name}",
+        "Title: {title}",
+        "Company: {company}",
+        "Profile Summary: {profile_summary}",
+        "Recent Activity: {recent_activity}",
+    ),
+    batch_user=_legacy(
+        "Generate a {message_type} message for each of these LinkedIn profiles:",
+        "",
+        "{profiles}",
+        "",
+        "Each message should be personalized and mention their AI/ML work and hiring expertise.",
+        "",
+    ) + "\n{output_instructions}",
+    legacy_values=True,
+)
+
+_V2_PROFILE = """Target id: {target_id}
+Name: {name} | {title} at {company}
+Summary: {profile_summary}
+Recent activity: {recent_activity}"""
+
+_V2_USER = """Name: {name} | {title} at {company}
+Summary: {profile_summary}
+Recent activity: {recent_activity}
+
+Write the {message_type} message."""
+
+_V2_BATCH_USER = """Write one {message_type} message for each profile.
+
+{profiles}
+
+{output_instructions}"""
+
+
+def _v2_message(system: str, budgets: Dict[str, int]) -> MessageTemplate:
+    return MessageTemplate("v2", system, _V2_USER, _V2_PROFILE, _V2_BATCH_USER, budgets=budgets)
+
+
+# version -> message_type -> template; "*" covers message types without their own template
+MESSAGE_TEMPLATES: Dict[str, Dict[str, MessageTemplate]] = {
+    "v1": {"*": _V1_MESSAGE},
+    "v2": {
+        "connection_request": _v2_message(
+            "You write LinkedIn connection request notes for an AI/ML recruiter. "
+            "Stay under 300 characters (LinkedIn's limit), cite one specific detail from the profile, "
+            "mention their AI/ML or hiring work, and end with a reason to connect. No generic phrases.",
+            {"profile_summary": 120, "recent_activity": 60},
+        ),
+        "follow_up": _v2_message(
+            "You write LinkedIn follow-up messages for an AI/ML recruiter to people already connected. "
+            "Under 150 words, friendly and specific: build on their recent activity, "
+            "connect it to an AI/ML opportunity and ask one clear question. No generic phrases.",
+            {"profile_summary": 80, "recent_activity": 120},
+        ),
+        "*": _v2_message(
+            "You write personalized LinkedIn {message_type} messages for an AI/ML recruiter. "
+            "Under 250 words, professional but friendly, cite specific profile details, "
+            "focus on their AI/ML and hiring work, end with a clear call to action. No generic phrases.",
+            {"profile_summary": 120, "recent_activity": 80},
+        ),
+    },
+}
+
+POST_TEMPLATES: Dict[str, PostTemplate] = {
+    "v1": PostTemplate(
+        "v1",
+        system=_legacy(
+            "You are an expert at creating viral LinkedIn posts about AI/ML.",
+            "",
+            "Guidelines:",
+            "- Keep posts under 1300 characters",
+            "- Start with a compelling hook",
+            "- Include a data point or insight",
+            "- End with a clear call to action",
+            "- Use line breaks for readability",
+            "- Make it algorithm-friendly",
+            "",
+        ),
+        user=_legacy(
+            "Based on these viral AI/ML posts, create a new viral post:",
+            "",
+            "{viral_content}",
+            "",
+            "Create an original post that captures the essence of what makes these posts viral "
+            "while adding your own unique perspective on AI/ML trends.",
+            "",
+        ),
+        excerpt="Post {number}: {content}...",
+        excerpt_chars=200,
+    ),
+    "v2": PostTemplate(
+        "v2",
+        system="You write viral LinkedIn posts about AI/ML. Under 1300 characters, open with a hook, "
+               "include one data point or insight, use short paragraphs and end with a call to action.",
+        user="""High-engagement posts for reference:
+
+{viral_content}
+
+Write an original post on {topic} that borrows what makes these work without copying them.""",
+        excerpt="[{number}] ({engagement_score} engagement) {content}",
+        excerpt_budget=300,
+    ),
+}
+
+
+def message_template(message_type: str, version: str) -> MessageTemplate:
+    if version not in MESSAGE_TEMPLATES:
+        raise ValueError(f"Unknown message prompt version '{version}'; use one of {', '.join(MESSAGE_TEMPLATES)}")
+    templates = MESSAGE_TEMPLATES[version]
+    return templates.get(message_type, templates["*"])
+
+
+def post_template(version: str) -> PostTemplate:
+    if version not in POST_TEMPLATES:
+        raise ValueError(f"Unknown post prompt version '{version}'; use one of {', '.join(POST_TEMPLATES)}")
+    return POST_TEMPLATES[version]
+
+
+def parse_version_weights(spec: str, known: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """Parse an A/B split like ``"v1:20,v2:80"`` (a bare ``"v2"`` means 100%)"""
+    weights = []
+    for part in spec.split(","):
+        version, _, weight = part.strip().partition(":")
+        if not version:
+            continue
+        if version not in known:
+            raise ValueError(f"Unknown prompt version '{version}'; use one of {', '.join(known)}")
+        weights.append((version, float(weight or 1)))
+    if not weights or sum(weight for _, weight in weights) <= 0:
+        raise ValueError(f"Invalid prompt version split '{spec}'")
+    return weights
+
+
+def choose_version(weights: List[Tuple[str, float]], seed: str) -> str:
+    """Deterministically assign ``seed`` (e.g. a target id) to a weighted version"""
+    point = int(hashlib.sha256(seed.encode("utf-8")).hexdigest()[:8], 16) / 0x100000000
+    point *= sum(weight for _, weight in weights)
+    for version, weight in weights:
+        if point < weight:
+            return version
+        point -= weight
+    return weights[-1][0]
@@ -0,0 +1,306 @@
+"""Outreach prioritization and daily send plans.
+
+Every target that can be contacted (``not_connected`` targets get a
+connection request, ``connected`` ones a follow-up) is scored from
+
+* its connection status,
+* whether its title or company matches the configured priority keywords,
+* how recent its ``recent_activity`` is ("posted 3 days ago"; without a
+  time phrase the record's ``updated_at`` stands in), halving every
+  ``activity_half_life_days``,
+* the smoothed reply rate of earlier messages to people at the same company,
+
+and the weighted sum is kept as ``priority`` in the ``outreach_queue``
+collection. ``rebuild_queue`` rescans the targets in batches, scores each
+batch with NumPy and bulk-writes only the entries that changed.
+``plan_day`` walks the queue by priority through the ``status_priority``
+index and hands out targets to sending accounts until the global or every
+per-account daily quota is used up.
+"""
+import math
+import re
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# connection_status -> the message the next touch would be
+STATUS_ACTIONS = {"not_connected": "connection_request", "connected": "follow_up"}
+STATUS_WEIGHTS = {"not_connected": 1.0, "connected": 0.8}
+DEFAULT_WEIGHTS = {"status": 0.3, "title": 0.25, "company": 0.15, "recency": 0.15, "reply_rate": 0.15}
+DEFAULT_TITLES = ("chief", "cto", "ceo", "founder", "vp", "head", "director", "principal", "lead", "manager")
+
+# Message statuses that mean the message went out (and could have been answered)
+SENT_STATUSES = ("sent", "delivered", "replied")
+
+_AGO = re.compile(r"\b(\d+|an?|one)\s*(minute|hour|day|week|month|year)s?\s+ago\b")
+_RELATIVE_DAYS = {"today": 0.0, "yesterday": 1.0, "last week": 7.0, "last month": 30.0}
+_UNIT_DAYS = {"minute": 1 / 1440, "hour": 1 / 24, "day": 1.0, "week": 7.0, "month": 30.0, "year": 365.0}
+
+
+def parse_quotas(spec: str) -> Dict[str, int]:
+    """``"alice:80,bob:40"`` -> per-account daily quotas"""
+    quotas = {}
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        account, _, quota = part.partition(":")
+        quotas[account.strip()] = int(quota or 0)
+    return quotas
+
+
+def keyword_pattern(keywords: Iterable[str]) -> Optional[re.Pattern]:
+    words = [re.escape(word.strip().lower()) for word in keywords if word.strip()]
+    return re.compile(r"\b(?:" + "|".join(words) + r")\b") if words else None
+
+
+def activity_age_days(activity: Optional[str], updated_at: Optional[datetime], now: datetime) -> float:
+    """Days since the activity described in ``activity``; NaN when there is none"""
+    if not activity or not activity.strip():
+        return math.nan
+    text = activity.lower()
+    match = _AGO.search(text)
+    if match:
+        count = 1 if match.group(1) in ("a", "an", "one") else int(match.group(1))
+        return count * _UNIT_DAYS[match.group(2)]
+    for phrase, days in _RELATIVE_DAYS.items():
+        if phrase in text:
+            return days
+    if updated_at is None:
+        return math.nan
+    return max((now - updated_at).total_seconds() / 86400, 0.0)
+
+
+def company_reply_rates_pipeline() -> List[Dict[str, Any]]:
+    """Sent and replied message counts per target company"""
+    return [
+        {"$match": {"status": {"$in": list(SENT_STATUSES)}}},
+        {"$group": {
+            "_id": "$target_id",
+            "sent": {"$sum": 1},
+            "replied": {"$sum": {"$cond": [{"$eq": ["$status", "replied"]}, 1, 0]}},
+        }},
+        {"$lookup": {"from": "targets", "localField": "_id", "foreignField": "id", "as": "target"}},
+        {"$unwind": "$target"},
+        {"$group": {"_id": {"$toLower": "$target.company"}, "sent": {"$sum": "$sent"}, "replied": {"$sum": "$replied"}}},
+    ]
+
+
+async def company_reply_rates(db) -> Dict[str, Tuple[int, int]]:
+    """``{lowercased company: (sent, replied)}``"""
+    rates = {}
+    async for row in db.messages.aggregate(company_reply_rates_pipeline()):
+        rates[row["_id"] or ""] = (row["sent"], row["replied"])
+    return rates
+
+
+class TargetScorer:
+    """Vectorized priority scores for batches of target documents.
+
+    Reply rates are smoothed toward ``reply_prior`` with the weight of
+    ``reply_prior_weight`` messages, so one lucky reply does not put a
+    company at the top.
+    """
+
+    FIELDS = ("id", "title", "company", "recent_activity", "connection_status", "account", "updated_at")
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        titles: Sequence[str] = DEFAULT_TITLES,
+        companies: Sequence[str] = (),
+        activity_half_life_days: float = 14.0,
+        reply_prior: float = 0.1,
+        reply_prior_weight: float = 5.0,
+    ):
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.title_pattern = keyword_pattern(titles)
+        self.company_pattern = keyword_pattern(companies)
+        self.activity_half_life_days = activity_half_life_days
+        self.reply_prior = reply_prior
+        self.reply_prior_weight = reply_prior_weight
+
+    def _matches(self, pattern: Optional[re.Pattern], values: Sequence[Optional[str]]) -> np.ndarray:
+        if pattern is None:
+            return np.zeros(len(values))
+        return np.fromiter((pattern.search((value or "").lower()) is not None for value in values), dtype=np.float64)
+
+    def score(self, targets: Sequence[Dict[str, Any]], reply_rates: Dict[str, Tuple[int, int]], now: datetime) -> np.ndarray:
+        status = np.array([STATUS_WEIGHTS.get(t.get("connection_status"), 0.0) for t in targets], dtype=np.float64)
+        title = self._matches(self.title_pattern, [t.get("title") for t in targets])
+        company = self._matches(self.company_pattern, [t.get("company") for t in targets])
+
+        ages = np.array([activity_age_days(t.get("recent_activity"), t.get("updated_at"), now) for t in targets], dtype=np.float64)
+        recency = np.where(np.isnan(ages), 0.0, 0.5 ** (np.nan_to_num(ages) / self.activity_half_life_days))
+
+        counts = np.array([reply_rates.get((t.get("company") or "").lower(), (0, 0)) for t in targets], dtype=np.float64).reshape(-1, 2)
+        reply_rate = (counts[:, 1] + self.reply_prior * self.reply_prior_weight) / (counts[:, 0] + self.reply_prior_weight)
+
+        w = self.weights
+        return (
+            w["status"] * status
+            + w["title"] * title
+            + w["company"] * company
+            + w["recency"] * recency
+            + w["reply_rate"] * reply_rate
+        )
+
+
+async def rebuild_queue(db, scorer: TargetScorer, today: date, batch_size: int = 5000) -> Dict[str, int]:
+    """Rescore every target into ``outreach_queue``.
+
+    Contactable targets are upserted when their priority, action or account
+    changed; entries for targets that can no longer be contacted are removed;
+    entries planned for an earlier day but still contactable go back to
+    ``queued``.
+    """
+    now = datetime.utcnow()
+    reply_rates = await company_reply_rates(db)
+    existing: Dict[str, Dict[str, Any]] = {
+        entry["target_id"]: entry
+        async for entry in db.outreach_queue.find({}, {"_id": 0, "target_id": 1, "priority": 1, "action": 1, "account": 1, "status": 1, "planned_for": 1})
+    }
+    today_key = today.isoformat()
+    stats = {"scored": 0, "updated": 0, "removed": 0}
+    batch: List[Dict[str, Any]] = []
+
+    async def flush():
+        scores = scorer.score(batch, reply_rates, now)
+        operations = []
+        for target, priority in zip(batch, scores.tolist()):
+            current = existing.pop(target["id"], None)
+            entry = {"priority": round(priority, 6), "action": STATUS_ACTIONS[target["connection_status"]], "account": target.get("account")}
+            stale_plan = current is not None and current.get("status") == "planned" and (current.get("planned_for") or "") < today_key
+            if current is not None and not stale_plan and all(current.get(key) == value for key, value in entry.items()):
+                continue
+            update: Dict[str, Any] = {"$set": {**entry, "updated_at": now}}
+            if stale_plan:
+                update["$set"].update({"status": "queued", "planned_for": None})
+            else:
+                update["$setOnInsert"] = {"status": "queued", "planned_for": None}
+            operations.append(UpdateOne({"target_id": target["id"]}, update, upsert=True))
+        if operations:
+            await db.outreach_queue.bulk_write(operations, ordered=False)
+        stats["scored"] += len(batch)
+        stats["updated"] += len(operations)
+        batch.clear()
+
+    projection = {"_id": 0, **{field: 1 for field in TargetScorer.FIELDS}}
+    query = {"connection_status": {"$in": list(STATUS_ACTIONS)}}
+    async for target in db.targets.find(query, projection).batch_size(batch_size):
+        batch.append(target)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+
+    # Whatever is left in `existing` belongs to targets that are no longer contactable
+    removals = [DeleteOne({"target_id": target_id}) for target_id in existing]
+    for start in range(0, len(removals), batch_size):
+        await db.outreach_queue.bulk_write(removals[start:start + batch_size], ordered=False)
+    stats["removed"] = len(removals)
+    return stats
+
+
+async def plan_day(
+    db,
+    day: date,
+    daily_quota: int,
+    account_quotas: Dict[str, int],
+    replan: bool = False,
+    max_scan_factor: int = 20,
+) -> Dict[str, Any]:
+    """The send plan for ``day``, created from the highest-priority queued targets if it does not exist.
+
+    Targets pinned to an account only use that account's quota; unpinned
+    targets go to the account with the most quota left. ``replan`` returns
+    the day's entries to the queue and plans again. At most
+    ``max_scan_factor * daily_quota`` entries are read, which bounds the
+    work when most of the queue is pinned to exhausted accounts.
+
+    Each run claims queued entries under its own ``plan_run`` id, so runs
+    made concurrently (in this or another process) never share a target;
+    entries lost to another run are replaced by scanning further. Only one
+    plan per day is stored: a new day's plan is inserted once, and a replan
+    only replaces the plan it started from. A run that loses that race
+    returns its entries to the queue and the stored plan instead.
+    """
+    day_key = day.isoformat()
+    existing = await db.send_plans.find_one({"id": day_key}, {"_id": 0})
+    if existing is not None and not replan:
+        return existing
+    if existing is not None:
+        await db.outreach_queue.update_many(
+            {"status": "planned", "planned_for": day_key, "plan_run": existing.get("plan_run")},
+            {"$set": {"status": "queued", "planned_for": None, "plan_run": None}},
+        )
+    run_id = str(uuid.uuid4())
+
+    remaining = dict(account_quotas)
+    items: List[Dict[str, Any]] = []
+    scanned = 0
+    scan_limit = max_scan_factor * max(daily_quota, 1)
+    while len(items) < daily_quota and any(remaining.values()) and scanned < scan_limit:
+        selected: List[Dict[str, Any]] = []
+        available = dict(remaining)
+        cursor = db.outreach_queue.find({"status": "queued"}, {"_id": 0}).sort([("priority", -1), ("target_id", 1)])
+        async for entry in cursor.batch_size(max(100, min(daily_quota * 2, 5000))):
+            scanned += 1
+            if len(items) + len(selected) >= daily_quota or not any(available.values()) or scanned > scan_limit:
+                break
+            account = entry.get("account")
+            if account is None:
+                account = max(available, key=available.get)
+            if available.get(account, 0) <= 0:
+                continue
+            available[account] -= 1
+            selected.append({
+                "target_id": entry["target_id"],
+                "account": account,
+                "action": entry["action"],
+                "priority": entry["priority"],
+            })
+        if not selected:
+            break
+
+        # Only entries still queued are claimed; the re-read tells which ones this run got
+        selected_ids = [item["target_id"] for item in selected]
+        await db.outreach_queue.update_many(
+            {"target_id": {"$in": selected_ids}, "status": "queued"},
+            {"$set": {"status": "planned", "planned_for": day_key, "plan_run": run_id}},
+        )
+        claimed = {
+            entry["target_id"] async for entry in db.outreach_queue.find(
+                {"target_id": {"$in": selected_ids}, "plan_run": run_id}, {"_id": 0, "target_id": 1}
+            )
+        }
+        for item in selected:
+            if item["target_id"] in claimed:
+                items.append(item)
+                remaining[item["account"]] -= 1
+
+    plan = {
+        "id": day_key,
+        "day": day_key,
+        "total": len(items),
+        "accounts": {account: quota - remaining[account] for account, quota in account_quotas.items()},
+        "items": items,
+        "plan_run": run_id,
+        "created_at": datetime.utcnow(),
+    }
+    if existing is None:
+        try:
+            stored = (await db.send_plans.update_one({"id": day_key}, {"$setOnInsert": plan}, upsert=True)).upserted_id is not None
+        except DuplicateKeyError:
+            stored = False
+    else:
+        stored = (await db.send_plans.replace_one({"id": day_key, "plan_run": existing.get("plan_run")}, plan)).matched_count == 1
+    if not stored:
+        # Another run stored the day's plan first
+        await db.outreach_queue.update_many(
+            {"target_id": {"$in": [item["target_id"] for item in items]}, "plan_run": run_id},
+            {"$set": {"status": "queued", "planned_for": None, "plan_run": None}},
+        )
+        return await db.send_plans.find_one({"id": day_key}, {"_id": 0})
+    return plan
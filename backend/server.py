@@ -1,37 +1,230 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, File, Header, HTTPException, Response, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
+import io
 import logging
+import re
+import tarfile
+import zipfile
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Dict, Any, Tuple
 import uuid
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import openai
-from openai import OpenAI
-import aiohttp
 import asyncio
 import json
 
+from analytics import (
+    compute_analytics,
+    ensure_rollups,
+    increment_counters,
+    read_analytics,
+    reconcile_rollups,
+    record_messages_created,
+    record_target_created,
+    record_target_status_change,
+)
+from batch_generation import run_message_batch
+from engagement import EngagementRanker, parse_weights, parse_window
+from indexes import ensure_indexes
+from job_queue import JobQueue, JobWorker, PermanentJobError, TokenBucket
+from live_updates import LiveFeed
+from llm_cache import LLMResponseCache
+from llm_providers import ollama_provider_from_env, openai_provider_from_env
+from llm_router import AllBackendsFailed, LLMRouter
+import metrics
+from metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware, MongoCommandListener, TimedRoute, parse_prices
+from near_duplicates import NearDuplicateIndex, build_index, generate_distinct
+from exports import EXPORT_FORMATS, iter_export_chunks
+from pagination import MAX_PAGE_SIZE, fetch_page
+from post_ingest import ARCHIVE_SUFFIXES, ingest_posts, iter_upload
+from prompt_batching import BATCH_OUTPUT_INSTRUCTIONS, PromptBatcher
+from prompts import (
+    MESSAGE_TEMPLATES,
+    POST_TEMPLATES,
+    choose_version,
+    encoding as prompt_encoding,
+    message_template,
+    parse_version_weights,
+    post_template,
+)
+from scheduler import DEFAULT_TITLES, TargetScorer, parse_quotas, plan_day, rebuild_queue
+from serialization import model_projection, rows_response
+from target_context import TargetContextCache
+from target_import import detect_format, import_targets, iter_rows
+from target_search import TargetSearchIndex, build_search_index, fetch_ranked, text_search
+from vector_index import HashingEmbedder, OpenAIEmbedder, VectorIndex, sync_index, text_fingerprint
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandListener()])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
 app = FastAPI()
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=TimedRoute)
+
+# Metrics: Server-Timing on every response (otherwise only when the request sends "X-Server-Timing: 1")
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'false').lower() == 'true'
+# LLM prices in USD per million prompt/completion tokens, e.g. "gpt-4.1:2/8,my-model:0.5/1.5", added to the defaults
+metrics.llm_prices = parse_prices(os.environ.get('LLM_PRICES', ''))
+
+# LLM providers (one pooled client each for the lifetime of the app)
+openai_provider = openai_provider_from_env()
+ollama_provider = ollama_provider_from_env()
+OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4.1')
+
+# Provider router: "provider:model" backends tried in latency order, with failover and optional hedging
+LLM_BACKENDS = [
+    backend.strip()
+    for backend in os.environ.get('LLM_BACKENDS', f"openai:{OPENAI_MODEL},ollama:{ollama_provider.model}").split(',')
+    if backend.strip()
+]
+LLM_FAILOVER = os.environ.get('LLM_FAILOVER', 'true').lower() == 'true'
+llm_router = LLMRouter(
+    timeout=float(os.environ['LLM_ROUTER_TIMEOUT']) if os.environ.get('LLM_ROUTER_TIMEOUT') else None,
+    hedge_after=float(os.environ['LLM_HEDGE_AFTER_SECONDS']) if os.environ.get('LLM_HEDGE_AFTER_SECONDS') else None,
+    failure_threshold=int(os.environ.get('LLM_ROUTER_FAILURE_THRESHOLD', 3)),
+    cooldown=float(os.environ.get('LLM_ROUTER_COOLDOWN_SECONDS', 30)),
+)
+
+# LLM response cache (in-process LRU in front of a Mongo TTL collection)
+llm_cache = LLMResponseCache(
+    db.llm_cache,
+    max_entries=int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 1024)),
+    ttl_seconds=float(os.environ.get('LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600)),
+)
+
+@REGISTRY.collector
+def collect_llm_cache_stats():
+    snapshot = llm_cache.snapshot()
+    return [
+        ("llm_cache_lookups_total", "counter", "LLM response cache lookups by result", [({"result": key}, snapshot[key]) for key in llm_cache.stats]),
+        ("llm_cache_entries", "gauge", "Entries in the in-process LRU", [({}, snapshot["entries"])]),
+        ("llm_cache_hit_ratio", "gauge", "Hits (memory, Mongo or coalesced) per hit-or-miss lookup", [({}, snapshot["hit_rate"])]),
+    ]
+
+# Per-target prompt context (stored profile + compacted message history); TTL 0 loads it fresh every time
+target_contexts = TargetContextCache(
+    db.targets,
+    db.messages,
+    max_entries=int(os.environ.get('TARGET_CONTEXT_CACHE_MAX_ENTRIES', 2048)),
+    ttl_seconds=float(os.environ.get('TARGET_CONTEXT_CACHE_SECONDS', 300)),
+    recent_messages=int(os.environ.get('TARGET_CONTEXT_RECENT_MESSAGES', 3)),
+    history_budget=int(os.environ.get('TARGET_CONTEXT_HISTORY_TOKENS', 150)),
+)
 
-# OpenAI configuration
-openai_client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
+@REGISTRY.collector
+def collect_target_context_stats():
+    snapshot = target_contexts.snapshot()
+    return [
+        ("target_context_lookups_total", "counter", "Target context cache lookups by result",
+         [({"result": key}, snapshot[key]) for key in ("hits", "misses", "not_found")]),
+        ("target_context_invalidations_total", "counter", "Target contexts dropped after a target or message write", [({}, snapshot["invalidations"])]),
+        ("target_context_entries", "gauge", "Target contexts cached in process", [({}, snapshot["entries"])]),
+    ]
+
+# Prompt template versions as weighted A/B splits, e.g. "v1:20,v2:80"; a target always gets the same arm
+MESSAGE_PROMPT_VERSIONS = parse_version_weights(os.environ.get('MESSAGE_PROMPT_VERSIONS', 'v2'), MESSAGE_TEMPLATES)
+POST_PROMPT_VERSIONS = parse_version_weights(os.environ.get('POST_PROMPT_VERSIONS', 'v2'), POST_TEMPLATES)
+
+# Viral post embeddings for topic retrieval ("hashing" is local and deterministic, "openai" calls the embeddings API)
+if os.environ.get('VIRAL_POST_EMBEDDER', 'hashing') == 'openai':
+    viral_post_embedder = OpenAIEmbedder(
+        openai_provider.client,
+        model=os.environ.get('EMBEDDING_MODEL', 'text-embedding-3-small'),
+        dim=int(os.environ.get('EMBEDDING_DIM', 512))
+    )
+else:
+    viral_post_embedder = HashingEmbedder(dim=int(os.environ.get('EMBEDDING_DIM', 256)))
+# Directory for the memory-mapped index files; empty keeps the index in memory only
+VECTOR_INDEX_DIR = os.environ.get('VECTOR_INDEX_DIR', str(ROOT_DIR / 'vector_index'))
+# Share of the retrieval score given to engagement (the rest is topic similarity)
+VIRAL_POST_ENGAGEMENT_WEIGHT = float(os.environ.get('VIRAL_POST_ENGAGEMENT_WEIGHT', 0.2))
+viral_post_index: Optional[VectorIndex] = None
+
+# Viral post ranking: weighted reactions/comments/shares halving every ENGAGEMENT_HALF_LIFE_HOURS after scraping
+engagement_ranker = EngagementRanker(
+    weights=parse_weights(os.environ.get('ENGAGEMENT_WEIGHTS', '')),
+    half_life_hours=float(os.environ.get('ENGAGEMENT_HALF_LIFE_HOURS', 48)),
+    cache_seconds=float(os.environ.get('VIRAL_POST_TOP_CACHE_SECONDS', 60)),
+)
+MAX_VIRAL_POSTS_LIMIT = 100
+
+# Outreach scheduling: daily send quotas, globally and per sending account ("alice:80,bob:40")
+SCHEDULER_DAILY_QUOTA = int(os.environ.get('SCHEDULER_DAILY_QUOTA', 100))
+SCHEDULER_ACCOUNT_QUOTAS = parse_quotas(os.environ.get('SCHEDULER_ACCOUNT_QUOTAS', f"default:{SCHEDULER_DAILY_QUOTA}"))
+target_scorer = TargetScorer(
+    titles=os.environ['SCHEDULER_PRIORITY_TITLES'].split(',') if os.environ.get('SCHEDULER_PRIORITY_TITLES') else DEFAULT_TITLES,
+    companies=os.environ.get('SCHEDULER_PRIORITY_COMPANIES', '').split(','),
+    activity_half_life_days=float(os.environ.get('SCHEDULER_ACTIVITY_HALF_LIFE_DAYS', 14)),
+)
+
+# Near-duplicate drafts: "flag" marks them, "regenerate" retries generation first, "off" skips the check
+NEAR_DUPLICATE_ACTION = os.environ.get('NEAR_DUPLICATE_ACTION', 'flag')
+# Estimated Jaccard similarity of word 3-grams at which two drafts count as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.7))
+NEAR_DUPLICATE_MAX_RETRIES = int(os.environ.get('NEAR_DUPLICATE_MAX_RETRIES', 2))
+message_duplicates = NearDuplicateIndex(threshold=NEAR_DUPLICATE_THRESHOLD)
+post_duplicates = NearDuplicateIndex(threshold=NEAR_DUPLICATE_THRESHOLD)
+
+# Target search: an in-process prefix/typo-tolerant index loaded at startup; "false" leaves search to MongoDB's text index
+TARGET_SEARCH_INDEX = os.environ.get('TARGET_SEARCH_INDEX', 'true').lower() == 'true'
+target_search_index = TargetSearchIndex()
+MAX_TARGET_SEARCH_LIMIT = 100
+
+# Live dashboard updates: "auto" uses change streams when the server supports them and polls otherwise
+LIVE_UPDATES_MODE = os.environ.get('LIVE_UPDATES_MODE', 'auto')  # auto, change_stream, poll, off
+live_feed = LiveFeed(
+    db,
+    mode=LIVE_UPDATES_MODE,
+    poll_interval=float(os.environ.get('LIVE_UPDATES_POLL_SECONDS', 1)),
+    flush_interval=float(os.environ.get('LIVE_UPDATES_FLUSH_SECONDS', 0.25)),
+)
+# Seconds between keep-alive comments on idle live streams (proxies drop silent connections)
+LIVE_UPDATES_HEARTBEAT_SECONDS = float(os.environ.get('LIVE_UPDATES_HEARTBEAT_SECONDS', 15))
+
+# Serve canned messages instead of calling the LLM (for testing without an API key)
+MOCK_LLM_RESPONSES = os.environ.get('MOCK_LLM_RESPONSES', 'true').lower() == 'true'
+
+# Longest daily_activity window served by /api/analytics
+MAX_ANALYTICS_DAYS = 366
+
+# Rows per bulk_write when importing targets
+TARGET_IMPORT_CHUNK_SIZE = int(os.environ.get('TARGET_IMPORT_CHUNK_SIZE', 1000))
+# Parser processes for uploaded archives of saved posts (single pages are parsed in the server process)
+POST_INGEST_WORKERS = int(os.environ.get('POST_INGEST_WORKERS', os.cpu_count() or 1))
+
+# Documents fetched per cursor round trip when streaming exports
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+
+# List endpoints encode stored rows with orjson instead of validating each one through its Pydantic model twice
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', 'true').lower() == 'true'
+
+# Batch generation
+BATCH_GENERATION_CONCURRENCY = int(os.environ.get('BATCH_GENERATION_CONCURRENCY', 16))
+# Upper bound on targets packed into one LLM call by prompt_batch_size
+MAX_PROMPT_BATCH_SIZE = int(os.environ.get('MAX_PROMPT_BATCH_SIZE', 10))
+background_tasks = set()
+
+# Background job queue (the worker runs in-process unless JOB_WORKER_ENABLED=false)
+job_queue = JobQueue(
+    db.jobs,
+    lease_seconds=float(os.environ.get('JOB_LEASE_SECONDS', 120)),
+    max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', 5)),
+)
+JOB_WORKER_ENABLED = os.environ.get('JOB_WORKER_ENABLED', 'true').lower() == 'true'
 
 # Define Models
 class StatusCheck(BaseModel):
@@ -54,6 +247,7 @@ class Target(BaseModel):
     profile_summary: Optional[str] = None
     recent_activity: Optional[str] = None
     connection_status: str = "not_connected"  # not_connected, pending, connected, messaged
+    account: Optional[str] = None  # sending account for outreach; unset targets go to any account with quota left
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -67,6 +261,31 @@ class TargetCreate(BaseModel):
     location: str = "India"
     profile_summary: Optional[str] = None
     recent_activity: Optional[str] = None
+    account: Optional[str] = None
+
+class TargetSearchResult(Target):
+    score: float  # fuzzy index score, or MongoDB text score for mode=text
+
+class TargetImportReport(BaseModel):
+    total_rows: int
+    inserted: int
+    updated: int
+    duplicates: int  # rows repeating a linkedin_url already seen in the same chunk
+    failed: int
+    errors: List[Dict[str, Any]]  # [{"row": 12, "errors": ["name: Field required"]}, ...]
+    elapsed_seconds: float
+    rows_per_second: float
+
+class ViralPostImportReport(BaseModel):
+    documents: int  # saved pages and JSON files read
+    posts: int
+    inserted: int
+    updated: int
+    duplicates: int  # posts repeating a linkedin_url already seen in the same import
+    failed: int
+    errors: List[Dict[str, Any]]  # [{"source": "scrape.zip/post-12.html", "errors": ["author: Field required"]}, ...]
+    elapsed_seconds: float
+    documents_per_second: float
 
 class Message(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -74,6 +293,9 @@ class Message(BaseModel):
     content: str
     message_type: str = "connection_request"  # connection_request, follow_up, viral_post
     status: str = "draft"  # draft, sent, delivered, replied
+    prompt_version: Optional[str] = None  # template version used to generate it
+    duplicate_of: Optional[str] = None  # id of an earlier message this one nearly copies
+    duplicate_similarity: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     sent_at: Optional[datetime] = None
     replied_at: Optional[datetime] = None
@@ -85,31 +307,97 @@ class MessageCreate(BaseModel):
 
 class MessageGenerateRequest(BaseModel):
     target_id: str
-    profile_data: Dict[str, Any]
+    profile_data: Optional[Dict[str, Any]] = None  # defaults to the stored target; fields given here override it
+    message_type: str = "connection_request"
+    include_history: bool = True  # summarize earlier messages to the target into the prompt
+    llm_provider: str = "openai"  # openai, ollama, or auto (fastest healthy backend)
+    model: Optional[str] = None  # defaults to the provider's configured model
+    prompt_version: Optional[str] = None  # defaults to the MESSAGE_PROMPT_VERSIONS split
+    use_cache: bool = True  # False bypasses the LLM response cache entirely
+    refresh_cache: bool = False  # True regenerates and overwrites the cached response
+
+class MessageBatchGenerateRequest(BaseModel):
+    target_ids: Optional[List[str]] = None
+    filter: Optional[Dict[str, Any]] = None  # Mongo filter on targets, e.g. {"connection_status": "not_connected"}
     message_type: str = "connection_request"
-    llm_provider: str = "openai"  # openai or ollama
-    model: str = "gpt-4"
+    llm_providers: List[str] = ["openai"]  # requests are spread across these providers ("auto" routes by latency)
+    concurrency: Optional[int] = None
+    prompt_batch_size: int = 1  # targets per LLM call; above 1 several profiles share one prompt (no caching)
+    prompt_version: Optional[str] = None  # defaults to each target's MESSAGE_PROMPT_VERSIONS arm
+    use_cache: bool = True
+    refresh_cache: bool = False
+
+class BatchJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "pending"  # pending, running, completed, failed
+    message_type: str
+    llm_providers: List[str]
+    prompt_batch_size: int = 1
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = []
+    prompt_batching: Optional[Dict[str, int]] = None  # batched/fallback row counts when prompt_batch_size > 1
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class Job(BaseModel):
+    id: str
+    kind: str  # generate_message, generate_post
+    provider: Optional[str] = None
+    payload: Dict[str, Any]
+    status: str  # queued, running, completed, dead_letter
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    result: Optional[Dict[str, Any]] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
 
 class ViralPost(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     original_content: str
     author: str
-    engagement_score: int
+    engagement_score: Optional[int] = None  # defaults to the weighted reactions, comments and shares
     reactions: int
     comments: int
     shares: int
     linkedin_url: str
     scraped_at: datetime = Field(default_factory=datetime.utcnow)
+    hot_score: Optional[float] = None  # time-decayed ranking score, computed on insert
 
 class GeneratedPost(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     content: str
     based_on_viral_posts: List[str]  # List of viral post IDs
     status: str = "draft"  # draft, approved, published
+    topic: Optional[str] = None
+    prompt_version: Optional[str] = None
+    duplicate_of: Optional[str] = None  # id of an earlier generated post this one nearly copies
+    duplicate_similarity: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     approved_at: Optional[datetime] = None
     published_at: Optional[datetime] = None
 
+class OutreachQueueEntry(BaseModel):
+    target_id: str
+    priority: float
+    action: str  # connection_request, follow_up
+    account: Optional[str] = None
+    status: str  # queued, planned
+    planned_for: Optional[str] = None
+    updated_at: datetime
+
+class SendPlan(BaseModel):
+    id: str
+    day: str
+    total: int
+    accounts: Dict[str, int]  # targets planned per sending account
+    items: List[Dict[str, Any]]  # [{"target_id", "account", "action", "priority"}, ...] best first
+    created_at: datetime
+
 class Analytics(BaseModel):
     total_targets: int
     connections_sent: int
@@ -121,126 +409,264 @@ class Analytics(BaseModel):
     daily_activity: Dict[str, int]
 
 # LLM Service Functions
-async def generate_message_openai(profile_data: Dict[str, Any], message_type: str = "connection_request") -> str:
+def message_prompt_version(target_id: str, requested: Optional[str] = None) -> str:
+    """Explicit version if given (400 when unknown), else the target's A/B arm"""
+    if requested is None:
+        return choose_version(MESSAGE_PROMPT_VERSIONS, target_id)
+    if requested not in MESSAGE_TEMPLATES:
+        raise HTTPException(status_code=400, detail=f"Unknown prompt_version '{requested}'")
+    return requested
+
+def openai_message_request(profile_data: Dict[str, Any], message_type: str, model: str, prompt_version: str) -> Tuple[str, List[Dict[str, str]]]:
+    """(cache key, chat messages) for an OpenAI message generation"""
+    system_prompt, user_prompt = message_template(message_type, prompt_version).render(profile_data, message_type)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    return llm_cache.make_key("openai", model, messages, max_tokens=300, temperature=0.7), messages
+
+def ollama_message_request(profile_data: Dict[str, Any], message_type: str, model: str, prompt_version: str) -> Tuple[str, str]:
+    """(cache key, prompt) for an Ollama message generation"""
+    system_prompt, user_prompt = message_template(message_type, prompt_version).render(profile_data, message_type)
+    prompt = f"{system_prompt}\n\n{user_prompt}"
+    return llm_cache.make_key("ollama", model, prompt), prompt
+
+async def generate_message_openai(profile_data: Dict[str, Any], message_type: str = "connection_request", use_cache: bool = True, refresh_cache: bool = False, model: Optional[str] = None, prompt_version: str = "v1") -> str:
     """Generate personalized message using OpenAI"""
     try:
-        system_prompt = f"""You are an expert at writing personalized LinkedIn {message_type} messages.
-        
-        Guidelines:
-        - Keep messages under 250 words
-        - Be professional but friendly
-        - Reference specific details from their profile
-        - Focus on AI/ML expertise and hiring
-        - Include a clear call to action
-        - Avoid generic phrases
-        """
-        
-        user_prompt = f"""Generate a {message_type} message for this LinkedIn profile:
-        
-        Name: {profile_data.get('name', 'Unknown')}
-        Title: {profile_data.get('title', 'Unknown')}
-        Company: {profile_data.get('company', 'Unknown')}
-        Profile Summary: {profile_data.get('profile_summary', 'No summary available')}
-        Recent Activity: {profile_data.get('recent_activity', 'No recent activity')}
-        
-        The message should be personalized and mention their AI/ML work and hiring expertise.
-        """
-        
-        response = openai_client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=300,
-            temperature=0.7
+        model = model or OPENAI_MODEL
+        key, messages = openai_message_request(profile_data, message_type, model, prompt_version)
+        return await llm_cache.get_or_generate(
+            key,
+            lambda: openai_provider.chat(model=model, messages=messages, max_tokens=300, temperature=0.7),
+            use_cache=use_cache,
+            refresh=refresh_cache,
+            provider="openai",
+            model=model
         )
-        
-        return response.choices[0].message.content.strip()
     except Exception as e:
         logger.error(f"OpenAI API error: {e}")
         raise HTTPException(status_code=500, detail=f"OpenAI API error: {str(e)}")
 
-async def generate_message_ollama(profile_data: Dict[str, Any], message_type: str = "connection_request") -> str:
+async def generate_message_ollama(profile_data: Dict[str, Any], message_type: str = "connection_request", use_cache: bool = True, refresh_cache: bool = False, model: Optional[str] = None, prompt_version: str = "v1") -> str:
     """Generate personalized message using Ollama"""
     try:
-        system_prompt = f"""You are an expert at writing personalized LinkedIn {message_type} messages.
-        
-        Guidelines:
-        - Keep messages under 250 words
-        - Be professional but friendly
-        - Reference specific details from their profile
-        - Focus on AI/ML expertise and hiring
-        - Include a clear call to action
-        - Avoid generic phrases
-        """
-        
-        user_prompt = f"""Generate a {message_type} message for this LinkedIn profile:
-        
-        Name: {profile_data.get('name', 'Unknown')}
-        Title: {profile_data.get('title', 'Unknown')}
-        Company: {profile_data.get('company', 'Unknown')}
-        Profile Summary: {profile_data.get('profile_summary', 'No summary available')}
-        Recent Activity: {profile_data.get('recent_activity', 'No recent activity')}
-        
-        The message should be personalized and mention their AI/ML work and hiring expertise.
-        """
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{OLLAMA_BASE_URL}/api/generate",
-                json={
-                    "model": "llama3.1",
-                    "prompt": f"{system_prompt}\n\n{user_prompt}",
-                    "stream": False
-                }
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return result.get('response', '').strip()
-                else:
-                    raise HTTPException(status_code=500, detail="Ollama API error")
+        model = model or ollama_provider.model
+        key, prompt = ollama_message_request(profile_data, message_type, model, prompt_version)
+        return await llm_cache.get_or_generate(
+            key,
+            lambda: ollama_provider.generate(prompt, model=model),
+            use_cache=use_cache,
+            refresh=refresh_cache,
+            provider="ollama",
+            model=model
+        )
     except Exception as e:
         logger.error(f"Ollama API error: {e}")
         raise HTTPException(status_code=500, detail=f"Ollama API error: {str(e)}")
 
-async def generate_viral_post_openai(viral_posts: List[Dict[str, Any]]) -> str:
+async def generate_viral_post_openai(viral_posts: List[Dict[str, Any]], use_cache: bool = True, refresh_cache: bool = False, prompt_version: str = "v1", topic: Optional[str] = None) -> str:
     """Generate viral post using OpenAI"""
     try:
-        system_prompt = """You are an expert at creating viral LinkedIn posts about AI/ML.
+        system_prompt, user_prompt = post_template(prompt_version).render(viral_posts, topic)
         
-        Guidelines:
-        - Keep posts under 1300 characters
-        - Start with a compelling hook
-        - Include a data point or insight
-        - End with a clear call to action
-        - Use line breaks for readability
-        - Make it algorithm-friendly
-        """
-        
-        viral_content = "\n\n".join([f"Post {i+1}: {post['content'][:200]}..." for i, post in enumerate(viral_posts)])
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        return await llm_cache.get_or_generate(
+            llm_cache.make_key("openai", OPENAI_MODEL, messages, max_tokens=400, temperature=0.8),
+            lambda: openai_provider.chat(model=OPENAI_MODEL, messages=messages, max_tokens=400, temperature=0.8),
+            use_cache=use_cache,
+            refresh=refresh_cache,
+            provider="openai",
+            model=OPENAI_MODEL
+        )
+    except Exception as e:
+        logger.error(f"OpenAI API error: {e}")
+        raise HTTPException(status_code=500, detail=f"OpenAI API error: {str(e)}")
+
+def mock_message_content(profile_data: Dict[str, Any]) -> str:
+    """Canned message used when MOCK_LLM_RESPONSES is enabled (no valid API key needed)"""
+    mock_content = f"""
+        Hi {profile_data.get('name', 'there')},
         
-        user_prompt = f"""Based on these viral AI/ML posts, create a new viral post:
+        I came across your profile and was impressed by your work at {profile_data.get('company', 'your company')}. 
+        Your experience as a {profile_data.get('title', 'professional')} is exactly the kind of background we're looking for.
         
-        {viral_content}
+        I'd love to connect and discuss potential opportunities in AI and machine learning.
         
-        Create an original post that captures the essence of what makes these posts viral while adding your own unique perspective on AI/ML trends.
+        Best regards,
+        LinkedIn AI Automation System (Test Message)
         """
-        
-        response = openai_client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=400,
-            temperature=0.8
+    return mock_content.strip()
+
+MESSAGE_GENERATORS = {
+    "openai": generate_message_openai,
+    "ollama": generate_message_ollama,
+}
+
+def message_backends(llm_provider: str, model: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+    """(candidate backends, pinned backend) for a request.
+
+    A named provider is pinned and the other configured backends are only
+    failover targets; "auto" routes across LLM_BACKENDS on measured latency.
+    """
+    if llm_provider == "auto":
+        return LLM_BACKENDS, None
+    if llm_provider not in MESSAGE_GENERATORS:
+        llm_provider = "ollama"
+    preferred = f"{llm_provider}:{model or (OPENAI_MODEL if llm_provider == 'openai' else ollama_provider.model)}"
+    return ([preferred] + LLM_BACKENDS if LLM_FAILOVER else [preferred]), preferred
+
+async def generate_message_content(profile_data: Dict[str, Any], message_type: str, llm_provider: str, use_cache: bool = True, refresh_cache: bool = False, model: Optional[str] = None, prompt_version: str = "v1") -> str:
+    """Generate a message through the provider router"""
+    if MOCK_LLM_RESPONSES:
+        return mock_message_content(profile_data)
+    
+    async def generate(backend: str) -> str:
+        provider, backend_model = backend.split(":", 1)
+        generator = MESSAGE_GENERATORS.get(provider, generate_message_ollama)
+        return await generator(
+            profile_data, message_type, use_cache=use_cache, refresh_cache=refresh_cache, model=backend_model, prompt_version=prompt_version
         )
-        
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logger.error(f"OpenAI API error: {e}")
-        raise HTTPException(status_code=500, detail=f"OpenAI API error: {str(e)}")
+    
+    backends, preferred = message_backends(llm_provider, model)
+    try:
+        return await llm_router.call(backends, generate, preferred=preferred)
+    except AllBackendsFailed as e:
+        failures = "; ".join(f"{backend}: {getattr(error, 'detail', error)}" for backend, error in e.errors)
+        raise HTTPException(status_code=500, detail=f"All LLM backends failed: {failures}")
+
+async def stream_message_content(profile_data: Dict[str, Any], message_type: str, llm_provider: str, use_cache: bool = True, refresh_cache: bool = False, model: Optional[str] = None, prompt_version: str = "v1") -> AsyncIterator[str]:
+    """Yield message text as the provider streams it.
+
+    A cache hit is yielded as a single fragment; a completed stream is
+    written back to the cache under the same key as the non-streaming path.
+    """
+    if MOCK_LLM_RESPONSES:
+        for word in re.findall(r"\S+\s*", mock_message_content(profile_data)):
+            yield word
+        return
+    
+    # Streams cannot fail over once tokens are out, so only the router's first choice is used
+    llm_provider, model = llm_router.order(*message_backends(llm_provider, model))[0].split(":", 1)
+    if llm_provider == "openai":
+        key, messages = openai_message_request(profile_data, message_type, model, prompt_version)
+        fragments = openai_provider.stream_chat(model=model, messages=messages, max_tokens=300, temperature=0.7)
+    else:
+        key, prompt = ollama_message_request(profile_data, message_type, model, prompt_version)
+        llm_provider = "ollama"
+        fragments = ollama_provider.stream(prompt, model=model)
+    
+    if use_cache and not refresh_cache:
+        cached = await llm_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+    
+    parts = []
+    async for fragment in fragments:
+        parts.append(fragment)
+        yield fragment
+    if use_cache:
+        try:
+            await llm_cache.set(key, "".join(parts).strip(), provider=llm_provider, model=model)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+async def generate_message_batch_content(targets: List[Dict[str, Any]], message_type: str, llm_provider: str, prompt_version: str = "v1") -> str:
+    """One LLM call returning messages for all `targets` as JSON (parsed by PromptBatcher)"""
+    if MOCK_LLM_RESPONSES:
+        return json.dumps({"messages": [
+            {"target_id": target["id"], "content": mock_message_content(target)} for target in targets
+        ]})
+    
+    system_prompt, user_prompt = message_template(message_type, prompt_version).render_batch(
+        targets, message_type, BATCH_OUTPUT_INSTRUCTIONS
+    )
+    
+    async def generate(backend: str) -> str:
+        provider, model = backend.split(":", 1)
+        if provider == "openai":
+            return await openai_provider.chat(
+                model=model,
+                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+                max_tokens=350 * len(targets),
+                temperature=0.7,
+                response_format={"type": "json_object"}
+            )
+        return await ollama_provider.generate(
+            f"{system_prompt}\n\n{user_prompt}", model=model, options={"num_predict": 350 * len(targets)}, format="json"
+        )
+    
+    backends, preferred = message_backends(llm_provider)
+    return await llm_router.call(backends, generate, preferred=preferred)
+
+async def distinct_draft(index: NearDuplicateIndex, doc_id: str, generate: Callable[[int], Awaitable[str]]) -> Tuple[str, Dict[str, Any]]:
+    """Generate a draft and check it against `index` as NEAR_DUPLICATE_ACTION says.
+
+    Returns the content and the `duplicate_of`/`duplicate_similarity` fields for the saved document.
+    """
+    if NEAR_DUPLICATE_ACTION == 'off':
+        return await generate(0), {}
+    retries = NEAR_DUPLICATE_MAX_RETRIES if NEAR_DUPLICATE_ACTION == 'regenerate' else 0
+    content, match = await generate_distinct(index, doc_id, generate, retries)
+    return content, duplicate_fields(match)
+
+def duplicate_fields(match: Optional[Tuple[str, float]]) -> Dict[str, Any]:
+    if match is None:
+        return {}
+    return {"duplicate_of": match[0], "duplicate_similarity": round(match[1], 4)}
+
+def check_duplicate(index: NearDuplicateIndex, doc_id: str, content: str) -> Dict[str, Any]:
+    """Flag-only check for drafts that cannot be regenerated (streamed or written by hand)"""
+    if NEAR_DUPLICATE_ACTION == 'off':
+        return {}
+    return duplicate_fields(index.check(doc_id, content))
+
+def sse_event(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """One Server-Sent Events frame with a JSON payload"""
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{id_line}event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+async def list_page(
+    response: Response,
+    collection,
+    model,
+    filters: Dict[str, Any],
+    sort_field: str,
+    cursor: Optional[str],
+    limit: int,
+    fields: Optional[str],
+    include_total: bool
+):
+    """Keyset-paginated list endpoint body.
+
+    The body stays a plain JSON list; the cursor for the next page is sent
+    in X-Next-Cursor and, when requested, the filtered total in X-Total-Count.
+    With `fields` the rows are returned as projected dicts instead of models.
+    """
+    projected = fields or (",".join(model.model_fields) if FAST_JSON_RESPONSES else None)
+    try:
+        docs, next_cursor, total = await fetch_page(
+            collection, filters, sort_field, limit=limit, cursor=cursor, fields=projected, include_total=include_total
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    headers = {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if total is not None:
+        headers["X-Total-Count"] = str(total)
+    if FAST_JSON_RESPONSES:
+        return ORJSONResponse(docs, headers=headers) if fields else rows_response(model, docs, headers)
+    if fields:
+        return JSONResponse(jsonable_encoder(docs), headers=headers)
+    response.headers.update(headers)
+    return [model(**doc) for doc in docs]
 
 # API Routes
 @api_router.get("/")
@@ -255,22 +681,121 @@ async def create_status_check(input: StatusCheckCreate):
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+async def get_status_checks(
+    response: Response,
+    client_name: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = MAX_PAGE_SIZE,
+    fields: Optional[str] = None,
+    include_total: bool = False
+):
+    filters = {"client_name": client_name} if client_name else {}
+    return await list_page(response, db.status_checks, StatusCheck, filters, "timestamp", cursor, limit, fields, include_total)
+
+def export_response(collection, model, name: str, filters: Dict[str, Any], format: str, gzip: bool):
+    """Stream a filtered collection straight from the cursor as NDJSON or CSV"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format '{format}'; use one of {', '.join(EXPORT_FORMATS)}")
+    
+    cursor = collection.find(filters, {"_id": 0}).sort([("created_at", 1), ("id", 1)]).batch_size(EXPORT_BATCH_SIZE)
+    filename = f"{name}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        iter_export_chunks(cursor, format, columns=list(model.model_fields), gzip=gzip),
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 # Target Management
 @api_router.post("/targets", response_model=Target)
 async def create_target(target: TargetCreate):
     target_dict = target.dict()
     target_obj = Target(**target_dict)
-    await db.targets.insert_one(target_obj.dict())
+    try:
+        await db.targets.insert_one(target_obj.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"A target with linkedin_url {target.linkedin_url} already exists")
+    await record_target_created(db, target_obj.dict())
+    target_search_index.add(target_obj.dict())
     return target_obj
 
 @api_router.get("/targets", response_model=List[Target])
-async def get_targets():
-    targets = await db.targets.find().to_list(1000)
-    return [Target(**target) for target in targets]
+async def get_targets(
+    response: Response,
+    connection_status: Optional[str] = None,
+    company: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = MAX_PAGE_SIZE,
+    fields: Optional[str] = None,
+    include_total: bool = False
+):
+    filters = {}
+    if connection_status:
+        filters["connection_status"] = connection_status
+    if company:
+        filters["company"] = company
+    return await list_page(response, db.targets, Target, filters, "created_at", cursor, limit, fields, include_total)
+
+@api_router.get("/targets/search", response_model=List[TargetSearchResult])
+async def search_targets(response: Response, q: str, limit: int = 20, mode: str = "auto"):
+    """Targets ranked by how well name, title, company, location and profile summary match `q`
+
+    mode=fuzzy uses the in-process index (prefixes and typos match, every
+    word must), mode=text MongoDB's text index (stemmed words, "phrases",
+    -exclusions); auto picks fuzzy once the index has loaded.
+    """
+    if mode not in ("auto", "fuzzy", "text"):
+        raise HTTPException(status_code=400, detail="mode must be auto, fuzzy or text")
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q must not be empty")
+    limit = max(1, min(limit, MAX_TARGET_SEARCH_LIMIT))
+    fuzzy_ready = TARGET_SEARCH_INDEX and target_search_index.ready
+    if mode == "fuzzy" and not fuzzy_ready:
+        raise HTTPException(status_code=503, detail="Target search index is not loaded")
+    
+    projection = model_projection(Target)
+    if mode == "fuzzy" or (mode == "auto" and fuzzy_ready):
+        response.headers["X-Search-Mode"] = "fuzzy"
+        docs = await fetch_ranked(db.targets, target_search_index.search(q, limit), projection)
+    else:
+        response.headers["X-Search-Mode"] = "text"
+        try:
+            docs = await text_search(db.targets, q, limit, projection)
+        except OperationFailure as e:
+            logger.error(f"Target text search failed: {e}")
+            raise HTTPException(status_code=503, detail="Target text search is unavailable")
+    if FAST_JSON_RESPONSES:
+        return rows_response(TargetSearchResult, docs, headers={"X-Search-Mode": response.headers["X-Search-Mode"]})
+    return [TargetSearchResult(**doc) for doc in docs]
+
+@api_router.get("/targets/search/stats")
+async def get_target_search_stats():
+    return {"enabled": TARGET_SEARCH_INDEX, **target_search_index.snapshot()}
+
+@api_router.post("/targets/import", response_model=TargetImportReport)
+async def import_targets_file(file: UploadFile = File(...), format: Optional[str] = None, dry_run: bool = False):
+    """Bulk upsert targets from a CSV or JSONL upload, deduplicated on linkedin_url"""
+    try:
+        fmt = detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    started_at = datetime.utcnow()
+    try:
+        report = await import_targets(
+            db.targets, iter_rows(lines, fmt), TargetCreate, chunk_size=TARGET_IMPORT_CHUNK_SIZE, dry_run=dry_run
+        )
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"File is not valid UTF-8: {e}")
+    finally:
+        lines.detach()
+    await increment_counters(db, {"total_targets": report["inserted"]})
+    if report["updated"]:
+        target_contexts.clear()
+    if TARGET_SEARCH_INDEX and (report["inserted"] or report["updated"]):
+        # Every upserted target was stamped with updated_at during the import
+        await build_search_index(db.targets, target_search_index, {"updated_at": {"$gte": started_at}})
+    return TargetImportReport(**report)
 
 @api_router.get("/targets/{target_id}", response_model=Target)
 async def get_target(target_id: str):
@@ -279,161 +804,627 @@ async def get_target(target_id: str):
         raise HTTPException(status_code=404, detail="Target not found")
     return Target(**target)
 
+@api_router.get("/targets/{target_id}/context")
+async def get_target_context(target_id: str):
+    """The profile and message history summary message generation uses for this target"""
+    context = await target_contexts.get(target_id)
+    if context is None:
+        raise HTTPException(status_code=404, detail="Target not found")
+    return context
+
 @api_router.put("/targets/{target_id}", response_model=Target)
 async def update_target(target_id: str, target_update: Dict[str, Any]):
     target_update["updated_at"] = datetime.utcnow()
-    result = await db.targets.update_one({"id": target_id}, {"$set": target_update})
-    if result.matched_count == 0:
+    previous_target = await db.targets.find_one_and_update(
+        {"id": target_id},
+        {"$set": target_update},
+        projection={"_id": 0, "connection_status": 1}
+    )
+    if previous_target is None:
         raise HTTPException(status_code=404, detail="Target not found")
+    if "connection_status" in target_update:
+        await record_target_status_change(db, previous_target.get("connection_status"), target_update["connection_status"])
     
     updated_target = await db.targets.find_one({"id": target_id})
+    target_search_index.add(updated_target)
+    target_contexts.invalidate(target_id)
     return Target(**updated_target)
 
 # Message Management
 @api_router.post("/messages", response_model=Message)
 async def create_message(message: MessageCreate):
     message_dict = message.dict()
-    message_obj = Message(**message_dict)
+    message_id = str(uuid.uuid4())
+    message_obj = Message(id=message_id, **message_dict, **check_duplicate(message_duplicates, message_id, message.content))
     await db.messages.insert_one(message_obj.dict())
+    await messages_created([message_obj.dict()])
     return message_obj
 
 @api_router.get("/messages", response_model=List[Message])
-async def get_messages():
-    messages = await db.messages.find().to_list(1000)
-    return [Message(**message) for message in messages]
+async def get_messages(
+    response: Response,
+    target_id: Optional[str] = None,
+    message_type: Optional[str] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = MAX_PAGE_SIZE,
+    fields: Optional[str] = None,
+    include_total: bool = False
+):
+    filters = {}
+    if target_id:
+        filters["target_id"] = target_id
+    if message_type:
+        filters["message_type"] = message_type
+    if status:
+        filters["status"] = status
+    return await list_page(response, db.messages, Message, filters, "created_at", cursor, limit, fields, include_total)
+
+async def messages_created(messages: List[Dict[str, Any]]):
+    await record_messages_created(db, messages)
+    for target_id in {message["target_id"] for message in messages}:
+        target_contexts.invalidate(target_id)
+
+async def message_profile(request: MessageGenerateRequest) -> Dict[str, Any]:
+    """The stored target and its message history, overridden by any profile_data the client sent"""
+    context = await target_contexts.get(request.target_id)
+    if context is None and request.profile_data is None:
+        raise HTTPException(status_code=404, detail="Target not found")
+    profile = {**(context or {}), **(request.profile_data or {})}
+    if not request.include_history:
+        profile.pop("message_history", None)
+    return profile
+
+async def create_generated_message(request: MessageGenerateRequest) -> Message:
+    prompt_version = message_prompt_version(request.target_id, request.prompt_version)
+    profile = await message_profile(request)
+    message_id = str(uuid.uuid4())
+    
+    async def generate(attempt: int) -> str:
+        # A regeneration must not be served the cached duplicate, and replaces it in the cache
+        return await generate_message_content(
+            profile,
+            request.message_type,
+            request.llm_provider,
+            use_cache=request.use_cache,
+            refresh_cache=request.refresh_cache or attempt > 0,
+            model=request.model,
+            prompt_version=prompt_version
+        )
+    
+    content, duplicate = await distinct_draft(message_duplicates, message_id, generate)
+    message_obj = Message(
+        id=message_id,
+        target_id=request.target_id,
+        content=content,
+        message_type=request.message_type,
+        status="draft",
+        prompt_version=prompt_version,
+        **duplicate
+    )
+    
+    await db.messages.insert_one(message_obj.dict())
+    await messages_created([message_obj.dict()])
+    return message_obj
 
 @api_router.post("/messages/generate", response_model=Message)
 async def generate_message(request: MessageGenerateRequest):
     """Generate personalized message using AI"""
     try:
-        # For testing purposes, generate a mock message
-        # This allows us to test the functionality without a valid API key
-        mock_content = f"""
-        Hi {request.profile_data.get('name', 'there')},
-        
-        I came across your profile and was impressed by your work at {request.profile_data.get('company', 'your company')}. 
-        Your experience as a {request.profile_data.get('title', 'professional')} is exactly the kind of background we're looking for.
-        
-        I'd love to connect and discuss potential opportunities in AI and machine learning.
-        
-        Best regards,
-        LinkedIn AI Automation System (Test Message)
-        """
-        
-        message_obj = Message(
-            target_id=request.target_id,
-            content=mock_content.strip(),
-            message_type=request.message_type,
-            status="draft"
+        return await create_generated_message(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Message generation error: {e}")
+        raise HTTPException(status_code=500, detail=f"Message generation failed: {str(e)}")
+
+@api_router.post("/messages/generate-stream")
+async def generate_message_stream(request: MessageGenerateRequest):
+    """Generate a message as Server-Sent Events.
+
+    Emits `token` events ({"text": ...}) as the LLM produces them, then a
+    `message` event with the saved draft, or an `error` event on failure.
+    """
+    prompt_version = message_prompt_version(request.target_id, request.prompt_version)
+    profile = await message_profile(request)
+    
+    async def events():
+        parts = []
+        try:
+            async for fragment in stream_message_content(
+                profile,
+                request.message_type,
+                request.llm_provider,
+                use_cache=request.use_cache,
+                refresh_cache=request.refresh_cache,
+                model=request.model,
+                prompt_version=prompt_version
+            ):
+                parts.append(fragment)
+                yield sse_event("token", {"text": fragment})
+            
+            message_id = str(uuid.uuid4())
+            content = "".join(parts).strip()
+            message_obj = Message(
+                id=message_id,
+                target_id=request.target_id,
+                content=content,
+                message_type=request.message_type,
+                status="draft",
+                prompt_version=prompt_version,
+                **check_duplicate(message_duplicates, message_id, content)
+            )
+            await db.messages.insert_one(message_obj.dict())
+            await messages_created([message_obj.dict()])
+            yield sse_event("message", message_obj)
+        except Exception as e:
+            logger.error(f"Message stream error: {e}")
+            yield sse_event("error", {"detail": f"Message generation failed: {str(e)}"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.post("/messages/generate-batch", response_model=BatchJob)
+async def generate_message_batch(request: MessageBatchGenerateRequest):
+    """Queue message generation for many targets; poll the returned job for progress"""
+    if request.target_ids is None and request.filter is None:
+        raise HTTPException(status_code=400, detail="Provide target_ids or filter")
+    if any(key.startswith("$") for key in (request.filter or {})):
+        raise HTTPException(status_code=400, detail="Top-level operators are not allowed in filter")
+    unknown_providers = set(request.llm_providers) - set(MESSAGE_GENERATORS) - {"auto"}
+    if not request.llm_providers or unknown_providers:
+        raise HTTPException(status_code=400, detail=f"Unknown llm_providers: {sorted(unknown_providers)}")
+    
+    if request.prompt_version is not None:
+        message_prompt_version("", request.prompt_version)
+    
+    query = dict(request.filter or {})
+    if request.target_ids is not None:
+        query["id"] = {"$in": request.target_ids}
+    
+    prompt_batch_size = max(1, min(request.prompt_batch_size, MAX_PROMPT_BATCH_SIZE))
+    job = BatchJob(
+        message_type=request.message_type,
+        llm_providers=request.llm_providers,
+        prompt_batch_size=prompt_batch_size,
+        total=await db.targets.count_documents(query)
+    )
+    await db.batch_jobs.insert_one(job.dict())
+    
+    async def generate_single(target: Dict[str, Any], provider: str, prompt_version: str) -> str:
+        return await generate_message_content(
+            target,
+            request.message_type,
+            provider,
+            use_cache=request.use_cache,
+            refresh_cache=request.refresh_cache,
+            prompt_version=prompt_version
         )
+    
+    # One batcher per (provider, prompt version) so a packed prompt never mixes template versions
+    batchers: Dict[Tuple[str, str], PromptBatcher] = {}
+    
+    def batcher_for(provider: str, prompt_version: str) -> PromptBatcher:
+        if (provider, prompt_version) not in batchers:
+            batchers[(provider, prompt_version)] = PromptBatcher(
+                lambda targets: generate_message_batch_content(targets, request.message_type, provider, prompt_version),
+                lambda target: generate_single(target, provider, prompt_version),
+                batch_size=prompt_batch_size
+            )
+        return batchers[(provider, prompt_version)]
+    
+    async def generate(target: Dict[str, Any], provider: str) -> Dict[str, Any]:
+        prompt_version = message_prompt_version(target["id"], request.prompt_version)
+        target = {**target, "message_history": await target_contexts.history(target["id"])}
+        message_id = str(uuid.uuid4())
         
-        await db.messages.insert_one(message_obj.dict())
-        return message_obj
+        async def attempt_generation(attempt: int) -> str:
+            if attempt > 0:
+                return await generate_message_content(
+                    target, request.message_type, provider, use_cache=request.use_cache, refresh_cache=True,
+                    prompt_version=prompt_version
+                )
+            if prompt_batch_size > 1:
+                return await batcher_for(provider, prompt_version).generate(target)
+            return await generate_single(target, provider, prompt_version)
         
-        # Uncomment the below code to use the actual AI generation
-        """
-        if request.llm_provider == "openai":
-            content = await generate_message_openai(request.profile_data, request.message_type)
-        else:
-            content = await generate_message_ollama(request.profile_data, request.message_type)
-        
-        message_obj = Message(
-            target_id=request.target_id,
-            content=content,
-            message_type=request.message_type,
-            status="draft"
+        content, duplicate = await distinct_draft(message_duplicates, message_id, attempt_generation)
+        return Message(
+            id=message_id, target_id=target["id"], content=content, message_type=request.message_type,
+            prompt_version=prompt_version, **duplicate
+        ).dict()
+    
+    async def run():
+        concurrency = max(1, min(request.concurrency or BATCH_GENERATION_CONCURRENCY, BATCH_GENERATION_CONCURRENCY))
+        # `concurrency` bounds LLM calls in flight; each batched call needs prompt_batch_size waiting workers
+        await run_message_batch(
+            db,
+            job.id,
+            db.targets.find(query, {"_id": 0}),
+            generate,
+            request.llm_providers,
+            concurrency=concurrency * prompt_batch_size,
+            after_insert=messages_created
         )
-        
-        await db.messages.insert_one(message_obj.dict())
-        return message_obj
-        """
-    except Exception as e:
-        logger.error(f"Message generation error: {e}")
-        raise HTTPException(status_code=500, detail=f"Message generation failed: {str(e)}")
+        if batchers:
+            stats = {key: sum(batcher.stats[key] for batcher in batchers.values()) for key in PromptBatcher.STAT_KEYS}
+            await db.batch_jobs.update_one({"id": job.id}, {"$set": {"prompt_batching": stats}})
+    
+    task = asyncio.create_task(run())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return job
+
+@api_router.get("/messages/generate-batch/{job_id}", response_model=BatchJob)
+async def get_message_batch(job_id: str):
+    job = await db.batch_jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return BatchJob(**job)
+
+# Exports
+@api_router.get("/export/targets")
+async def export_targets(
+    format: str = "ndjson",
+    gzip: bool = False,
+    connection_status: Optional[str] = None,
+    company: Optional[str] = None
+):
+    filters = {}
+    if connection_status:
+        filters["connection_status"] = connection_status
+    if company:
+        filters["company"] = company
+    return export_response(db.targets, Target, "targets", filters, format, gzip)
+
+@api_router.get("/export/messages")
+async def export_messages(
+    format: str = "ndjson",
+    gzip: bool = False,
+    target_id: Optional[str] = None,
+    message_type: Optional[str] = None,
+    status: Optional[str] = None
+):
+    filters = {}
+    if target_id:
+        filters["target_id"] = target_id
+    if message_type:
+        filters["message_type"] = message_type
+    if status:
+        filters["status"] = status
+    return export_response(db.messages, Message, "messages", filters, format, gzip)
+
+@api_router.get("/export/generated-posts")
+async def export_generated_posts(format: str = "ndjson", gzip: bool = False, status: Optional[str] = None):
+    filters = {"status": status} if status else {}
+    return export_response(db.generated_posts, GeneratedPost, "generated_posts", filters, format, gzip)
 
 # Viral Posts
 @api_router.get("/viral-posts", response_model=List[ViralPost])
-async def get_viral_posts():
-    posts = await db.viral_posts.find().sort("engagement_score", -1).to_list(10)
+async def get_viral_posts(window: Optional[str] = None, limit: int = 10):
+    """Top posts by time-decayed engagement, optionally only those scraped within `window` (24h, 7d, 2w)"""
+    try:
+        since = parse_window(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    posts = await engagement_ranker.top(db.viral_posts, since, max(1, min(limit, MAX_VIRAL_POSTS_LIMIT)))
+    if FAST_JSON_RESPONSES:
+        return rows_response(ViralPost, [dict(post) for post in posts])
     return [ViralPost(**post) for post in posts]
 
+def get_viral_post_index() -> VectorIndex:
+    """The viral post index, opened (from disk when VECTOR_INDEX_DIR is set) on first use"""
+    global viral_post_index
+    if viral_post_index is None:
+        path = Path(VECTOR_INDEX_DIR) / "viral_posts" if VECTOR_INDEX_DIR else None
+        viral_post_index = VectorIndex(path, viral_post_embedder.dim, viral_post_embedder.name)
+    return viral_post_index
+
 @api_router.post("/viral-posts", response_model=ViralPost)
 async def create_viral_post(post: ViralPost):
-    await db.viral_posts.insert_one(post.dict())
+    post_dict = post.dict()
+    if post.engagement_score is None:
+        post.engagement_score = round(engagement_ranker.weighted(post_dict))
+    post.hot_score = float(engagement_ranker.score([post_dict])[0])
+    try:
+        await db.viral_posts.insert_one(post.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"A viral post with linkedin_url {post.linkedin_url} already exists")
+    engagement_ranker.invalidate()
+    try:
+        vectors = await viral_post_embedder.embed([post.original_content])
+        index = get_viral_post_index()
+        index.add([post.id], vectors, [post.engagement_score], [text_fingerprint(post.original_content)], flush=False)
+        # Persisted from a worker thread, once per burst of inserts
+        index.request_flush()
+    except Exception as e:
+        logger.error(f"Viral post indexing failed for {post.id}: {e}")
     return post
 
+@api_router.post("/viral-posts/import", response_model=ViralPostImportReport)
+async def import_viral_posts(file: UploadFile = File(...), dry_run: bool = False):
+    """Upsert posts from a saved post page (.html), exported posts (.json, .jsonl) or an archive of them, deduplicated on linkedin_url"""
+    name = file.filename or ""
+    workers = POST_INGEST_WORKERS if name.lower().endswith(ARCHIVE_SUFFIXES) else 0
+    try:
+        report = await ingest_posts(db.viral_posts, iter_upload(name, file.file), ViralPost, engagement_ranker, workers=workers, dry_run=dry_run)
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable archive: {e}")
+    if report["documents"] == 0:
+        raise HTTPException(status_code=400, detail="No .html, .json or .jsonl documents found in the upload")
+    if report["inserted"] or report["updated"]:
+        engagement_ranker.invalidate()
+        try:
+            await sync_index(db.viral_posts, get_viral_post_index(), viral_post_embedder, "original_content", "engagement_score")
+        except Exception as e:
+            logger.error(f"Viral post indexing failed after import: {e}")
+    return ViralPostImportReport(**report)
+
+@api_router.post("/viral-posts/rescore")
+async def rescore_viral_posts():
+    """Recompute every post's hot_score, e.g. after counts were updated outside the API"""
+    return await engagement_ranker.rescore(db.viral_posts)
+
+async def find_viral_posts(topic: Optional[str], limit: int = 5) -> List[Dict[str, Any]]:
+    """Posts most relevant to `topic` (similarity blended with engagement), else the top posts by engagement"""
+    if not topic:
+        return await engagement_ranker.top(db.viral_posts, limit=limit)
+    
+    query = (await viral_post_embedder.embed([topic]))[0]
+    matches = get_viral_post_index().search(query, k=limit, engagement_weight=VIRAL_POST_ENGAGEMENT_WEIGHT)
+    ids = [doc_id for doc_id, _ in matches]
+    posts = {post["id"]: post for post in await db.viral_posts.find({"id": {"$in": ids}}).to_list(len(ids))}
+    return [posts[doc_id] for doc_id in ids if doc_id in posts]
+
+async def create_generated_post(use_cache: bool = True, refresh_cache: bool = False, prompt_version: Optional[str] = None, topic: Optional[str] = None) -> GeneratedPost:
+    if prompt_version is not None and prompt_version not in POST_TEMPLATES:
+        raise HTTPException(status_code=400, detail=f"Unknown prompt_version '{prompt_version}'")
+    
+    # Get the viral posts to build on
+    viral_posts = await find_viral_posts(topic)
+    
+    if not viral_posts:
+        raise HTTPException(status_code=404, detail="No viral posts available")
+    
+    # Generate new post
+    post_id = str(uuid.uuid4())
+    prompt_version = prompt_version or choose_version(POST_PROMPT_VERSIONS, post_id)
+    
+    async def generate(attempt: int) -> str:
+        return await generate_viral_post_openai(
+            viral_posts, use_cache=use_cache, refresh_cache=refresh_cache or attempt > 0,
+            prompt_version=prompt_version, topic=topic
+        )
+    
+    content, duplicate = await distinct_draft(post_duplicates, post_id, generate)
+    post_obj = GeneratedPost(
+        id=post_id,
+        content=content,
+        based_on_viral_posts=[post["id"] for post in viral_posts],
+        status="draft",
+        topic=topic,
+        prompt_version=prompt_version,
+        **duplicate
+    )
+    
+    await db.generated_posts.insert_one(post_obj.dict())
+    return post_obj
+
 @api_router.post("/generate-post", response_model=GeneratedPost)
-async def generate_post():
-    """Generate viral post based on trending content"""
+async def generate_post(use_cache: bool = True, refresh_cache: bool = False, prompt_version: Optional[str] = None, topic: Optional[str] = None):
+    """Generate viral post based on trending content, or on the viral posts most relevant to `topic`"""
     try:
-        # Get top viral posts
-        viral_posts = await db.viral_posts.find().sort("engagement_score", -1).to_list(5)
-        
-        if not viral_posts:
-            raise HTTPException(status_code=404, detail="No viral posts available")
-        
-        # Generate new post
-        content = await generate_viral_post_openai(viral_posts)
-        
-        post_obj = GeneratedPost(
-            content=content,
-            based_on_viral_posts=[post["id"] for post in viral_posts],
-            status="draft"
+        return await create_generated_post(
+            use_cache=use_cache, refresh_cache=refresh_cache, prompt_version=prompt_version, topic=topic
         )
-        
-        await db.generated_posts.insert_one(post_obj.dict())
-        return post_obj
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Post generation error: {e}")
         raise HTTPException(status_code=500, detail=f"Post generation failed: {str(e)}")
 
 @api_router.get("/generated-posts", response_model=List[GeneratedPost])
 async def get_generated_posts():
-    posts = await db.generated_posts.find().sort("created_at", -1).to_list(10)
+    posts = await db.generated_posts.find({}, model_projection(GeneratedPost)).sort("created_at", -1).to_list(10)
+    if FAST_JSON_RESPONSES:
+        return rows_response(GeneratedPost, posts)
     return [GeneratedPost(**post) for post in posts]
 
+# Background Jobs
+async def run_generate_message_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        message_obj = await create_generated_message(MessageGenerateRequest(**payload))
+    except HTTPException as e:
+        # A missing target or a bad request fails the same way on every retry
+        if e.status_code < 500:
+            raise PermanentJobError(e.detail)
+        raise
+    return {"message_id": message_obj.id}
+
+async def run_generate_post_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        post_obj = await create_generated_post(**payload)
+    except HTTPException as e:
+        if e.status_code < 500:
+            raise PermanentJobError(e.detail)
+        raise
+    return {"post_id": post_obj.id}
+
+def routed_provider(provider: str) -> str:
+    """The provider an "auto" job will be routed to, so it waits on that provider's rate limit"""
+    if provider != "auto":
+        return provider
+    return llm_router.order(*message_backends(provider))[0].split(":", 1)[0]
+
+job_worker = JobWorker(
+    job_queue,
+    handlers={
+        "generate_message": run_generate_message_job,
+        "generate_post": run_generate_post_job,
+    },
+    rate_limiters={
+        "openai": TokenBucket(float(os.environ.get('OPENAI_RATE_LIMIT_RPS', 5))),
+        "ollama": TokenBucket(float(os.environ.get('OLLAMA_RATE_LIMIT_RPS', 2))),
+    },
+    concurrency=int(os.environ.get('JOB_WORKER_CONCURRENCY', 4)),
+    resolve_provider=routed_provider,
+)
+
+@api_router.post("/jobs/messages/generate", response_model=Job)
+async def enqueue_message_generation(request: MessageGenerateRequest):
+    """Queue a message generation; the result message id is stored on the job"""
+    job = await job_queue.enqueue("generate_message", request.dict(), provider=request.llm_provider)
+    return Job(**job)
+
+@api_router.post("/jobs/generate-post", response_model=Job)
+async def enqueue_post_generation(use_cache: bool = True, refresh_cache: bool = False, prompt_version: Optional[str] = None, topic: Optional[str] = None):
+    """Queue a viral post generation; the result post id is stored on the job"""
+    job = await job_queue.enqueue(
+        "generate_post",
+        {"use_cache": use_cache, "refresh_cache": refresh_cache, "prompt_version": prompt_version, "topic": topic},
+        provider="openai"
+    )
+    return Job(**job)
+
+@api_router.get("/jobs", response_model=List[Job])
+async def get_jobs(status: Optional[str] = None, kind: Optional[str] = None, limit: int = 100):
+    query = {}
+    if status:
+        query["status"] = status
+    if kind:
+        query["kind"] = kind
+    jobs = await db.jobs.find(query).sort("created_at", -1).to_list(min(limit, 1000))
+    return [Job(**job) for job in jobs]
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    job = await db.jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Job(**job)
+
+@api_router.post("/jobs/{job_id}/retry", response_model=Job)
+async def retry_job(job_id: str):
+    """Requeue a dead-lettered job"""
+    if not await job_queue.requeue(job_id):
+        raise HTTPException(status_code=404, detail="Dead-lettered job not found")
+    return Job(**await db.jobs.find_one({"id": job_id}))
+
+# LLM Cache
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    return llm_cache.snapshot()
+
+@api_router.delete("/cache")
+async def clear_cache():
+    await llm_cache.clear()
+    return {"status": "cleared"}
+
+# Near-Duplicate Drafts
+@api_router.get("/near-duplicates")
+async def get_near_duplicate_stats():
+    """Size and hit counters of the near-duplicate indexes"""
+    return {
+        "action": NEAR_DUPLICATE_ACTION,
+        "messages": message_duplicates.snapshot(),
+        "generated_posts": post_duplicates.snapshot(),
+    }
+
+# LLM Router
+@api_router.get("/llm/router")
+async def get_llm_router_stats():
+    """Rolling p50/p95 latency, error rate and circuit state per backend, plus failover/hedge counters"""
+    return {"configured_backends": LLM_BACKENDS, "failover": LLM_FAILOVER, **llm_router.snapshot()}
+
+# Live Updates
+@api_router.get("/live")
+async def live_updates(last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events stream of `changes` events, each a batch of deltas for targets, messages, generated posts and analytics
+
+    Browsers reconnect with Last-Event-ID and are sent what they missed, or
+    `resync` deltas telling them to reload a list.
+    """
+    if LIVE_UPDATES_MODE == 'off':
+        raise HTTPException(status_code=404, detail="Live updates are disabled")
+    resume_from = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    
+    async def events():
+        yield "retry: 3000\n\n"
+        async for batch in live_feed.subscribe(resume_from, heartbeat=LIVE_UPDATES_HEARTBEAT_SECONDS):
+            if batch is None:
+                yield ": keep-alive\n\n"
+                continue
+            event_id, deltas = batch
+            yield sse_event("changes", deltas, event_id)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/live/stats")
+async def get_live_update_stats():
+    return live_feed.snapshot()
+
+# Outreach Scheduling
+@api_router.post("/scheduler/queue/rebuild")
+async def rebuild_outreach_queue():
+    """Rescore every contactable target into the outreach queue"""
+    return await rebuild_queue(db, target_scorer, datetime.utcnow().date())
+
+@api_router.get("/scheduler/queue", response_model=List[OutreachQueueEntry])
+async def get_outreach_queue(status: str = "queued", limit: int = 50):
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    entries = await db.outreach_queue.find({"status": status}, {"_id": 0}).sort([("priority", -1), ("target_id", 1)]).to_list(limit)
+    return [OutreachQueueEntry(**entry) for entry in entries]
+
+@api_router.post("/scheduler/plans", response_model=SendPlan)
+async def create_send_plan(day: Optional[date] = None, replan: bool = False, rebuild: bool = True):
+    """Plan `day`'s sends (default today) within the daily quotas; an existing plan is returned unless `replan`"""
+    today = datetime.utcnow().date()
+    day = day or today
+    if rebuild:
+        await rebuild_queue(db, target_scorer, today)
+    plan = await plan_day(db, day, SCHEDULER_DAILY_QUOTA, SCHEDULER_ACCOUNT_QUOTAS, replan=replan)
+    return SendPlan(**plan)
+
+@api_router.get("/scheduler/plans/{day}", response_model=SendPlan)
+async def get_send_plan(day: date):
+    plan = await db.send_plans.find_one({"id": day.isoformat()}, {"_id": 0})
+    if not plan:
+        raise HTTPException(status_code=404, detail="Send plan not found")
+    return SendPlan(**plan)
+
 # Analytics
 @api_router.get("/analytics", response_model=Analytics)
-async def get_analytics():
-    """Get system analytics"""
+async def get_analytics(days: int = 7, start_date: Optional[date] = None, end_date: Optional[date] = None, exact: bool = False):
+    """Get system analytics; daily_activity covers the last `days` days or start_date..end_date (UTC)
+
+    Served from the incrementally maintained rollups; `exact=true` recounts
+    from the underlying collections instead.
+    """
+    end_date = end_date or datetime.utcnow().date()
+    start_date = start_date or end_date - timedelta(days=max(days, 1) - 1)
+    if start_date > end_date or (end_date - start_date).days >= MAX_ANALYTICS_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must be 1-{MAX_ANALYTICS_DAYS} days")
+    
     try:
-        # Get counts
-        total_targets = await db.targets.count_documents({})
-        connections_sent = await db.messages.count_documents({"message_type": "connection_request", "status": "sent"})
-        connections_accepted = await db.targets.count_documents({"connection_status": "connected"})
-        messages_sent = await db.messages.count_documents({"status": "sent"})
-        messages_replied = await db.messages.count_documents({"status": "replied"})
-        
-        # Calculate rates
-        acceptance_rate = (connections_accepted / max(connections_sent, 1)) * 100
-        reply_rate = (messages_replied / max(messages_sent, 1)) * 100
-        
-        # Get daily activity (last 7 days)
-        daily_activity = {}
-        for i in range(7):
-            date = (datetime.utcnow() - timedelta(days=i)).strftime("%Y-%m-%d")
-            count = await db.messages.count_documents({
-                "created_at": {
-                    "$gte": datetime.utcnow() - timedelta(days=i+1),
-                    "$lt": datetime.utcnow() - timedelta(days=i)
-                }
-            })
-            daily_activity[date] = count
-        
-        return Analytics(
-            total_targets=total_targets,
-            connections_sent=connections_sent,
-            connections_accepted=connections_accepted,
-            messages_sent=messages_sent,
-            messages_replied=messages_replied,
-            acceptance_rate=round(acceptance_rate, 2),
-            reply_rate=round(reply_rate, 2),
-            daily_activity=daily_activity
-        )
+        if exact:
+            return Analytics(**await compute_analytics(db, start_date, end_date))
+        return Analytics(**await read_analytics(db, start_date, end_date))
     except Exception as e:
         logger.error(f"Analytics error: {e}")
         raise HTTPException(status_code=500, detail=f"Analytics failed: {str(e)}")
 
+@api_router.post("/analytics/reconcile")
+async def reconcile_analytics():
+    """Rebuild the analytics rollups from targets/messages and report the drift that was fixed"""
+    return await reconcile_rollups(db)
+
 # Test endpoints
 @api_router.get("/test/openai")
 async def test_openai():
@@ -445,12 +1436,12 @@ async def test_openai():
         
         # Uncomment the below code to test with a real API key
         """
-        response = openai_client.chat.completions.create(
+        content = await openai_provider.chat(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": "Say 'OpenAI connection successful'"}],
             max_tokens=10
         )
-        return {"status": "success", "response": response.choices[0].message.content}
+        return {"status": "success", "response": content}
         """
     except Exception as e:
         return {"status": "error", "error": str(e)}
@@ -459,23 +1450,16 @@ async def test_openai():
 async def test_ollama():
     """Test Ollama connection"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{OLLAMA_BASE_URL}/api/generate",
-                json={
-                    "model": "llama3.1",
-                    "prompt": "Say 'Ollama connection successful'",
-                    "stream": False
-                }
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return {"status": "success", "response": result.get('response', '')}
-                else:
-                    return {"status": "error", "error": f"HTTP {response.status}"}
+        content = await ollama_provider.generate("Say 'Ollama connection successful'")
+        return {"status": "success", "response": content, "model": ollama_provider.model}
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
+# Prometheus scrape endpoint, outside /api as scrapers expect
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(REGISTRY.render(), headers={"Content-Type": CONTENT_TYPE})
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -485,7 +1469,10 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Server-Timing"],
 )
+# Added last so it is the outermost middleware and times CORS handling too
+app.add_middleware(MetricsMiddleware, server_timing=SERVER_TIMING)
 
 # Configure logging
 logging.basicConfig(
@@ -494,6 +1481,102 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_indexes(db)
+    try:
+        await llm_cache.ensure_indexes()
+    except Exception as e:
+        logger.error(f"LLM cache index creation failed: {e}")
+
+@app.on_event("startup")
+async def load_tokenizer():
+    # The first load may download the encoding; keep that off the event loop
+    await asyncio.to_thread(prompt_encoding)
+
+@app.on_event("startup")
+async def build_analytics_rollups():
+    try:
+        await ensure_rollups(db)
+    except Exception as e:
+        logger.error(f"Analytics rollup build failed: {e}")
+
+@app.on_event("startup")
+async def score_viral_posts():
+    try:
+        result = await engagement_ranker.rescore(db.viral_posts)
+        if result["updated"]:
+            logger.info(f"Rescored {result['updated']} of {result['scored']} viral posts")
+    except Exception as e:
+        logger.error(f"Viral post scoring failed: {e}")
+
+@app.on_event("startup")
+async def build_viral_post_index():
+    try:
+        added = await sync_index(db.viral_posts, get_viral_post_index(), viral_post_embedder, "original_content", "engagement_score")
+        if added:
+            logger.info(f"Indexed {added} viral posts")
+    except Exception as e:
+        logger.error(f"Viral post index build failed: {e}")
+
+@app.on_event("startup")
+async def build_near_duplicate_indexes():
+    if NEAR_DUPLICATE_ACTION == 'off':
+        return
+    for collection, index in ((db.messages, message_duplicates), (db.generated_posts, post_duplicates)):
+        try:
+            loaded = await build_index(collection, index)
+            logger.info(f"Loaded {loaded} documents from {collection.name} into the near-duplicate index")
+        except Exception as e:
+            logger.error(f"Near-duplicate index build for {collection.name} failed: {e}")
+
+@app.on_event("startup")
+async def load_target_search_index():
+    if not TARGET_SEARCH_INDEX:
+        return
+    
+    async def load():
+        try:
+            loaded = await build_search_index(db.targets, target_search_index, batch_size=1000)
+            target_search_index.ready = True
+            logger.info(f"Loaded {loaded} targets into the search index")
+        except Exception as e:
+            logger.error(f"Target search index build failed: {e}")
+    
+    # In the background: search falls back to the text index until it is ready
+    task = asyncio.create_task(load())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+@app.on_event("startup")
+async def start_job_worker():
+    if JOB_WORKER_ENABLED:
+        job_worker.start()
+
+@app.on_event("shutdown")
+async def stop_job_worker():
+    await job_worker.stop()
+
+@app.on_event("shutdown")
+async def cancel_background_tasks():
+    for task in list(background_tasks):
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+@app.on_event("shutdown")
+async def stop_live_feed():
+    await live_feed.stop()
+
+@app.on_event("shutdown")
+async def flush_viral_post_index():
+    if viral_post_index is not None:
+        await asyncio.to_thread(viral_post_index.flush)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+@app.on_event("shutdown")
+async def shutdown_llm_clients():
+    await openai_provider.aclose()
+    await ollama_provider.aclose()
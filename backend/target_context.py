@@ -0,0 +1,136 @@
+"""Per-target prompt context: the stored profile plus a compact message history.
+
+Message generation used to rely on the client resending the profile and
+knew nothing of earlier messages to the same person. ``TargetContextCache``
+assembles both server-side: the target document, and a summary of its
+messages that stays the same size however long the history gets (counts
+per type and status, when the last one was sent, whether they replied,
+and excerpts of only the most recent few, fitted to a token budget).
+
+Contexts are kept in an LRU with a TTL. The API invalidates a target
+when it is updated or gets a new message; the TTL bounds how stale a
+context can be when another process (a separate job worker) wrote it.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from prompts import fit_to_budget
+
+
+def _day(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime("%Y-%m-%d") if isinstance(value, datetime) else None
+
+
+def summarize_history(counts: List[Dict[str, Any]], recent: List[Dict[str, Any]], budget: int) -> str:
+    """A line of totals, then excerpts of ``recent`` (queried newest first), listed oldest first"""
+    total = sum(group["count"] for group in counts)
+    if not total:
+        return ""
+    by_type: Dict[str, int] = {}
+    by_status: Dict[str, int] = {}
+    for group in counts:
+        by_type[group["_id"]["type"]] = by_type.get(group["_id"]["type"], 0) + group["count"]
+        by_status[group["_id"]["status"]] = by_status.get(group["_id"]["status"], 0) + group["count"]
+    last_sent = max((group["last_sent"] for group in counts if group.get("last_sent")), default=None)
+    last_reply = max((group["last_reply"] for group in counts if group.get("last_reply")), default=None)
+
+    totals = f"{total} earlier message{'s' if total != 1 else ''} ({', '.join(f'{count} {kind}' for kind, count in sorted(by_type.items()))})"
+    totals += f"; statuses: {', '.join(f'{count} {status}' for status, count in sorted(by_status.items()))}"
+    if last_sent:
+        totals += f"; last sent {_day(last_sent)}"
+    totals += f"; replied {_day(last_reply)}" if last_reply else "; no reply yet"
+
+    recent = list(reversed(recent))
+    excerpts = fit_to_budget([" ".join(message.get("content", "").split()) for message in recent], budget)
+    lines = [totals]
+    for message, excerpt in zip(recent, excerpts):
+        lines.append(f"- {_day(message.get('created_at')) or 'undated'} {message.get('message_type')} ({message.get('status')}): {excerpt}")
+    return "\n".join(lines)
+
+
+class TargetContextCache:
+    """Profile + history contexts per target id, loaded on a miss and invalidated on writes"""
+
+    STAT_KEYS = ("hits", "misses", "not_found", "invalidations", "evictions")
+
+    def __init__(
+        self,
+        targets,
+        messages,
+        max_entries: int = 2048,
+        ttl_seconds: float = 300,
+        recent_messages: int = 3,
+        history_budget: int = 150,
+    ):
+        self.targets = targets
+        self.messages = messages
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.recent_messages = recent_messages
+        self.history_budget = history_budget
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Bumped by every invalidation, so a load that raced one is not cached
+        self._generation = 0
+        self.stats = dict.fromkeys(self.STAT_KEYS, 0)
+
+    async def history(self, target_id: str) -> str:
+        counts = await self.messages.aggregate([
+            {"$match": {"target_id": target_id}},
+            {"$group": {
+                "_id": {"type": "$message_type", "status": "$status"},
+                "count": {"$sum": 1},
+                "last_sent": {"$max": "$sent_at"},
+                "last_reply": {"$max": "$replied_at"},
+            }},
+        ]).to_list(None)
+        recent = []
+        if counts and self.recent_messages > 0:
+            recent = await self.messages.find(
+                {"target_id": target_id}, {"_id": 0, "content": 1, "message_type": 1, "status": 1, "created_at": 1}
+            ).sort([("created_at", -1), ("id", -1)]).limit(self.recent_messages).to_list(self.recent_messages)
+        return summarize_history(counts, recent, self.history_budget)
+
+    async def load(self, target_id: str) -> Optional[Dict[str, Any]]:
+        target = await self.targets.find_one({"id": target_id}, {"_id": 0})
+        if target is None:
+            return None
+        return {**target, "message_history": await self.history(target_id)}
+
+    async def get(self, target_id: str) -> Optional[Dict[str, Any]]:
+        """The target with a ``message_history`` summary, or None when there is no such target"""
+        entry = self._entries.get(target_id)
+        if entry is not None:
+            context, expires_at = entry
+            if expires_at >= time.monotonic():
+                self._entries.move_to_end(target_id)
+                self.stats["hits"] += 1
+                return dict(context)
+            del self._entries[target_id]
+
+        self.stats["misses"] += 1
+        generation = self._generation
+        context = await self.load(target_id)
+        if context is None:
+            self.stats["not_found"] += 1
+            return None
+        if self.ttl_seconds > 0 and generation == self._generation:
+            self._entries[target_id] = (context, time.monotonic() + self.ttl_seconds)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+        return dict(context)
+
+    def invalidate(self, target_id: str):
+        self._generation += 1
+        self.stats["invalidations"] += 1
+        self._entries.pop(target_id, None)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "entries": len(self._entries), "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0}
@@ -0,0 +1,188 @@
+"""Streaming bulk import of targets from CSV or JSONL.
+
+Rows are parsed one at a time, validated against ``TargetCreate`` and
+written in unordered ``bulk_write`` chunks of upserts keyed on
+``linkedin_url``, so re-importing a lead list updates existing targets
+instead of duplicating them. Only one chunk is held in memory at a time.
+
+    python target_import.py leads.csv
+    python target_import.py leads.jsonl --chunk-size 2000
+"""
+import csv
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+# Rows reported individually in the error report; the failure count is always exact
+MAX_REPORTED_ERRORS = 1000
+DUPLICATE_KEY = 11000
+
+
+def detect_format(filename: Optional[str], declared: Optional[str] = None) -> str:
+    fmt = (declared or (filename or "").rsplit(".", 1)[-1]).lower()
+    if fmt in ("ndjson", "json"):
+        fmt = "jsonl"
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format '{fmt}'; use one of {', '.join(IMPORT_FORMATS)}")
+    return fmt
+
+
+def iter_rows(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """Yield ``(row_number, row)`` pairs; ``row`` is a dict or the parse error message"""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row_number, row in enumerate(reader, start=2):
+            yield row_number, {key.strip(): value for key, value in row.items() if key}
+        return
+
+    for row_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, f"Invalid JSON: {e}"
+            continue
+        yield row_number, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def target_upsert(fields: Dict[str, Any], defaults: Dict[str, Any], now: datetime) -> UpdateOne:
+    return UpdateOne(
+        {"linkedin_url": fields["linkedin_url"]},
+        {
+            "$set": {**fields, "updated_at": now},
+            "$setOnInsert": {
+                **defaults,
+                "id": str(uuid.uuid4()),
+                "connection_status": "not_connected",
+                "created_at": now,
+            },
+        },
+        upsert=True,
+    )
+
+
+async def import_targets(
+    collection,
+    rows: Iterable[Tuple[int, Any]],
+    model: Type[BaseModel],
+    chunk_size: int = 1000,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """Validate ``rows`` against ``model`` and upsert them into ``collection``.
+
+    Blank CSV cells are treated as missing, so they never overwrite data
+    on an existing target; model defaults only apply to new inserts. Rows
+    repeating a ``linkedin_url`` within the same chunk collapse into one
+    write (the last one wins) and are counted as duplicates.
+    """
+    started = time.perf_counter()
+    report: Dict[str, Any] = {
+        "total_rows": 0, "inserted": 0, "updated": 0, "duplicates": 0, "failed": 0, "errors": [],
+    }
+    chunk: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+
+    def record_error(row_number: int, errors: List[Any]):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "errors": errors})
+
+    async def flush():
+        if not chunk:
+            return
+        now = datetime.utcnow()
+        operations = [target_upsert(fields, defaults, now) for fields, defaults in chunk.values()]
+        chunk.clear()
+        if dry_run:
+            return
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # An upsert that lost an insert race with another writer hits the unique index; retried, it updates
+            raced = [operations[error["index"]] for error in e.details["writeErrors"] if error["code"] == DUPLICATE_KEY]
+            if len(raced) < len(e.details["writeErrors"]):
+                raise
+            report["inserted"] += e.details["nUpserted"]
+            report["updated"] += e.details["nMatched"]
+            result = await collection.bulk_write(raced, ordered=False)
+        report["inserted"] += result.upserted_count
+        report["updated"] += result.matched_count
+
+    for row_number, row in rows:
+        report["total_rows"] += 1
+        if isinstance(row, str):
+            record_error(row_number, [row])
+            continue
+        row = {key: value for key, value in row.items() if value not in ("", None)}
+        try:
+            target = model(**row)
+        except ValidationError as e:
+            record_error(row_number, [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            ])
+            continue
+
+        # model_dump rather than the deprecated .dict(): its warning dominates the per-row cost here
+        data = target.model_dump()
+        fields = {key: data[key] for key in target.model_fields_set}
+        defaults = {key: value for key, value in data.items() if key not in target.model_fields_set}
+        if fields["linkedin_url"] in chunk:
+            report["duplicates"] += 1
+        chunk[fields["linkedin_url"]] = (fields, defaults)
+        if len(chunk) >= chunk_size:
+            await flush()
+    await flush()
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["total_rows"] / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import os
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from analytics import increment_counters
+    from server import TargetCreate
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    parser = argparse.ArgumentParser(description="Bulk import targets from CSV or JSONL")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    args = parser.parse_args()
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        fmt = detect_format(args.path, args.format)
+        with open(args.path, encoding="utf-8-sig", newline="") as lines:
+            report = await import_targets(
+                db.targets, iter_rows(lines, fmt), TargetCreate, chunk_size=args.chunk_size, dry_run=args.dry_run
+            )
+        await increment_counters(db, {"total_targets": report["inserted"]})
+        client.close()
+        for error in report.pop("errors"):
+            print(f"row {error['row']}: {'; '.join(error['errors'])}")
+        print(json.dumps(report, indent=2))
+
+    asyncio.run(main())
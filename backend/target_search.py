@@ -0,0 +1,314 @@
+"""Typo-tolerant prefix search over targets.
+
+``TargetSearchIndex`` keeps an inverted index in process: every word of a
+target's name, title, company, location and profile summary (lowercased,
+accents folded) maps to the targets containing it, together with the
+weight of the best field it appears in. A query word is expanded to the
+indexed words it could mean:
+
+* the word itself, and words it is a prefix of (a sorted vocabulary makes
+  that a binary search), for search-as-you-type
+* words whose prefix is within one edit (two for words of eight letters or
+  more) of it, found through a trigram index over the vocabulary and
+  confirmed by edit distance, for typos
+
+Each expansion gets a similarity (exact 1.0, prefix up to 0.9, one edit
+0.7, two 0.5) and at most ``max_expansions`` of them are kept per word,
+preferring similar and then frequent words. A target's score is the sum
+over query words of its best similarity x field weight, and it has to
+match every query word. Postings live in compact ``array`` buffers that
+NumPy reads without copying, so a query touches only the postings of its
+expansions and ranks them with a few vectorized passes.
+
+Updated targets get a fresh row and their old one is masked out, so
+updates are as cheap as inserts. Once masked rows make up
+``compact_fraction`` of the index it is compacted: live rows are
+renumbered and postings and words only dead rows used are dropped. The
+index is rebuilt from MongoDB on startup. Full-text search with stemming and phrases stays with MongoDB's
+``$text`` index (see ``text_search``).
+"""
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Field -> weight of a match in it
+SEARCH_FIELDS = {"name": 3, "company": 2, "title": 2, "location": 1, "profile_summary": 1}
+_WORD = re.compile(r"\w+")
+# Words shorter than this are only matched exactly or as a prefix
+MIN_FUZZY_LENGTH = 4
+EXACT, PREFIX, ONE_EDIT, TWO_EDITS = 1.0, 0.9, 0.7, 0.5
+
+
+def fold(text: str) -> str:
+    """Lowercase with accents stripped, so "José" finds "jose" and the other way round"""
+    if text.isascii():
+        return text.lower()
+    return "".join(char for char in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(char))
+
+
+def words(text: Optional[str]) -> List[str]:
+    return _WORD.findall(fold(text)) if text else []
+
+
+def trigrams(word: str) -> List[str]:
+    """Trigrams of ``word`` anchored at its start only, so a prefix's trigrams are a subset of the word's"""
+    padded = "$" + word
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def prefix_edit_distance(query: str, word: str, limit: int) -> int:
+    """Fewest edits turning ``query`` into some prefix of ``word``; ``limit + 1`` once it exceeds ``limit``"""
+    # Only cells within ``limit`` of the diagonal can stay within it, and longer prefixes cannot help
+    word = word[:len(query) + limit]
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(word) + 1)]
+    for i, char in enumerate(query, start=1):
+        low, high = max(1, i - limit), min(len(word), i + limit)
+        current = [over] * (len(word) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(low, high + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != word[j - 1]))
+        if min(current[low - 1:high + 1]) > limit:
+            return over
+        previous = current
+    return min(min(previous), over)
+
+
+class TargetSearchIndex:
+    """Inverted word index over targets with prefix and typo-tolerant matching"""
+
+    STAT_KEYS = ("searches", "added", "replaced", "removed", "compactions")
+
+    def __init__(
+        self,
+        fields: Optional[Dict[str, int]] = None,
+        max_expansions: int = 50,
+        max_fuzzy_candidates: int = 100,
+        compact_fraction: float = 0.25,
+        compact_min_rows: int = 10000,
+    ):
+        self.fields = dict(fields or SEARCH_FIELDS)
+        self.max_expansions = max_expansions
+        self.max_fuzzy_candidates = max_fuzzy_candidates
+        # Compact once this fraction of rows is dead, and at least this many are
+        self.compact_fraction = compact_fraction
+        self.compact_min_rows = compact_min_rows
+        self.ids: List[str] = []  # row -> target id
+        self.rows: Dict[str, int] = {}  # target id -> its current row
+        self._text_hashes: Dict[str, int] = {}  # target id -> hash of its indexed text, to skip updates that do not touch it
+        self._alive = np.zeros(1024, dtype=bool)
+        self.vocabulary: List[str] = []  # word id -> word
+        self._word_ids: Dict[str, int] = {}
+        self._sorted_words: List[str] = []
+        self._unsorted_words: List[str] = []  # added since the last prefix lookup
+        self._postings: List[array] = []  # word id -> rows
+        self._weights: List[array] = []  # word id -> field weight per row
+        self._trigrams: Dict[str, array] = {}  # trigram -> word ids
+        self.ready = False
+        self.stats = dict.fromkeys(self.STAT_KEYS, 0)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _text(self, target: Dict[str, Any]) -> str:
+        return "\x00".join(str(target.get(field) or "") for field in self.fields)
+
+    def _word_id(self, word: str) -> int:
+        word_id = self._word_ids.get(word)
+        if word_id is None:
+            word_id = self._word_ids[word] = len(self.vocabulary)
+            self.vocabulary.append(word)
+            self._unsorted_words.append(word)
+            self._postings.append(array("i"))
+            self._weights.append(array("B"))
+            for trigram in trigrams(word):
+                self._trigrams.setdefault(trigram, array("i")).append(word_id)
+        return word_id
+
+    def add(self, target: Dict[str, Any]):
+        """Index ``target`` (a dict with ``id`` and the search fields), replacing an earlier version"""
+        text_hash = hash(self._text(target))
+        doc_id = target["id"]
+        if self._text_hashes.get(doc_id) == text_hash:
+            return
+        if doc_id in self.rows:
+            self._alive[self.rows[doc_id]] = False
+            self.stats["replaced"] += 1
+        else:
+            self.stats["added"] += 1
+        row = len(self.ids)
+        if row >= len(self._alive):
+            self._alive = np.concatenate([self._alive, np.zeros(len(self._alive), dtype=bool)])
+        self._alive[row] = True
+        self.ids.append(doc_id)
+        self.rows[doc_id] = row
+        self._text_hashes[doc_id] = text_hash
+
+        best: Dict[str, int] = {}
+        for field, weight in self.fields.items():
+            for word in words(target.get(field)):
+                if best.get(word, 0) < weight:
+                    best[word] = weight
+        for word, weight in best.items():
+            word_id = self._word_id(word)
+            self._postings[word_id].append(row)
+            self._weights[word_id].append(weight)
+        self._maybe_compact()
+
+    def add_many(self, targets: Iterable[Dict[str, Any]]):
+        for target in targets:
+            self.add(target)
+
+    def remove(self, doc_id: str):
+        row = self.rows.pop(doc_id, None)
+        if row is not None:
+            self._alive[row] = False
+            self._text_hashes.pop(doc_id, None)
+            self.stats["removed"] += 1
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = len(self.ids) - len(self.rows)
+        if dead >= self.compact_min_rows and dead >= self.compact_fraction * len(self.ids):
+            self.compact()
+
+    def compact(self):
+        """Renumber the live rows and drop the postings, and words, that only dead rows used"""
+        live = np.flatnonzero(self._alive[:len(self.ids)])
+        renumbered = np.full(len(self.ids), -1, dtype=np.int32)
+        renumbered[live] = np.arange(len(live), dtype=np.int32)
+        self.ids = [self.ids[row] for row in live.tolist()]
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._alive = np.zeros(max(1024, 2 * len(self.ids)), dtype=bool)
+        self._alive[:len(self.ids)] = True
+
+        vocabulary, postings, weights = self.vocabulary, self._postings, self._weights
+        self.vocabulary, self._word_ids, self._postings, self._weights, self._trigrams = [], {}, [], [], {}
+        self._sorted_words, self._unsorted_words = [], []
+        for word, rows, row_weights in zip(vocabulary, postings, weights):
+            # Renumbering keeps row order, so postings stay sorted
+            rows = renumbered[np.frombuffer(rows, dtype=np.int32)]
+            keep = rows >= 0
+            if not keep.any():
+                continue
+            word_id = self._word_id(word)
+            self._postings[word_id] = array("i", rows[keep].tobytes())
+            self._weights[word_id] = array("B", np.frombuffer(row_weights, dtype=np.uint8)[keep].tobytes())
+        self.stats["compactions"] += 1
+
+    def expansions(self, query_word: str) -> List[Tuple[int, float]]:
+        """``(word id, similarity)`` of the indexed words ``query_word`` may stand for, best first"""
+        found: Dict[int, float] = {}
+        if self._unsorted_words:
+            # A few new words are inserted in place; a bulk load is sorted once
+            if len(self._unsorted_words) < 64:
+                for word in self._unsorted_words:
+                    insort(self._sorted_words, word)
+            else:
+                self._sorted_words = sorted(self._sorted_words + self._unsorted_words)
+            self._unsorted_words = []
+        start = bisect_left(self._sorted_words, query_word)
+        stop = bisect_left(self._sorted_words, query_word + "\U0010ffff")
+        for word in self._sorted_words[start:stop]:
+            found[self._word_ids[word]] = EXACT if word == query_word else PREFIX * (0.9 + 0.1 * len(query_word) / len(word))
+
+        if len(query_word) >= MIN_FUZZY_LENGTH:
+            limit = 2 if len(query_word) >= 8 else 1
+            grams = trigrams(query_word)
+            lists = [np.frombuffer(self._trigrams[gram], dtype=np.int32) for gram in grams if gram in self._trigrams]
+            if lists:
+                # An edit touches at most three trigrams; words sharing fewer cannot be within the limit
+                counts = np.bincount(np.concatenate(lists))
+                candidates = np.flatnonzero(counts >= max(1, len(grams) - 3 * limit))
+                if len(candidates) > self.max_fuzzy_candidates:
+                    candidates = candidates[np.argsort(-counts[candidates], kind="stable")[:self.max_fuzzy_candidates]]
+                for word_id in candidates.tolist():
+                    if word_id in found:
+                        continue
+                    distance = prefix_edit_distance(query_word, self.vocabulary[word_id], limit)
+                    if distance <= limit:
+                        found[word_id] = ONE_EDIT if distance == 1 else TWO_EDITS
+
+        ranked = sorted(found.items(), key=lambda item: (-item[1], -len(self._postings[item[0]])))
+        return ranked[:self.max_expansions]
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Top ``limit`` ``(target id, score)`` matching every word of ``query``"""
+        self.stats["searches"] += 1
+        query_words = list(dict.fromkeys(words(query)))
+        if not query_words or not self.rows:
+            return []
+        expanded = [self.expansions(query_word) for query_word in query_words]
+        if not all(expanded):
+            return []
+        # Most selective word first: later words only need scoring on the rows it matched
+        expanded.sort(key=lambda expansions: sum(len(self._postings[word_id]) for word_id, _ in expansions))
+        size = len(self.ids)
+        best = np.zeros(size, dtype=np.float32)
+        # A row appears once per word, so each expansion is one gather/max/scatter without duplicates
+        for word_id, similarity in expanded[0]:
+            rows = np.frombuffer(self._postings[word_id], dtype=np.int32)
+            scores = np.frombuffer(self._weights[word_id], dtype=np.uint8) * np.float32(similarity)
+            best[rows] = np.maximum(best[rows], scores)
+        best[~self._alive[:size]] = 0
+        hits = np.flatnonzero(best)
+        total = best[hits]
+        for expansions in expanded[1:]:
+            if not len(hits):
+                return []
+            # Postings are in row order, so a binary search finds each candidate in them
+            best = np.zeros(len(hits), dtype=np.float32)
+            for word_id, similarity in expansions:
+                rows = np.frombuffer(self._postings[word_id], dtype=np.int32)
+                positions = np.minimum(np.searchsorted(rows, hits), len(rows) - 1)
+                found = rows[positions] == hits
+                weights = np.frombuffer(self._weights[word_id], dtype=np.uint8)[positions]
+                np.maximum(best, np.where(found, weights * np.float32(similarity), 0), out=best)
+            keep = best > 0
+            hits, total = hits[keep], total[keep] + best[keep]
+        if len(hits) > limit:
+            top = np.argpartition(-total, limit - 1)[:limit]
+            hits, total = hits[top], total[top]
+        order = np.lexsort((hits, -total))
+        return [(self.ids[row], round(float(score), 4)) for row, score in zip(hits[order].tolist(), total[order].tolist())]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "targets": len(self.rows),
+            "rows": len(self.ids),
+            "words": len(self.vocabulary),
+            "postings": sum(len(postings) for postings in self._postings),
+            **self.stats,
+        }
+
+
+async def build_search_index(collection, index: TargetSearchIndex, query: Optional[Dict[str, Any]] = None, batch_size: int = 5000) -> int:
+    """Load the targets matching ``query`` (all by default) into ``index``; returns how many were read"""
+    loaded = 0
+    projection = {"_id": 0, "id": 1, **dict.fromkeys(index.fields, 1)}
+    async for target in collection.find(query or {}, projection).batch_size(batch_size):
+        index.add(target)
+        loaded += 1
+    return loaded
+
+
+async def text_search(collection, query: str, limit: int = 20, projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """MongoDB ``$text`` search (stemmed words, "quoted phrases", -exclusions) ranked by text score"""
+    projection = {**(projection or {"_id": 0}), "score": {"$meta": "textScore"}}
+    cursor = collection.find({"$text": {"$search": query}}, projection).sort([("score", {"$meta": "textScore"})]).limit(limit)
+    return await cursor.to_list(limit)
+
+
+async def fetch_ranked(collection, hits: Sequence[Tuple[str, float]], projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """The documents for ``(id, score)`` hits, in hit order, each with its ``score``"""
+    if not hits:
+        return []
+    docs = await collection.find({"id": {"$in": [doc_id for doc_id, _ in hits]}}, projection or {"_id": 0}).to_list(len(hits))
+    by_id = {doc["id"]: doc for doc in docs}
+    return [{**by_id[doc_id], "score": score} for doc_id, score in hits if doc_id in by_id]
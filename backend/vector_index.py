@@ -0,0 +1,324 @@
+"""Embedding similarity index over viral posts.
+
+Vectors live in a memory-mapped ``.npy`` file, next to a mapped per-row
+record (engagement weight, text fingerprint), an append-only id log and a
+JSON header naming the embedder. Adding posts writes straight into the
+mapped arrays (growing them by doubling), so the index survives restarts
+and is updated as posts are inserted; ``sync_index`` re-embeds posts whose
+text changed and refreshes the weights of the rest.
+Search is a brute-force cosine scan over the normalized matrix, which stays
+in the low milliseconds for tens of thousands of posts.
+
+Embedders are pluggable: ``HashingEmbedder`` is a deterministic local
+feature-hashing embedder (used offline and in tests) and ``OpenAIEmbedder``
+calls the embeddings API.
+"""
+import asyncio
+import json
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class HashingEmbedder:
+    """Words, word bigrams and character trigrams hashed into ``dim`` signed buckets.
+
+    The trigrams (at half weight) let inflections like "evaluation" and
+    "evaluating" land close together without a stemmer.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _add(self, vector: np.ndarray, feature: str, weight: float):
+        digest = zlib.crc32(feature.encode("utf-8"))
+        vector[digest % self.dim] += weight if digest & 0x80000000 else -weight
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = _WORD.findall(text.lower())
+        for word in words:
+            self._add(vector, word, 1.0)
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                self._add(vector, padded[i:i + 3], 0.5)
+        for first, second in zip(words, words[1:]):
+            self._add(vector, f"{first} {second}", 1.0)
+        return vector
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return normalize(np.stack([self.embed_one(text) for text in texts]))
+
+
+class OpenAIEmbedder:
+    """Embeddings API client; ``dim`` is requested explicitly so the index width is fixed"""
+
+    def __init__(self, client, model: str = "text-embedding-3-small", dim: int = 512):
+        self.client = client
+        self.model = model
+        self.dim = dim
+        self.name = f"openai:{model}:{dim}"
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        response = await self.client.embeddings.create(model=self.model, input=list(texts), dimensions=self.dim)
+        return normalize(np.array([item.embedding for item in response.data], dtype=np.float32))
+
+
+class VectorIndex:
+    """Memory-mapped matrix of unit vectors keyed by document id.
+
+    With ``path=None`` the index is kept in memory only. On disk there are
+    four files: the vectors, a per-row record (engagement weight and a
+    fingerprint of the embedded text), an append-only log of row ids and a
+    small JSON header with the format, the embedder and ``dim``; an index
+    in another format or built by a different embedder is discarded on load
+    so it can be rebuilt. Adds
+    write into the mapped arrays; ``flush`` then only syncs them and appends
+    the new ids, so persisting costs what changed rather than the index size.
+    """
+
+    FORMAT = 2
+    ROW_DTYPE = np.dtype([("weight", "<f4"), ("fingerprint", "<u4")])
+
+    def __init__(self, path: Optional[Path], dim: int, embedder_name: str, initial_capacity: int = 1024):
+        self.path = Path(path) if path is not None else None
+        self.dim = dim
+        self.embedder_name = embedder_name
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.vectors: Optional[np.ndarray] = None
+        self.rows: Optional[np.ndarray] = None  # ROW_DTYPE record per row
+        self._saved_ids = 0  # ids already in the log
+        self._flush_task: Optional[asyncio.Task] = None
+        if self.path is not None:
+            self._load()
+        if self.vectors is None:
+            self.ids, self.positions = [], {}
+            self._create(initial_capacity)
+
+    @property
+    def weights(self) -> np.ndarray:
+        return self.rows["weight"][:len(self.ids)]
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path.with_suffix(".f32.npy")
+
+    @property
+    def _rows_file(self) -> Path:
+        return self.path.with_suffix(".rows.npy")
+
+    @property
+    def _ids_file(self) -> Path:
+        return self.path.with_suffix(".ids")
+
+    @property
+    def _meta_file(self) -> Path:
+        return self.path.with_suffix(".json")
+
+    def _allocate(self, file: Optional[Path], shape: Tuple[int, ...], dtype, existing: Optional[np.ndarray] = None) -> np.ndarray:
+        if file is None:
+            array = np.zeros(shape, dtype=dtype)
+        else:
+            tmp = file.with_name(file.name + ".tmp")
+            array = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+        if existing is not None:
+            array[:len(existing)] = existing
+        if file is not None:
+            array.flush()
+            del array
+            os.replace(tmp, file)
+            array = np.load(file, mmap_mode="r+")
+        return array
+
+    def _grow(self, capacity: int):
+        count = len(self.ids)
+        on_disk = self.path is not None
+        self.vectors = self._allocate(self._vectors_file if on_disk else None, (capacity, self.dim), np.float32, self.vectors[:count])
+        self.rows = self._allocate(self._rows_file if on_disk else None, (capacity,), self.ROW_DTYPE, self.rows[:count])
+
+    def _create(self, capacity: int, ids: Sequence[str] = (), vectors=None, rows=None):
+        """Start a fresh index (on disk: new files with ``ids`` already logged)"""
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._ids_file.write_text("".join(f"{doc_id}\n" for doc_id in ids))
+            self._meta_file.write_text(json.dumps({"format": self.FORMAT, "embedder": self.embedder_name, "dim": self.dim}))
+        on_disk = self.path is not None
+        self.vectors = self._allocate(self._vectors_file if on_disk else None, (capacity, self.dim), np.float32, vectors)
+        self.rows = self._allocate(self._rows_file if on_disk else None, (capacity,), self.ROW_DTYPE, rows)
+        self._saved_ids = len(ids)
+
+    def _load(self):
+        if not (self._meta_file.exists() and self._vectors_file.exists()):
+            return
+        meta = json.loads(self._meta_file.read_text())
+        # Another embedder or format starts a fresh index, which sync_index then fills
+        if meta.get("format") != self.FORMAT or meta.get("embedder") != self.embedder_name or meta.get("dim") != self.dim:
+            return
+        if not (self._rows_file.exists() and self._ids_file.exists()):
+            return
+        vectors = np.load(self._vectors_file, mmap_mode="r+")
+        rows = np.load(self._rows_file, mmap_mode="r+")
+        # Rows are written before their id is logged, so a torn write leaves at most unreferenced rows
+        ids = [line for line in self._ids_file.read_text().split("\n") if line]
+        if vectors.shape[1] != self.dim or min(len(vectors), len(rows)) < len(ids):
+            return
+        self.vectors, self.rows = vectors, rows
+        self.ids = ids
+        self.positions = {doc_id: row for row, doc_id in enumerate(ids)}
+        self._saved_ids = len(ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.positions
+
+    def fingerprint(self, doc_id: str) -> Optional[int]:
+        """Fingerprint stored with ``doc_id``'s vector (0 when added without one), or None when it is not indexed"""
+        row = self.positions.get(doc_id)
+        return None if row is None else int(self.rows["fingerprint"][row])
+
+    def add(
+        self,
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        weights: Optional[Sequence[float]] = None,
+        fingerprints: Optional[Sequence[int]] = None,
+        flush: bool = True,
+    ):
+        """Insert or overwrite rows; ``weights`` (engagement) feed the search re-ranking.
+
+        ``fingerprints`` identify the embedded text (see ``text_fingerprint``)
+        so ``sync_index`` can tell changed documents apart. With
+        ``flush=False`` nothing is persisted until ``flush`` runs.
+        """
+        vectors = normalize(vectors)
+        new_ids = [doc_id for doc_id in dict.fromkeys(ids) if doc_id not in self.positions]
+        needed = len(self.ids) + len(new_ids)
+        if needed > len(self.vectors):
+            self._grow(max(needed, 2 * len(self.vectors)))
+        for doc_id in new_ids:
+            self.positions[doc_id] = len(self.positions)
+        rows = [self.positions[doc_id] for doc_id in ids]
+        self.vectors[rows] = vectors
+        self.rows["weight"][rows] = 0 if weights is None else np.asarray(weights, dtype=np.float32)
+        self.rows["fingerprint"][rows] = 0 if fingerprints is None else np.asarray(fingerprints, dtype=np.uint32)
+        # Ids last: a concurrent search or flush only ever sees rows that are fully written
+        self.ids.extend(new_ids)
+        if flush:
+            self.flush()
+
+    def set_weights(self, ids: Sequence[str], weights: Sequence[float]):
+        """Update engagement weights of indexed rows without re-embedding them"""
+        rows = [self.positions[doc_id] for doc_id in ids]
+        self.rows["weight"][rows] = np.asarray(weights, dtype=np.float32)
+
+    def flush(self):
+        """Sync the mapped arrays and append ids added since the last flush to the log"""
+        if self.path is None:
+            return
+        vectors, rows, count = self.vectors, self.rows, len(self.ids)
+        if isinstance(vectors, np.memmap):
+            vectors.flush()
+        if isinstance(rows, np.memmap):
+            rows.flush()
+        if count > self._saved_ids:
+            with self._ids_file.open("a") as log:
+                log.write("".join(f"{doc_id}\n" for doc_id in self.ids[self._saved_ids:count]))
+            self._saved_ids = count
+
+    def request_flush(self, delay: float = 1.0):
+        """Flush in a worker thread ``delay`` seconds from now, coalescing the adds made meanwhile"""
+        if self.path is None or self._flush_task is not None:
+            return
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._flush_task = None
+        await asyncio.to_thread(self.flush)
+
+    def search(self, query: np.ndarray, k: int = 5, engagement_weight: float = 0.0) -> List[Tuple[str, float]]:
+        """Top ``k`` ``(id, score)`` by cosine similarity.
+
+        With ``engagement_weight`` > 0 the score blends in log-scaled
+        engagement relative to the most engaging post, so among similar
+        posts the higher-performing ones rank first.
+        """
+        count = len(self.ids)
+        if count == 0 or k <= 0:
+            return []
+        scores = np.asarray(self.vectors[:count]) @ normalize(query).reshape(-1)
+        if engagement_weight:
+            engagement = np.log1p(np.maximum(self.weights[:count], 0))
+            top = engagement.max()
+            if top > 0:
+                scores = (1 - engagement_weight) * scores + engagement_weight * (engagement / top)
+        k = min(k, count)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[row], float(scores[row])) for row in best]
+
+
+def text_fingerprint(text: str) -> int:
+    """Identifies the text a vector was embedded from; never 0, so rows added without one are re-embedded"""
+    return zlib.crc32(text.encode("utf-8")) or 1
+
+
+async def sync_index(collection, index: VectorIndex, embedder, text_field: str, weight_field: str, batch_size: int = 256) -> int:
+    """Bring ``index`` up to date with ``collection``; returns how many documents were (re-)embedded.
+
+    Documents missing from the index or whose text changed are embedded;
+    for the others only a changed weight is written.
+    """
+    embedded = 0
+    batch: List[dict] = []
+    reweigh: List[Tuple[str, float]] = []
+
+    async def flush():
+        nonlocal embedded
+        texts = [doc.get(text_field) or "" for doc in batch]
+        vectors = await embedder.embed(texts)
+        index.add(
+            [doc["id"] for doc in batch], vectors, [doc.get(weight_field) or 0 for doc in batch],
+            [text_fingerprint(text) for text in texts], flush=False,
+        )
+        embedded += len(batch)
+        batch.clear()
+
+    async for doc in collection.find({}, {"_id": 0, "id": 1, text_field: 1, weight_field: 1}):
+        if index.fingerprint(doc["id"]) == text_fingerprint(doc.get(text_field) or ""):
+            weight = doc.get(weight_field) or 0
+            if index.rows["weight"][index.positions[doc["id"]]] != np.float32(weight):
+                reweigh.append((doc["id"], weight))
+            continue
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    if reweigh:
+        ids, weights = zip(*reweigh)
+        index.set_weights(ids, weights)
+    await asyncio.to_thread(index.flush)
+    return embedded
@@ -0,0 +1,36 @@
+"""Standalone job worker.
+
+Runs the background job queue outside the API process. Start the API with
+JOB_WORKER_ENABLED=false and run one or more of these alongside it:
+
+    python worker.py
+
+Like the API, the worker loads the near-duplicate indexes from MongoDB on
+start, so job drafts are checked against everything generated before it.
+Drafts generated afterwards by other processes are not seen until it
+restarts.
+"""
+import asyncio
+import logging
+
+from server import build_near_duplicate_indexes, client, job_worker, ollama_provider, openai_provider
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    logger.info(f"Starting job worker {job_worker.worker_id}")
+    try:
+        await build_near_duplicate_indexes()
+        await job_worker.run_forever()
+    finally:
+        await openai_provider.aclose()
+        await ollama_provider.aclose()
+        client.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
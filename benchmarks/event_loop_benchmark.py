@@ -0,0 +1,116 @@
+"""Event-loop responsiveness under concurrent LLM generation.
+
+Fires ``--concurrency`` simultaneous ``generate_message_openai`` calls at the
+fake LLM server while probing a cheap API route and an event-loop lag timer.
+With the async provider the wall time stays close to a single completion and
+the probe latency stays in the millisecond range; ``--blocking`` runs the same
+load through the synchronous OpenAI client for comparison.
+
+    python benchmarks/event_loop_benchmark.py --concurrency 50 --latency 1.0
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_llm_server import start_fake_llm_server_thread  # noqa: E402
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01):
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+    return lags
+
+
+async def probe_route(http, stop: asyncio.Event, path: str = "/api/"):
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await http.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.02)
+    return latencies
+
+
+async def run(concurrency: int, latency: float, blocking: bool):
+    base_url = start_fake_llm_server_thread(latency=latency)
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "benchmark")
+    os.environ["OPENAI_MAX_CONCURRENCY"] = str(max(concurrency, 1))
+
+    import httpx
+    import server
+
+    profile = {"name": "Jane Doe", "title": "Head of ML", "company": "Acme AI"}
+
+    if blocking:
+        from openai import OpenAI
+        sync_client = OpenAI(base_url=f"{base_url}/v1", api_key="sk-benchmark")
+
+        async def generate():
+            sync_client.chat.completions.create(
+                model="gpt-4.1",
+                messages=[{"role": "user", "content": str(profile)}],
+                max_tokens=300,
+            )
+    else:
+        async def generate():
+            await server.generate_message_openai(profile, use_cache=False)
+
+    # Warm up connection pools and lazy imports outside the measured window
+    await server.generate_message_openai(profile, use_cache=False)
+
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        lag_task = asyncio.create_task(measure_loop_lag(stop))
+        probe_task = asyncio.create_task(probe_route(http, stop))
+        await asyncio.sleep(0.1)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(generate() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+        stop.set()
+        lags = await lag_task
+        probes = await probe_task
+
+    await server.openai_provider.aclose()
+
+    mode = "blocking (sync OpenAI)" if blocking else "async provider"
+    print(f"mode:                 {mode}")
+    print(f"generations:          {concurrency} x {latency:.2f}s simulated latency")
+    print(f"wall time:            {wall:.2f}s ({concurrency / wall:.1f} generations/s)")
+    print(f"event loop lag p50:   {statistics.median(lags) * 1000:.1f} ms")
+    print(f"event loop lag max:   {max(lags) * 1000:.1f} ms")
+    print(f"GET /api/ samples:    {len(probes)}")
+    print(f"GET /api/ p50 / p99:  {percentile(probes, 50) * 1000:.1f} ms / {percentile(probes, 99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--blocking", action="store_true", help="use the synchronous client as a baseline")
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.latency, args.blocking))
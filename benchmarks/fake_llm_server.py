@@ -0,0 +1,148 @@
+"""Local stand-in for the OpenAI and Ollama HTTP APIs.
+
+Serves ``POST /v1/chat/completions`` (OpenAI) and ``POST /api/generate``
+(Ollama) with a configurable artificial latency so the backend can be load
+tested without network access or API keys. Streaming requests get the reply
+word by word (SSE for OpenAI, NDJSON for Ollama), spread evenly over the
+same latency.
+
+    python benchmarks/fake_llm_server.py --port 8011 --latency 1.5
+"""
+import argparse
+import asyncio
+import json
+import re
+import threading
+import time
+import uuid
+
+from aiohttp import web
+
+# Token counts reported for every completion
+USAGE = {"prompt_tokens": 50, "completion_tokens": 20, "total_tokens": 70}
+OLLAMA_COUNTS = {"prompt_eval_count": 50, "eval_count": 20}
+
+
+def build_app(latency: float = 1.0, reply: str = "Hi there, let's connect!") -> web.Application:
+    app = web.Application()
+    app["latency"] = latency
+    app["reply"] = reply
+    app["requests"] = 0
+
+    async def stream_words(request: web.Request, content_type: str, encode) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": content_type})
+        await response.prepare(request)
+        words = re.findall(r"\S+\s*", request.app["reply"]) or [""]
+        for word in words:
+            await asyncio.sleep(request.app["latency"] / len(words))
+            await response.write(encode(word, False))
+        await response.write(encode("", True))
+        await response.write_eof()
+        return response
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        request.app["requests"] += 1
+        if body.get("stream"):
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+            def event(**fields):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "gpt-4.1"),
+                    **fields,
+                }
+                return f"data: {json.dumps(chunk)}\n\n".encode()
+
+            def encode(word, done):
+                if done:
+                    # With stream_options.include_usage the API sends usage in a last chunk without choices
+                    usage = event(choices=[], usage=USAGE) if include_usage else b""
+                    return usage + b"data: [DONE]\n\n"
+                return event(choices=[{"index": 0, "delta": {"content": word}, "finish_reason": None}])
+
+            return await stream_words(request, "text/event-stream", encode)
+        await asyncio.sleep(request.app["latency"])
+        return web.json_response({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4.1"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": request.app["reply"]},
+                "finish_reason": "stop",
+            }],
+            "usage": USAGE,
+        })
+
+    async def ollama_generate(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        request.app["requests"] += 1
+        if body.get("stream", True):
+            model = body.get("model", "llama3.1")
+
+            def encode(word, done):
+                chunk = {"model": model, "response": word, "done": done}
+                if done:
+                    chunk.update(OLLAMA_COUNTS)
+                return (json.dumps(chunk) + "\n").encode()
+
+            return await stream_words(request, "application/x-ndjson", encode)
+        await asyncio.sleep(request.app["latency"])
+        return web.json_response({
+            "model": body.get("model", "llama3.1"),
+            "response": request.app["reply"],
+            "done": True,
+            **OLLAMA_COUNTS,
+        })
+
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/api/generate", ollama_generate)
+    return app
+
+
+async def start_fake_llm_server(host: str = "127.0.0.1", port: int = 0, **kwargs):
+    """Start the fake server in the running loop; returns ``(runner, base_url)``"""
+    runner = web.AppRunner(build_app(**kwargs))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def start_fake_llm_server_thread(host: str = "127.0.0.1", port: int = 0, **kwargs) -> str:
+    """Run the fake server on a daemon thread with its own event loop.
+
+    Keeps the server responsive even when the caller's loop is blocked, which
+    is what the synchronous-client baselines need. Returns the base URL.
+    """
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    result = {}
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        result["runner"], result["base_url"] = loop.run_until_complete(
+            start_fake_llm_server(host, port, **kwargs)
+        )
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, name="fake-llm-server", daemon=True).start()
+    started.wait()
+    return result["base_url"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per completion")
+    args = parser.parse_args()
+    web.run_app(build_app(latency=args.latency), host=args.host, port=args.port)
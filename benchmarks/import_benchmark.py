@@ -0,0 +1,106 @@
+"""Bulk target import throughput.
+
+Writes a synthetic lead list (``--rows`` rows, CSV or JSONL, about 5% of
+rows repeating an earlier linkedin_url and 1% invalid) to a temporary file,
+then streams it through ``import_targets`` and reports rows/sec. Writes go to
+the MongoDB at MONGO_URL (database ``<DB_NAME>_import_benchmark``, dropped
+afterwards); ``--dry-run`` measures parsing and validation only.
+``--trace-memory`` reports the peak Python heap (and slows the run down).
+
+    python benchmarks/import_benchmark.py --rows 1000000 --format csv
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+FIELDS = ["name", "title", "company", "linkedin_url", "email", "location", "profile_summary"]
+
+
+def synthetic_rows(count: int):
+    for i in range(count):
+        url_id = i - 1 if i % 20 == 19 else i
+        yield {
+            "name": "" if i % 100 == 99 else f"Lead {i}",
+            "title": ["Head of ML", "CTO", "Data Scientist", "VP Engineering"][i % 4],
+            "company": f"Company {i % 5000}",
+            "linkedin_url": f"https://www.linkedin.com/in/lead-{url_id}",
+            "email": f"lead{i}@example.com",
+            "location": ["Bengaluru", "Pune", "Hyderabad", ""][i % 4],
+            "profile_summary": "Builds production ML systems and hires applied scientists.",
+        }
+
+
+def write_fixture(path: Path, count: int, fmt: str):
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        if fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(synthetic_rows(count))
+        else:
+            for row in synthetic_rows(count):
+                out.write(json.dumps({k: v for k, v in row.items() if v}) + "\n")
+
+
+async def run(rows: int, fmt: str, chunk_size: int, dry_run: bool, trace_memory: bool):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).resolve().parent.parent / "backend" / ".env")
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from server import TargetCreate
+    from target_import import import_targets, iter_rows
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"leads.{fmt}"
+        started = time.perf_counter()
+        write_fixture(path, rows, fmt)
+        size_mb = path.stat().st_size / 1e6
+        print(f"fixture:          {rows:,} rows, {size_mb:.1f} MB ({time.perf_counter() - started:.1f}s to write)")
+
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        db_name = f"{os.environ['DB_NAME']}_import_benchmark"
+        collection = client[db_name].targets
+        if not dry_run:
+            await collection.create_index("linkedin_url")
+
+        if trace_memory:
+            tracemalloc.start()
+        with open(path, encoding="utf-8", newline="") as lines:
+            report = await import_targets(collection, iter_rows(lines, fmt), TargetCreate, chunk_size=chunk_size, dry_run=dry_run)
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        if not dry_run:
+            await client.drop_database(db_name)
+        client.close()
+
+    mode = "validate only (--dry-run)" if dry_run else f"upsert into {db_name}"
+    print(f"mode:             {mode}, chunk size {chunk_size}")
+    print(f"rows:             {report['total_rows']:,} ({report['inserted']:,} inserted, {report['updated']:,} updated, "
+          f"{report['duplicates']:,} in-chunk duplicates, {report['failed']:,} failed)")
+    print(f"elapsed:          {report['elapsed_seconds']:.1f}s")
+    print(f"throughput:       {report['rows_per_second']:,.0f} rows/sec")
+    if trace_memory:
+        print(f"peak traced heap: {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.format, args.chunk_size, args.dry_run, args.trace_memory))
@@ -0,0 +1,125 @@
+"""Viral post ingestion throughput on a local fixture corpus.
+
+Writes ``--docs`` synthetic saved post pages to a temporary directory,
+half public post pages with JSON-LD and half signed-in feed markup, each
+padded with ``--page-kb`` of inline script as real saved pages are, about
+5% of them re-saving an earlier post and half of all pages packed into a
+zip archive. Then ingests the corpus with each ``--workers`` count and
+reports documents/sec. Writes go to the MongoDB at MONGO_URL (database
+``<DB_NAME>_ingest_benchmark``, dropped afterwards); ``--dry-run`` measures
+reading, parsing and validation only.
+
+    python benchmarks/ingest_benchmark.py --docs 20000 --workers 0 1 4 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+TOPICS = ["LLM evaluation", "vector search", "MLOps", "data contracts", "GPU scheduling", "agents in production"]
+
+
+def post_url(i: int) -> str:
+    return f"https://www.linkedin.com/posts/author-{i % 500}_post-activity-{i}"
+
+
+def public_page(i: int, padding: str) -> str:
+    data = {
+        "@context": "http://schema.org", "@type": "SocialMediaPosting", "url": f"{post_url(i)}?trk=public_post",
+        "author": {"@type": "Person", "name": f"Author {i % 500}"},
+        "articleBody": f"What {i % 40 + 2} launches taught us about {TOPICS[i % len(TOPICS)]}.\nThread on trade-offs #{i}",
+        "interactionStatistic": [
+            {"@type": "InteractionCounter", "interactionType": "http://schema.org/LikeAction", "userInteractionCount": i * 7 % 20000},
+            {"@type": "InteractionCounter", "interactionType": "http://schema.org/CommentAction", "userInteractionCount": i % 2000},
+        ],
+    }
+    return (
+        f'<html><head><link rel="canonical" href="{post_url(i)}"><script>{padding}</script>'
+        f'<script type="application/ld+json">{json.dumps(data)}</script></head><body><main>{padding}</main></body></html>'
+    )
+
+
+def feed_page(i: int, padding: str) -> str:
+    return (
+        f"<html><head><script>{padding}</script></head><body><div data-urn=\"urn:li:activity:{i}\">"
+        f'<link rel="canonical" href="{post_url(i)}">'
+        f'<span class="update-components-actor__name"><span aria-hidden="true">Author {i % 500}</span></span>'
+        f'<div class="update-components-text"><span>Notes on {TOPICS[i % len(TOPICS)]}<br>Part {i}</span></div>'
+        f'<span class="social-details-social-counts__reactions-count">{i * 7 % 20000:,}</span>'
+        f'<button aria-label="{i % 2000} comments on the post">{i % 2000} comments</button>'
+        f'<button aria-label="{i % 300} reposts of the post">{i % 300} reposts</button></div></body></html>'
+    )
+
+
+def write_corpus(root: Path, count: int, page_kb: int):
+    padding = "var state = {};" * (page_kb * 1024 // 15)
+    pages = root / "pages"
+    pages.mkdir()
+    with zipfile.ZipFile(root / "scrape.zip", "w", zipfile.ZIP_DEFLATED) as archive:
+        for i in range(count):
+            post = i - 1 if i % 20 == 19 else i
+            html = public_page(post, padding) if i % 2 == 0 else feed_page(post, padding)
+            if i % 2:
+                archive.writestr(f"pages/{i:08d}.html", html)
+            else:
+                (pages / f"{i:08d}.html").write_text(html)
+
+
+async def run(docs: int, page_kb: int, worker_counts, batch_size: int, dry_run: bool):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).resolve().parent.parent / "backend" / ".env")
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from engagement import EngagementRanker
+    from post_ingest import HTML_PARSER, ingest_posts, iter_sources
+    from server import ViralPost
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        started = time.perf_counter()
+        write_corpus(root, docs, page_kb)
+        size_mb = sum(path.stat().st_size for path in root.rglob("*") if path.is_file()) / 1e6
+        print(f"fixture: {docs:,} pages, {size_mb:.1f} MB on disk ({time.perf_counter() - started:.1f}s to write), parser {HTML_PARSER}")
+        print(f"mode:    {'parse and validate only (--dry-run)' if dry_run else 'upsert into MongoDB'}, batch size {batch_size}\n")
+
+        client = db_name = None
+        if not dry_run:
+            client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+            db_name = f"{os.environ['DB_NAME']}_ingest_benchmark"
+        print(f"{'workers':>8} {'documents':>10} {'inserted':>9} {'updated':>8} {'dupes':>6} {'failed':>7} {'seconds':>8} {'docs/sec':>9}")
+        for workers in worker_counts:
+            collection = None
+            if client is not None:
+                await client.drop_database(db_name)
+                collection = client[db_name].viral_posts
+                await collection.create_index("linkedin_url", unique=True)
+            report = await ingest_posts(
+                collection, iter_sources([root]), ViralPost, EngagementRanker(), workers=workers, batch_size=batch_size, dry_run=dry_run,
+            )
+            print(
+                f"{workers:>8} {report['documents']:>10,} {report['inserted']:>9,} {report['updated']:>8,} {report['duplicates']:>6,} "
+                f"{report['failed']:>7,} {report['elapsed_seconds']:>8.1f} {report['documents_per_second']:>9,.0f}"
+            )
+        if client is not None:
+            await client.drop_database(db_name)
+            client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--page-kb", type=int, default=30, help="inline script padding per page")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, os.cpu_count() or 1], help="0 parses in-process")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.docs, args.page_kb, args.workers, args.batch_size, args.dry_run))
@@ -0,0 +1,502 @@
+"""Load test of every /api endpoint against seeded data, with a baseline to compare runs.
+
+Serves the app in-process with uvicorn on a local port, pointed at the
+MongoDB at MONGO_URL (database ``<DB_NAME>_load_test``, dropped afterwards)
+or, with ``--mongomock``, at an in-memory stand-in, and at the fake LLM
+server (``--llm-latency`` seconds per completion). Seeds ``--targets``
+synthetic targets, ``--messages`` messages and ``--viral-posts`` viral
+posts, runs the startup hooks (indexes, rollups, scoring, the embedding and
+near-duplicate indexes), then drives each scenario in turn with
+``--concurrency`` closed-loop clients for ``--duration`` seconds and reports
+p50/p95/p99 latency, req/s and errors. Whole-collection jobs (rebuilds,
+rescoring, reconciliation) run with one client at a time.
+
+Generation scenarios bypass the LLM response cache so every request reaches
+the fake server; the in-process job worker is off so queued jobs stay queued.
+Routes under /api that no scenario covers are listed at the end.
+
+``--save`` writes the results as a baseline; ``--baseline`` compares the run
+against one and exits with status 1 when a scenario's p95 grew, or its
+throughput fell, by more than ``--tolerance``.
+
+    # Compare against the committed baseline, with the settings it was recorded with
+    python benchmarks/load_test.py --mongomock --targets 2000 --viral-posts 500 --concurrency 8 --duration 2 --baseline benchmarks/load_baseline.json
+    # Record a new baseline
+    python benchmarks/load_test.py --mongomock --targets 2000 --viral-posts 500 --concurrency 8 --duration 2 --save benchmarks/load_baseline.json
+    # A real MongoDB at scale
+    python benchmarks/load_test.py --targets 1000000 --messages 2000000 --concurrency 64
+"""
+import argparse
+import asyncio
+import inspect
+import io
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_llm_server import start_fake_llm_server_thread  # noqa: E402
+
+SEED_BATCH = 10000
+TITLES = ["CTO", "VP Engineering", "Head of ML", "Staff Engineer", "Founder", "Product Manager", "Data Scientist", "Recruiter"]
+STATUSES = ["not_connected", "not_connected", "pending", "connected", "messaged"]
+MESSAGE_STATUSES = ["draft", "sent", "delivered", "replied"]
+TOPICS = ["LLM evaluation", "vector search", "MLOps", "data contracts", "GPU scheduling", "agents in production"]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def target_id(i: int) -> str:
+    return f"lt-target-{i:08d}"
+
+
+def synthetic_targets(start: int, stop: int, now: datetime):
+    for i in range(start, stop):
+        yield {
+            "id": target_id(i),
+            "name": f"Person {i}",
+            "title": TITLES[i % len(TITLES)],
+            "company": f"Company {i % 2000}",
+            "linkedin_url": f"https://www.linkedin.com/in/load-test-{i}",
+            "email": f"person{i}@company{i % 2000}.example",
+            "phone": None,
+            "location": "India",
+            "profile_summary": f"Works on {TOPICS[i % len(TOPICS)]} at Company {i % 2000}.",
+            "recent_activity": f"Posted about {TOPICS[(i // 7) % len(TOPICS)]} {i % 30 + 1} days ago",
+            "connection_status": STATUSES[i % len(STATUSES)],
+            "account": None,
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now - timedelta(minutes=i),
+        }
+
+
+def synthetic_messages(start: int, stop: int, targets: int, now: datetime, rng: random.Random):
+    for i in range(start, stop):
+        status = MESSAGE_STATUSES[i % len(MESSAGE_STATUSES)]
+        created = now - timedelta(minutes=i)
+        yield {
+            "id": f"lt-message-{i:08d}",
+            "target_id": target_id(rng.randrange(targets)),
+            "content": f"Hi Person {i}, your work on {TOPICS[i % len(TOPICS)]} caught my eye. Open to connect? ({i})",
+            "message_type": "connection_request" if i % 3 else "follow_up",
+            "status": status,
+            "prompt_version": "v2",
+            "duplicate_of": None,
+            "duplicate_similarity": None,
+            "created_at": created,
+            "sent_at": created if status != "draft" else None,
+            "replied_at": created if status == "replied" else None,
+        }
+
+
+def synthetic_viral_posts(start: int, stop: int, now: datetime, rng: random.Random):
+    for i in range(start, stop):
+        yield {
+            "id": f"lt-post-{i:08d}",
+            "original_content": f"What {rng.randrange(2, 40)} launches taught us about {TOPICS[i % len(TOPICS)]}. Thread on trade-offs #{i}",
+            "author": f"Author {i % 500}",
+            "reactions": rng.randrange(50, 20000),
+            "comments": rng.randrange(0, 2000),
+            "shares": rng.randrange(0, 800),
+            "linkedin_url": f"https://www.linkedin.com/posts/load-test-{i}",
+            "scraped_at": now - timedelta(minutes=rng.randrange(0, 30 * 24 * 60)),
+        }
+
+
+async def insert_batches(collection, count: int, make_batch):
+    for start in range(0, count, SEED_BATCH):
+        docs = make_batch(start, min(start + SEED_BATCH, count))
+        if docs:
+            await collection.insert_many(docs, ordered=False)
+
+
+async def seed(server, targets: int, messages: int, viral_posts: int, seed_value: int = 0):
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    await insert_batches(server.db.targets, targets, lambda start, stop: list(synthetic_targets(start, stop, now)))
+    await insert_batches(server.db.messages, messages, lambda start, stop: list(synthetic_messages(start, stop, targets, now, rng)))
+
+    def viral_batch(start, stop):
+        posts = list(synthetic_viral_posts(start, stop, now, rng))
+        for post, score in zip(posts, server.engagement_ranker.score(posts).tolist()):
+            post["engagement_score"] = round(server.engagement_ranker.weighted(post))
+            post["hot_score"] = score
+        return posts
+
+    await insert_batches(server.db.viral_posts, viral_posts, viral_batch)
+
+
+class Scenario:
+    """One request shape; ``build(ctx)`` returns httpx request kwargs (or a coroutine that prepares data first).
+
+    Streams that never end on their own (Server-Sent Events) are read only
+    until ``until`` arrives, and then closed; one that ends without it failed.
+    """
+
+    def __init__(self, method: str, route: str, build, variant: str = "", max_concurrency: int = None, check=None, until: bytes = None):
+        self.method = method
+        self.route = route
+        self.build = build
+        self.variant = variant
+        self.max_concurrency = max_concurrency
+        self.check = check
+        self.until = until
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.route}" + (f" [{self.variant}]" if self.variant else "")
+
+    def ok(self, response) -> bool:
+        return response.status_code < 400 and (self.check is None or self.check(response))
+
+
+def csv_upload(rows: int, rng: random.Random):
+    first = rng.randrange(1 << 30)
+    lines = ["name,title,company,linkedin_url"]
+    lines += [f"Imported {first + i},Engineer,Company {i % 50},https://www.linkedin.com/in/import-{first + i}" for i in range(rows)]
+    return {"files": {"file": ("targets.csv", io.BytesIO("\n".join(lines).encode()), "text/csv")}}
+
+
+def posts_upload(posts: int, seeded: int, rng: random.Random):
+    """A JSON export of ``posts`` posts, half of them already seeded (updated with new counts) and half new"""
+    first = rng.randrange(1 << 30)
+    rows = []
+    for i in range(posts):
+        url = f"https://www.linkedin.com/posts/load-test-{rng.randrange(seeded)}" if i % 2 else f"https://www.linkedin.com/posts/import-{first + i}"
+        rows.append({
+            "text": f"Imported post {first + i} about {rng.choice(TOPICS)}", "author": {"name": f"Author {i % 500}"},
+            "numLikes": rng.randrange(20000), "numComments": rng.randrange(2000), "numShares": rng.randrange(800), "url": url,
+        })
+    return {"files": {"file": ("posts.json", io.BytesIO(json.dumps(rows).encode()), "application/json")}}
+
+
+def scenarios(ctx):
+    """Every /api route, with bodies and ids drawn from the seeded data"""
+    rng = ctx["rng"]
+
+    def fixed(**request):
+        return lambda ctx: dict(request)
+
+    def with_target(make):
+        return lambda ctx: make(target_id(rng.randrange(ctx["targets"])))
+
+    def generate_body(tid, provider="openai"):
+        profile = {"name": f"Person {tid}", "title": "CTO", "company": "Company 7", "recent_activity": "Posted about MLOps"}
+        return {"target_id": tid, "profile_data": profile, "llm_provider": provider, "use_cache": False}
+
+    async def dead_letter_job(ctx):
+        job = await ctx["server"].job_queue.enqueue("generate_post", {"topic": "MLOps"}, provider="openai")
+        await ctx["server"].db.jobs.update_one({"id": job["id"]}, {"$set": {"status": "dead_letter"}})
+        return {"url": f"/api/jobs/{job['id']}/retry"}
+
+    def new_viral_post(ctx):
+        i = rng.randrange(1 << 30)
+        return {"json": {
+            "original_content": f"Load test post {i} about {rng.choice(TOPICS)}",
+            "author": "Load Test", "reactions": rng.randrange(1000), "comments": rng.randrange(100),
+            "shares": rng.randrange(50), "linkedin_url": f"https://www.linkedin.com/posts/new-{i}",
+        }}
+
+    def future_plan(ctx):
+        day = (datetime.utcnow() + timedelta(days=rng.randrange(1, 3650))).date().isoformat()
+        return {"params": {"day": day, "rebuild": "false", "replan": "true"}}
+
+    def no_error_event(response):
+        return b"event: error" not in response.content
+
+    return [
+        Scenario("GET", "/api/", fixed()),
+        Scenario("POST", "/api/status", fixed(json={"client_name": "load-test"})),
+        Scenario("GET", "/api/status", fixed(params={"limit": 50})),
+        Scenario("POST", "/api/targets", with_target(lambda tid: {"json": {
+            "name": "New Person", "title": "CTO", "company": "Company 1",
+            "linkedin_url": f"https://www.linkedin.com/in/new-{rng.randrange(1 << 40)}",
+        }})),
+        Scenario("GET", "/api/targets", fixed(params={"limit": 50})),
+        Scenario("GET", "/api/targets", lambda ctx: {"params": {"company": f"Company {rng.randrange(2000)}", "limit": 50}}, "company"),
+        Scenario("GET", "/api/targets", fixed(params={"limit": 50, "connection_status": "connected", "include_total": "true"}), "status+total"),
+        Scenario("POST", "/api/targets/import", lambda ctx: csv_upload(100, rng), "100 rows"),
+        Scenario("GET", "/api/targets/search", lambda ctx: {"params": {"q": f"Person {rng.randrange(ctx['targets'])}"}}, "name"),
+        # A seeded target's topic as typed so far, and its company with a typo
+        Scenario("GET", "/api/targets/search", lambda ctx: (lambda i: {"params": {
+            "q": f"{TOPICS[i % len(TOPICS)].split()[0][:4]} Compny {i % 2000}",
+        }})(rng.randrange(ctx["targets"])), "prefix+typo"),
+        Scenario("GET", "/api/targets/search/stats", fixed()),
+        Scenario("GET", "/api/targets/{target_id}", with_target(lambda tid: {"url": f"/api/targets/{tid}"})),
+        Scenario("GET", "/api/targets/{target_id}/context", with_target(lambda tid: {"url": f"/api/targets/{tid}/context"})),
+        Scenario("PUT", "/api/targets/{target_id}", with_target(lambda tid: {
+            "url": f"/api/targets/{tid}", "json": {"connection_status": rng.choice(STATUSES)},
+        })),
+        Scenario("POST", "/api/messages", with_target(lambda tid: {"json": {"target_id": tid, "content": f"Hello {rng.randrange(1 << 40)}, quick question about your stack"}})),
+        Scenario("GET", "/api/messages", fixed(params={"limit": 50})),
+        Scenario("GET", "/api/messages", with_target(lambda tid: {"params": {"target_id": tid}}), "target_id"),
+        Scenario("POST", "/api/messages/generate", with_target(lambda tid: {"json": generate_body(tid)})),
+        Scenario("POST", "/api/messages/generate", with_target(lambda tid: {"json": generate_body(tid, "ollama")}), "ollama"),
+        Scenario("POST", "/api/messages/generate-stream", with_target(lambda tid: {"json": generate_body(tid)}), check=no_error_event),
+        Scenario("POST", "/api/messages/generate-batch", lambda ctx: {"json": {
+            "target_ids": [target_id(rng.randrange(ctx["targets"])) for _ in range(5)], "use_cache": False,
+        }}, "5 targets"),
+        Scenario("GET", "/api/messages/generate-batch/{job_id}", lambda ctx: {"url": f"/api/messages/generate-batch/{ctx['batch_job_id']}"}),
+        Scenario("GET", "/api/export/targets", lambda ctx: {"params": {"company": f"Company {rng.randrange(2000)}"}}, "company"),
+        Scenario("GET", "/api/export/messages", with_target(lambda tid: {"params": {"target_id": tid, "format": "csv"}}), "target_id"),
+        Scenario("GET", "/api/export/generated-posts", fixed(params={"gzip": "true"})),
+        Scenario("GET", "/api/viral-posts", fixed()),
+        Scenario("GET", "/api/viral-posts", fixed(params={"window": "7d", "limit": 50}), "7d"),
+        Scenario("POST", "/api/viral-posts", new_viral_post),
+        Scenario("POST", "/api/viral-posts/import", lambda ctx: posts_upload(50, ctx["viral_posts"], rng), "50 posts"),
+        Scenario("POST", "/api/viral-posts/rescore", fixed(), max_concurrency=1),
+        Scenario("POST", "/api/generate-post", fixed(params={"use_cache": "false"})),
+        Scenario("POST", "/api/generate-post", lambda ctx: {"params": {"use_cache": "false", "topic": rng.choice(TOPICS)}}, "topic"),
+        Scenario("GET", "/api/generated-posts", fixed()),
+        Scenario("POST", "/api/jobs/messages/generate", with_target(lambda tid: {"json": generate_body(tid)})),
+        Scenario("POST", "/api/jobs/generate-post", fixed(params={"topic": "MLOps"})),
+        Scenario("GET", "/api/jobs", fixed(params={"status": "queued", "limit": 50})),
+        Scenario("GET", "/api/jobs/{job_id}", lambda ctx: {"url": f"/api/jobs/{ctx['job_id']}"}),
+        Scenario("POST", "/api/jobs/{job_id}/retry", dead_letter_job),
+        Scenario("GET", "/api/cache/stats", fixed()),
+        Scenario("DELETE", "/api/cache", fixed(), max_concurrency=1),
+        Scenario("GET", "/api/near-duplicates", fixed()),
+        Scenario("GET", "/api/llm/router", fixed()),
+        # Connect with a stale event id: the first event is the resync the client then reloads from
+        Scenario("GET", "/api/live", fixed(headers={"Last-Event-ID": "0"}), "resume", until=b"event: changes"),
+        Scenario("GET", "/api/live/stats", fixed()),
+        Scenario("POST", "/api/scheduler/queue/rebuild", fixed(), max_concurrency=1),
+        Scenario("GET", "/api/scheduler/queue", fixed(params={"limit": 50})),
+        Scenario("POST", "/api/scheduler/plans", future_plan, max_concurrency=1),
+        Scenario("GET", "/api/scheduler/plans/{day}", lambda ctx: {"url": f"/api/scheduler/plans/{ctx['plan_day']}"}),
+        Scenario("GET", "/api/analytics", fixed(params={"days": 30})),
+        Scenario("GET", "/api/analytics", fixed(params={"days": 30, "exact": "true"}), "exact", max_concurrency=1),
+        Scenario("POST", "/api/analytics/reconcile", fixed(), max_concurrency=1),
+        Scenario("GET", "/api/test/openai", fixed()),
+        Scenario("GET", "/api/test/ollama", fixed()),
+        Scenario("GET", "/metrics", fixed()),
+    ]
+
+
+async def drive(http, scenario: Scenario, ctx, concurrency: int, duration: float, server):
+    latencies, failures = [], {}
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            request = scenario.build(ctx)
+            if inspect.isawaitable(request):
+                request = await request
+            url = request.pop("url", scenario.route)
+            started = time.perf_counter()
+            try:
+                if scenario.until is None:
+                    response = await http.request(scenario.method, url, **request)
+                    failure = None if scenario.ok(response) else str(response.status_code)
+                else:
+                    async with http.stream(scenario.method, url, **request) as response:
+                        received = b""
+                        async for chunk in response.aiter_bytes():
+                            received += chunk
+                            if scenario.until in received:
+                                break
+                    failure = None if response.status_code < 400 and scenario.until in received else str(response.status_code)
+            except Exception as e:
+                failure = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            if failure is not None:
+                failures[failure] = failures.get(failure, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(min(concurrency, scenario.max_concurrency or concurrency))))
+    elapsed = time.perf_counter() - started
+    # Batch generations finish in the background; let them drain before the next scenario
+    if server.background_tasks:
+        await asyncio.gather(*server.background_tasks, return_exceptions=True)
+    return {
+        "requests": len(latencies),
+        "errors": sum(failures.values()),
+        "error_kinds": failures,
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def compare(results, baseline, tolerance: float):
+    """Per-scenario p95 and req/s change against ``baseline``; returns the names that regressed"""
+    regressions = []
+    print(f"\n{'scenario':<58} {'p95 ms':>9} {'base':>9} {'change':>8} {'req/s':>9} {'base':>9} {'change':>8}")
+    for name, result in results.items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            print(f"{name:<58} {result['p95_ms']:>9.1f} {'-':>9} {'new':>8} {result['rps']:>9.1f} {'-':>9} {'new':>8}")
+            continue
+        p95_change = result["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        rps_change = result["rps"] / base["rps"] - 1 if base["rps"] else 0.0
+        regressed = p95_change > tolerance or rps_change < -tolerance or (result["errors"] and not base["errors"])
+        flag = "  REGRESSED" if regressed else ""
+        print(
+            f"{name:<58} {result['p95_ms']:>9.1f} {base['p95_ms']:>9.1f} {p95_change:>+8.0%} "
+            f"{result['rps']:>9.1f} {base['rps']:>9.1f} {rps_change:>+8.0%}{flag}"
+        )
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+async def serve(app):
+    import uvicorn
+
+    # A long keep-alive, so clients idling behind slow scenarios do not race the server closing their connection
+    config = uvicorn.Config(
+        app, host="127.0.0.1", port=0, lifespan="off", log_level="warning", access_log=False, timeout_keep_alive=300
+    )
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            await task
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+async def run(args):
+    llm_url = start_fake_llm_server_thread(latency=args.llm_latency)
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    db_name = f"{os.environ.get('DB_NAME', 'linkedin')}_load_test"
+    os.environ.update({
+        "DB_NAME": db_name,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-load-test"),
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "OLLAMA_BASE_URL": llm_url,
+        "OPENAI_MAX_CONCURRENCY": str(max(args.concurrency, 32)),
+        "MOCK_LLM_RESPONSES": "false",
+        "JOB_WORKER_ENABLED": "false",
+        "VECTOR_INDEX_DIR": "",
+    })
+
+    import httpx
+    import server
+
+    for noisy in ("httpx", "aiohttp.access"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+
+        server.db = AsyncMongoMockClient()[db_name]
+        server.llm_cache.collection = server.db.llm_cache
+        server.job_queue.collection = server.db.jobs
+        server.target_contexts.targets, server.target_contexts.messages = server.db.targets, server.db.messages
+        # mongomock has no change streams
+        server.live_feed.db, server.live_feed.mode = server.db, "poll"
+    else:
+        await server.client.drop_database(db_name)
+
+    try:
+        started = time.perf_counter()
+        await seed(server, args.targets, args.messages, args.viral_posts)
+        print(f"seeded {args.targets} targets, {args.messages} messages, {args.viral_posts} viral posts in {time.perf_counter() - started:.1f}s")
+        started = time.perf_counter()
+        await server.app.router.startup()
+        print(f"startup hooks: {time.perf_counter() - started:.1f}s")
+
+        uvicorn_server, serve_task, base_url = await serve(server.app)
+        limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as http:
+            ctx = {"rng": random.Random(1), "targets": args.targets, "viral_posts": max(args.viral_posts, 1), "server": server}
+            batch = await http.post("/api/messages/generate-batch", json={"target_ids": [target_id(0)], "use_cache": False})
+            ctx["batch_job_id"] = batch.json()["id"]
+            ctx["job_id"] = (await http.post("/api/jobs/generate-post")).json()["id"]
+            ctx["plan_day"] = (await http.post("/api/scheduler/plans")).json()["day"]
+
+            selected = [scenario for scenario in scenarios(ctx) if re.search(args.only, scenario.name)]
+            results = {}
+            print(f"\n{'scenario':<58} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+            for scenario in selected:
+                result = await drive(http, scenario, ctx, args.concurrency, args.duration, server)
+                results[scenario.name] = result
+                print(
+                    f"{scenario.name:<58} {result['requests']:>9} {result['rps']:>9.1f} {result['p50_ms']:>9.1f} "
+                    f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['errors']:>7}"
+                    + (f"  {result['error_kinds']}" if result["errors"] else "")
+                )
+
+        uvicorn_server.should_exit = True
+        await serve_task
+        await server.app.router.shutdown()
+    finally:
+        if not args.mongomock:
+            await server.client.drop_database(db_name)
+
+    covered = {f"{scenario.method} {scenario.route}" for scenario in scenarios(ctx)}
+    routes = {
+        f"{method} {route.path}"
+        for route in server.app.routes if route.path.startswith("/api") for method in getattr(route, "methods", ())
+    }
+    if routes - covered:
+        print(f"\nroutes without a scenario: {', '.join(sorted(routes - covered))}")
+
+    run_info = {
+        "targets": args.targets,
+        "messages": args.messages,
+        "viral_posts": args.viral_posts,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "llm_latency": args.llm_latency,
+        "mongo": "mongomock" if args.mongomock else "mongodb",
+    }
+    status = 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline["run"] != run_info:
+            print(f"\nnote: baseline was recorded with {baseline['run']}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} scenario(s) regressed by more than {args.tolerance:.0%}")
+            status = 1
+    if args.save:
+        Path(args.save).write_text(json.dumps({
+            "run": run_info,
+            "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "scenarios": results,
+        }, indent=2) + "\n")
+        print(f"\nsaved baseline to {args.save}")
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=None, help="default: 2 per target")
+    parser.add_argument("--viral-posts", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM seconds per completion")
+    parser.add_argument("--mongomock", action="store_true", help="in-memory MongoDB stand-in (small scales only)")
+    parser.add_argument("--only", default="", help="regex on scenario names, e.g. 'GET /api/targets'")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save", help="write this run's results as a baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/req/s change before a regression is reported")
+    args = parser.parse_args()
+    if args.messages is None:
+        args.messages = 2 * args.targets
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
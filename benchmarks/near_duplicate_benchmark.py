@@ -0,0 +1,120 @@
+"""Near-duplicate index build and lookup at campaign scale.
+
+Bulk-builds a ``NearDuplicateIndex`` from ``--docs`` synthetic drafts
+(templated outreach messages with varied names, companies and topics),
+then times lookups of fresh drafts, near-copies of indexed ones and
+single-draft ``check`` calls, and reports recall on the near-copies.
+
+    python benchmarks/near_duplicate_benchmark.py --docs 1000000
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from near_duplicates import NearDuplicateIndex  # noqa: E402
+
+OPENERS = ["Hi {name},", "Hello {name},", "Hey {name} -", "Dear {name},"]
+BODIES = [
+    "I came across your work on {topic} at {company} and was impressed by how your team ships.",
+    "Your post about {topic} stuck with me, especially the part on scaling it at {company}.",
+    "I noticed {company} is investing in {topic} and wanted to swap notes on what has worked for us.",
+    "We are building tooling for {topic} and your experience at {company} would be invaluable.",
+]
+CLOSERS = [
+    "Would love to connect.",
+    "Open to a quick chat next week?",
+    "Happy to share what we learned in return.",
+    "Let me know if connecting makes sense.",
+]
+
+
+def synthetic_drafts(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    names = [f"person{i}" for i in range(5000)]
+    companies = [f"company{i}" for i in range(2000)]
+    topics = [f"topic{i} area{i % 97} stack{i % 31}" for i in range(3000)]
+    filler = np.array([f"detail{i}" for i in range(50000)])
+    picks = rng.integers(0, 1 << 30, (count, 7))
+    details = rng.integers(0, len(filler), (count, 12))
+    for pick, detail in zip(picks, details):
+        yield " ".join((
+            OPENERS[pick[0] % 4].format(name=names[pick[1] % len(names)]),
+            BODIES[pick[2] % 4].format(topic=topics[pick[3] % len(topics)], company=companies[pick[4] % len(companies)]),
+            " ".join(filler[detail]),
+            CLOSERS[pick[5] % 4],
+        ))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(label, seconds):
+    micros = [s * 1e6 for s in seconds]
+    print(f"{label:<28} p50 {percentile(micros, 50):8.1f} us   p95 {percentile(micros, 95):8.1f} us   mean {statistics.mean(micros):8.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--batch", type=int, default=20000, help="drafts per bulk add, as build_index reads them")
+    args = parser.parse_args()
+
+    index = NearDuplicateIndex(threshold=args.threshold)
+    print(f"{args.docs} docs, threshold {args.threshold}, {index.bands} bands x {index.rows} rows")
+
+    started = time.perf_counter()
+    batch, kept = [], []
+    for i, text in enumerate(synthetic_drafts(args.docs)):
+        batch.append(text)
+        if i < args.queries:
+            kept.append(text)
+        if len(batch) == args.batch:
+            index.add_many([str(i - len(batch) + 1 + j) for j in range(len(batch))], index.signatures_for(batch))
+            batch = []
+    if batch:
+        index.add_many([str(args.docs - len(batch) + j) for j in range(len(batch))], index.signatures_for(batch))
+    build = time.perf_counter() - started
+    memory = index.signatures.nbytes + index._sorted_keys.nbytes + index._sorted_rows.nbytes
+    print(f"bulk build: {build:.1f}s ({args.docs / build:,.0f} docs/s), arrays {memory / 2**20:.0f} MiB")
+
+    fresh = list(synthetic_drafts(args.queries, seed=1))
+    # Near-copies: same template and details, different recipient name
+    copies = [text.replace("person", "someone", 1) for text in kept]
+
+    timings = {"find (new draft)": [], "find (near-copy)": [], "signature only": [], "check + add": []}
+    hits = 0
+    for text in fresh:
+        t0 = time.perf_counter()
+        index.find(text)
+        timings["find (new draft)"].append(time.perf_counter() - t0)
+    for i, text in enumerate(copies):
+        t0 = time.perf_counter()
+        match = index.find(text)
+        timings["find (near-copy)"].append(time.perf_counter() - t0)
+        hits += match is not None and match[0] == str(i)
+    for text in fresh:
+        t0 = time.perf_counter()
+        index.signature(text)
+        timings["signature only"].append(time.perf_counter() - t0)
+    for i, text in enumerate(fresh):
+        t0 = time.perf_counter()
+        index.check(f"new-{i}", text)
+        timings["check + add"].append(time.perf_counter() - t0)
+
+    for label, seconds in timings.items():
+        report(label, seconds)
+    print(f"near-copy recall: {hits / len(copies):.3f}; false matches on new drafts: {index.stats['duplicates']}")
+
+
+if __name__ == "__main__":
+    main()
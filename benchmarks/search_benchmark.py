@@ -0,0 +1,109 @@
+"""Target search latency over a large in-process index.
+
+Indexes ``--targets`` synthetic targets (names drawn from a few thousand
+first and last names, so the vocabulary looks like a real prospect list)
+and times ``TargetSearchIndex.search`` for exact words, prefixes typed
+as you go, typos and multi-word queries, reporting build time, memory
+and p50/p95/max per query kind against the 20ms goal. MongoDB is not
+involved: fetching the top 20 documents by id afterwards is one indexed
+``$in`` query.
+
+    python benchmarks/search_benchmark.py --targets 500000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from target_search import TargetSearchIndex  # noqa: E402
+
+SYLLABLES = ["ka", "ri", "mo", "lan", "de", "vi", "sha", "ro", "na", "tel", "ber", "son", "ja", "mi", "go", "ra", "li", "an", "eth", "wen"]
+TITLES = ["Head of Machine Learning", "ML Engineer", "Data Scientist", "VP Engineering", "Staff Engineer",
+          "Engineering Manager", "Founder", "Product Manager", "Recruiter", "AI Researcher"]
+CITIES = ["Bengaluru", "London", "San Francisco", "Berlin", "Toronto", "Singapore", "Dublin", "Madrid", "Tokyo", "Austin"]
+TOPICS = ["LLM evaluation", "vector search", "MLOps", "data contracts", "GPU scheduling", "agents in production"]
+
+
+def make_words(rng: random.Random, count: int):
+    found = set()
+    while len(found) < count:
+        found.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize())
+    return sorted(found)
+
+
+def synthetic_targets(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    first, last, companies = make_words(rng, 3000), make_words(rng, 8000), make_words(rng, 20000)
+    for i in range(count):
+        company = rng.choice(companies)
+        yield {
+            "id": f"st-{i:08d}",
+            "name": f"{rng.choice(first)} {rng.choice(last)}",
+            "title": rng.choice(TITLES),
+            "company": f"{company} Labs" if i % 3 == 0 else company,
+            "location": rng.choice(CITIES),
+            "profile_summary": f"Works on {rng.choice(TOPICS)} at {company}.",
+        }
+
+
+def typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:] if rng.random() < 0.5 else word[:i] + rng.choice("aeiourn") + word[i + 1:]
+
+
+def queries(targets, rng: random.Random, per_kind: int):
+    sample = rng.sample(targets, per_kind)
+    return {
+        "exact last name": [target["name"].split()[1] for target in sample],
+        "prefix (3 chars)": [target["name"].split()[1][:3] for target in sample],
+        "prefix (5 chars)": [target["name"].split()[1][:5] for target in sample],
+        "typo": [typo(target["name"].split()[1], rng) for target in sample],
+        "full name": [target["name"] for target in sample],
+        "name + city": [f"{target['name'].split()[0]} {target['location']}" for target in sample],
+        "company + title prefix": [f"{target['company'].split()[0]} {target['title'][:6]}" for target in sample],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", type=int, default=500000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per kind")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    targets = list(synthetic_targets(args.targets))
+    tracemalloc.start()
+    index = TargetSearchIndex()
+    started = time.perf_counter()
+    index.add_many(targets)
+    index.search("warmup")  # sorts the vocabulary
+    build = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    snapshot = index.snapshot()
+    print(f"indexed {snapshot['targets']:,} targets, {snapshot['words']:,} words, {snapshot['postings']:,} postings "
+          f"in {build:.1f}s, {memory:.0f} MB\n")
+
+    rng = random.Random(1)
+    print(f"{'query kind':<24} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7} {'hits':>6}")
+    worst = 0.0
+    for kind, texts in queries(targets, rng, args.queries).items():
+        latencies, hits = [], []
+        for text in texts:
+            started = time.perf_counter()
+            hits.append(len(index.search(text, args.limit)))
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        worst = max(worst, p95)
+        print(f"{kind:<24} {statistics.median(latencies):>7.2f} {p95:>7.2f} {latencies[-1]:>7.2f} {statistics.mean(hits):>6.1f}")
+    print(f"\nworst p95 {worst:.1f} ms ({'within' if worst <= 20 else 'over'} the 20 ms goal)")
+
+
+if __name__ == "__main__":
+    main()
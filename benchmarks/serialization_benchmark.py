@@ -0,0 +1,156 @@
+"""List-response serialization: per-row cost and req/s for 1000-row pages.
+
+First times encoding ``--rows`` stored targets, messages and viral posts
+the way the list endpoints used to (a Pydantic model per document, then
+FastAPI's ``response_model`` validation and serialization, then the JSON
+response) against the fast path (model defaults filled in, one orjson
+call). Then serves the app in-process with uvicorn against MONGO_URL
+(database ``<DB_NAME>_serialization_benchmark``, dropped afterwards) or,
+with ``--mongomock``, an in-memory stand-in, and drives each list endpoint
+at ``limit=--rows`` with ``FAST_JSON_RESPONSES`` off and then on. The
+mongomock runs are dominated by its document copying, so the end-to-end
+gap is best read against a real server.
+
+    python benchmarks/serialization_benchmark.py --rows 1000 --duration 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_test import percentile, seed, serve, synthetic_messages, synthetic_targets, synthetic_viral_posts  # noqa: E402
+
+
+async def encode_with_models(model, field, docs):
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+
+    content = await serialize_response(field=field, response_content=[model(**doc) for doc in docs], is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def encode_fast(model, field, docs):
+    from serialization import rows_response
+
+    return rows_response(model, [dict(doc) for doc in docs]).body
+
+
+async def time_encoding(encode, model, field, docs, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await encode(model, field, docs)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+async def per_row_costs(server, rows: int, repeat: int):
+    from fastapi.utils import create_response_field
+
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    cases = [
+        ("targets", server.Target, list(synthetic_targets(0, rows, now))),
+        ("messages", server.Message, list(synthetic_messages(0, rows, rows, now, rng))),
+        ("viral_posts", server.ViralPost, list(synthetic_viral_posts(0, rows, now, rng))),
+    ]
+    print(f"{'per-row encoding':<20} {'models us/row':>14} {'fast us/row':>12} {'speedup':>8}")
+    for name, model, docs in cases:
+        field = create_response_field(name=f"Response_{name}", type_=List[model])
+        # Both paths have to produce the same JSON (key order aside, for fields the documents lack)
+        assert json.loads(await encode_with_models(model, field, docs)) == json.loads(await encode_fast(model, field, docs))
+        slow = await time_encoding(encode_with_models, model, field, docs, repeat)
+        fast = await time_encoding(encode_fast, model, field, docs, repeat)
+        print(f"{name:<20} {slow / rows * 1e6:>14.2f} {fast / rows * 1e6:>12.2f} {slow / fast:>7.1f}x")
+
+
+async def drive(http, path: str, concurrency: int, duration: float):
+    latencies, deadline = [], time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await http.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000
+
+
+async def run(args):
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    db_name = f"{os.environ.get('DB_NAME', 'linkedin')}_serialization_benchmark"
+    os.environ.update({
+        "DB_NAME": db_name,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark"),
+        "JOB_WORKER_ENABLED": "false",
+        "VECTOR_INDEX_DIR": "",
+        "VIRAL_POST_TOP_CACHE_SECONDS": "0",
+    })
+
+    import httpx
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    await per_row_costs(server, args.rows, args.repeat)
+
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+
+        server.db = AsyncMongoMockClient()[db_name]
+    else:
+        await server.client.drop_database(db_name)
+    try:
+        await seed(server, args.rows, args.rows, args.rows)
+        await server.db.status_checks.insert_many([
+            {"id": f"sc-{i:08d}", "client_name": f"client-{i % 10}", "timestamp": datetime.utcnow()} for i in range(args.rows)
+        ])
+        # /api/generated-posts always returns the latest ten
+        await server.db.generated_posts.insert_many([
+            server.GeneratedPost(content=f"Post {i} on shipping faster", based_on_viral_posts=["lt-post-00000000"]).dict()
+            for i in range(10)
+        ])
+        uvicorn_server, serve_task, base_url = await serve(server.app)
+        paths = [f"/api/targets?limit={args.rows}", f"/api/messages?limit={args.rows}", f"/api/status?limit={args.rows}",
+                 f"/api/viral-posts?limit={min(args.rows, server.MAX_VIRAL_POSTS_LIMIT)}", "/api/generated-posts"]
+        print(f"\n{'endpoint':<32} {'mode':<7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        async with httpx.AsyncClient(base_url=base_url, timeout=300) as http:
+            for path in paths:
+                for fast in (False, True):
+                    server.FAST_JSON_RESPONSES = fast
+                    await http.get(path)
+                    rps, p50, p95 = await drive(http, path, args.concurrency, args.duration)
+                    print(f"{path:<32} {'fast' if fast else 'models':<7} {rps:>8.1f} {p50:>8.1f} {p95:>8.1f}")
+        uvicorn_server.should_exit = True
+        await serve_task
+    finally:
+        if not args.mongomock:
+            await server.client.drop_database(db_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20, help="encodings per path when timing per-row cost")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per endpoint and mode")
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory database instead of MONGO_URL")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import "./App.css";
 import axios from "axios";
 
@@ -29,6 +29,9 @@ const Dashboard = () => {
     llm_provider: "openai"
   });
 
+  const [liveConnected, setLiveConnected] = useState(false);
+  const liveRef = useRef(false);
+
   useEffect(() => {
     fetchAnalytics();
     fetchTargets();
@@ -37,6 +40,75 @@ const Dashboard = () => {
     fetchGeneratedPosts();
   }, []);
 
+  // Live updates: the server pushes batches of deltas for targets, messages,
+  // generated posts and analytics; EventSource reconnects and replays on its own
+  useEffect(() => {
+    if (typeof EventSource === "undefined") return;
+    const source = new EventSource(`${API}/live`);
+    const setLive = (live) => {
+      liveRef.current = live;
+      setLiveConnected(live);
+    };
+    source.onopen = () => setLive(true);
+    source.onerror = () => setLive(false);
+    source.addEventListener("changes", (event) => {
+      try {
+        JSON.parse(event.data).forEach(applyDelta);
+      } catch (error) {
+        console.error("Error applying live update:", error);
+      }
+    });
+    return () => {
+      source.close();
+      setLive(false);
+    };
+  }, []);
+
+  const upsertById = (items, delta, newestFirst = false, maxItems = null) => {
+    const index = items.findIndex(item => item.id === delta.id);
+    if (index === -1) {
+      if (delta.op !== "upsert") return items;
+      const added = newestFirst ? [delta.doc, ...items] : [...items, delta.doc];
+      return maxItems ? added.slice(0, maxItems) : added;
+    }
+    const updated = delta.op === "upsert" ? { ...delta.doc } : { ...items[index], ...delta.fields };
+    (delta.removed || []).forEach(field => delete updated[field]);
+    return items.map((item, i) => (i === index ? updated : item));
+  };
+
+  const applyDelta = (delta) => {
+    const resync = {
+      targets: fetchTargets,
+      messages: fetchMessages,
+      generated_posts: fetchGeneratedPosts,
+      analytics: fetchAnalytics
+    };
+    if (delta.op === "resync") {
+      resync[delta.collection]?.();
+    } else if (delta.collection === "targets") {
+      setTargets(items => upsertById(items, delta));
+    } else if (delta.collection === "messages") {
+      setMessages(items => upsertById(items, delta));
+    } else if (delta.collection === "generated_posts") {
+      setGeneratedPosts(items => upsertById(items, delta, true, 10));
+    } else if (delta.collection === "analytics") {
+      setAnalytics(current => {
+        if (!current) return current;
+        const { daily_activity, ...fields } = delta.fields;
+        const merged = { ...current, ...fields };
+        if (daily_activity && current.daily_activity) {
+          // Only days already on the chart are updated, so its window stays as requested
+          const days = { ...current.daily_activity };
+          Object.entries(daily_activity).forEach(([day, count]) => {
+            if (day in days) days[day] = count;
+          });
+          merged.daily_activity = days;
+        }
+        return merged;
+      });
+    }
+  };
+
   const fetchAnalytics = async () => {
     try {
       const response = await axios.get(`${API}/analytics`);
@@ -96,7 +168,8 @@ const Dashboard = () => {
         profile_summary: "",
         recent_activity: ""
       });
-      fetchTargets();
+      // The live feed delivers the new document when connected
+      if (!liveRef.current) fetchTargets();
     } catch (error) {
       console.error("Error creating target:", error);
     } finally {
@@ -107,23 +180,14 @@ const Dashboard = () => {
   const generateMessage = async (targetId) => {
     try {
       setLoading(true);
-      const target = targets.find(t => t.id === targetId);
-      if (!target) return;
-
-      const response = await axios.post(`${API}/messages/generate`, {
+      // The server fills in the stored profile and earlier messages to this target
+      await axios.post(`${API}/messages/generate`, {
         target_id: targetId,
-        profile_data: {
-          name: target.name,
-          title: target.title,
-          company: target.company,
-          profile_summary: target.profile_summary,
-          recent_activity: target.recent_activity
-        },
         message_type: messageGeneration.message_type,
         llm_provider: messageGeneration.llm_provider
       });
 
-      fetchMessages();
+      if (!liveRef.current) fetchMessages();
       alert("Message generated successfully!");
     } catch (error) {
       console.error("Error generating message:", error);
@@ -137,7 +201,7 @@ const Dashboard = () => {
     try {
       setLoading(true);
       await axios.post(`${API}/generate-post`);
-      fetchGeneratedPosts();
+      if (!liveRef.current) fetchGeneratedPosts();
       alert("Viral post generated successfully!");
     } catch (error) {
       console.error("Error generating post:", error);
@@ -195,6 +259,9 @@ const Dashboard = () => {
     <div className="space-y-6">
       <div className="flex justify-between items-center">
         <h2 className="text-2xl font-bold text-gray-900">LinkedIn AI Automation Dashboard</h2>
+        <span className={`text-sm ${liveConnected ? "text-green-600" : "text-gray-400"}`}>
+          {liveConnected ? "● Live" : "○ Offline"}
+        </span>
         <button
           onClick={testConnections}
           className="px-4 py-2 bg-green-600 text-white rounded-lg hover:bg-green-700"
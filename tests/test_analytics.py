@@ -0,0 +1,98 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from analytics import (
+    compute_analytics,
+    day_range,
+    read_analytics,
+    reconcile_rollups,
+    record_messages_created,
+    record_target_created,
+    record_target_status_change,
+)
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def test_day_range_is_newest_first_and_inclusive():
+    assert day_range(date(2024, 2, 27), date(2024, 3, 1)) == [
+        "2024-03-01", "2024-02-29", "2024-02-28", "2024-02-27",
+    ]
+
+
+def test_compute_analytics_counts_and_buckets():
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["test"]
+        today = date(2024, 3, 10)
+        await db.targets.insert_many([
+            {"id": "1", "connection_status": "connected"},
+            {"id": "2", "connection_status": "pending"},
+            {"id": "3", "connection_status": "connected"},
+        ])
+        noon = datetime(2024, 3, 10, 12)
+        await db.messages.insert_many([
+            {"message_type": "connection_request", "status": "sent", "created_at": noon},
+            {"message_type": "connection_request", "status": "sent", "created_at": noon - timedelta(days=1)},
+            {"message_type": "follow_up", "status": "sent", "created_at": noon - timedelta(days=1)},
+            {"message_type": "follow_up", "status": "replied", "created_at": noon - timedelta(days=30)},
+        ])
+        return await compute_analytics(db, today - timedelta(days=2), today)
+
+    analytics = asyncio.run(scenario())
+    assert analytics["total_targets"] == 3
+    assert analytics["connections_accepted"] == 2
+    assert analytics["connections_sent"] == 2
+    assert analytics["messages_sent"] == 3
+    assert analytics["messages_replied"] == 1
+    assert analytics["acceptance_rate"] == 100.0
+    assert analytics["reply_rate"] == 33.33
+    assert analytics["daily_activity"] == {"2024-03-10": 1, "2024-03-09": 2, "2024-03-08": 0}
+
+
+def test_compute_analytics_on_empty_database():
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    analytics = asyncio.run(compute_analytics(db, date(2024, 3, 10), date(2024, 3, 10)))
+    assert analytics["total_targets"] == 0
+    assert analytics["reply_rate"] == 0.0
+    assert analytics["daily_activity"] == {"2024-03-10": 0}
+
+
+def test_rollups_track_writes_and_reconcile_fixes_drift():
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["test"]
+        today = date(2024, 3, 10)
+        noon = datetime(2024, 3, 10, 12)
+        targets = [{"id": "1", "connection_status": "not_connected"}, {"id": "2", "connection_status": "connected"}]
+        await db.targets.insert_many([dict(t) for t in targets])
+        for target in targets:
+            await record_target_created(db, target)
+        await db.targets.update_one({"id": "1"}, {"$set": {"connection_status": "connected"}})
+        await record_target_status_change(db, "not_connected", "connected")
+
+        messages = [
+            {"message_type": "connection_request", "status": "sent", "created_at": noon},
+            {"message_type": "follow_up", "status": "replied", "created_at": noon - timedelta(days=1)},
+            {"message_type": "follow_up", "status": "draft", "created_at": noon},
+        ]
+        await db.messages.insert_many([dict(m) for m in messages])
+        await record_messages_created(db, messages)
+
+        from_rollups = await read_analytics(db, today - timedelta(days=1), today)
+        exact = await compute_analytics(db, today - timedelta(days=1), today)
+
+        # A write that bypassed the rollup hooks
+        await db.messages.insert_one({"message_type": "follow_up", "status": "sent", "created_at": noon})
+        drift = await reconcile_rollups(db)
+        reconciled = await read_analytics(db, today - timedelta(days=1), today)
+        return from_rollups, exact, drift, reconciled
+
+    from_rollups, exact, drift, reconciled = asyncio.run(scenario())
+    assert from_rollups == exact
+    assert from_rollups["connections_accepted"] == 2
+    assert from_rollups["daily_activity"] == {"2024-03-10": 2, "2024-03-09": 1}
+    assert drift["counters"] == {"messages_sent": (1, 2)}
+    assert drift["daily"] == {"2024-03-10": (2, 3)}
+    assert reconciled["messages_sent"] == 2
+    assert reconciled["daily_activity"]["2024-03-10"] == 3
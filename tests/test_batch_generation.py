@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+from batch_generation import run_message_batch
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.inserted = []
+        self.updates = []
+
+    async def insert_many(self, documents, ordered=True):
+        self.inserted.extend(documents)
+
+    async def update_one(self, query, update):
+        self.updates.append(update)
+
+
+async def stream(items):
+    for item in items:
+        yield item
+
+
+def test_run_message_batch_spreads_providers_and_records_failures():
+    db = SimpleNamespace(messages=RecordingCollection(), batch_jobs=RecordingCollection())
+    targets = [{"id": str(i)} for i in range(20)]
+    providers_used = []
+
+    async def generate(target, provider):
+        providers_used.append(provider)
+        if target["id"] == "7":
+            raise RuntimeError("rate limited")
+        await asyncio.sleep(0.01)
+        return {"target_id": target["id"], "content": "hi"}
+
+    asyncio.run(run_message_batch(
+        db, "job", stream(targets), generate, ["openai", "ollama"], concurrency=4, flush_size=5
+    ))
+
+    assert sorted(m["target_id"] for m in db.messages.inserted) == sorted(str(i) for i in range(20) if i != 7)
+    assert set(providers_used) == {"openai", "ollama"}
+    increments = [u["$inc"] for u in db.batch_jobs.updates if "$inc" in u]
+    assert sum(i["completed"] for i in increments) == 19
+    assert sum(i["failed"] for i in increments) == 1
+    assert db.batch_jobs.updates[-1]["$set"]["status"] == "completed"
+
+
+def test_failed_batch_keeps_the_messages_it_generated():
+    db = SimpleNamespace(messages=RecordingCollection(), batch_jobs=RecordingCollection())
+
+    async def failing_stream():
+        for i in range(6):
+            yield {"id": str(i)}
+        await asyncio.sleep(0.05)
+        raise RuntimeError("cursor killed")
+
+    async def generate(target, provider):
+        if target["id"] == "3":
+            raise RuntimeError("rate limited")
+        return {"target_id": target["id"], "content": "hi"}
+
+    asyncio.run(run_message_batch(db, "job", failing_stream(), generate, ["openai"], concurrency=2, flush_size=100, flush_interval=60))
+
+    assert sorted(m["target_id"] for m in db.messages.inserted) == ["0", "1", "2", "4", "5"]
+    increments = [u["$inc"] for u in db.batch_jobs.updates if "$inc" in u]
+    assert (sum(i["completed"] for i in increments), sum(i["failed"] for i in increments)) == (5, 1)
+    assert db.batch_jobs.updates[-1]["$set"]["status"] == "failed" and db.batch_jobs.updates[-1]["$set"]["error"] == "cursor killed"
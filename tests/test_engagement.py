@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from engagement import EngagementRanker, epoch_seconds, hot_scores, parse_weights, parse_window, weighted_engagement
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+
+def test_hot_score_order_matches_decayed_engagement_at_any_time():
+    rng = np.random.default_rng(0)
+    count = 500
+    reactions, comments, shares = (rng.integers(0, 5000, count) for _ in range(3))
+    scraped = epoch_seconds([NOW - timedelta(hours=float(h)) for h in rng.uniform(0, 24 * 30, count)])
+    scores = hot_scores(reactions, comments, shares, scraped, half_life_hours=48)
+
+    for now in (epoch_seconds([NOW])[0], epoch_seconds([NOW + timedelta(days=90)])[0]):
+        decayed = (1 + weighted_engagement(reactions, comments, shares)) * 0.5 ** ((now - scraped) / (48 * 3600))
+        assert np.array_equal(np.argsort(-scores, kind="stable"), np.argsort(-decayed, kind="stable"))
+
+
+def test_half_life_trades_engagement_for_recency():
+    fresh, stale = epoch_seconds([NOW, NOW - timedelta(hours=48)])
+    # Twice the engagement exactly offsets one half-life of age
+    assert hot_scores([99], [0], [0], np.array([fresh]))[0] == pytest.approx(hot_scores([199], [0], [0], np.array([stale]))[0])
+
+
+def test_parse_weights_and_windows():
+    assert parse_weights("comments:2, shares:10") == {"reactions": 1.0, "comments": 2.0, "shares": 10.0}
+    assert parse_weights("") == {"reactions": 1.0, "comments": 3.0, "shares": 5.0}
+    with pytest.raises(ValueError):
+        parse_weights("likes:1")
+    assert parse_window("24h") == timedelta(hours=24)
+    assert parse_window("2w") == timedelta(weeks=2)
+    assert parse_window("all") is None and parse_window(None) is None
+    for bad in ("7", "0d", "3m"):
+        with pytest.raises(ValueError):
+            parse_window(bad)
+
+
+def test_rescore_writes_only_changed_scores_and_serves_cached_top():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["viral_posts"]
+    ranker = EngagementRanker(batch_size=3)
+    now = datetime.utcnow()
+
+    async def scenario():
+        await collection.insert_many([
+            {"id": f"p{i}", "reactions": 100 * i, "comments": 0, "shares": 0, "scraped_at": now - timedelta(days=i)}
+            for i in range(1, 8)
+        ])
+        first = await ranker.rescore(collection)
+        second = await ranker.rescore(collection)
+        week = [post["id"] for post in await ranker.top(collection, timedelta(days=3), limit=5)]
+
+        await collection.update_one({"id": "p1"}, {"$set": {"reactions": 10000}})
+        cached = [post["id"] for post in await ranker.top(collection, timedelta(days=3), limit=5)]
+        third = await ranker.rescore(collection)
+        fresh = [post["id"] for post in await ranker.top(collection, timedelta(days=3), limit=5)]
+        return first, second, third, week, cached, fresh
+
+    first, second, third, week, cached, fresh = asyncio.run(scenario())
+    assert first == {"scored": 7, "updated": 7}
+    assert second == {"scored": 7, "updated": 0}
+    assert third == {"scored": 7, "updated": 1}
+    assert week == cached == ["p2", "p1"]
+    assert fresh == ["p1", "p2"]
+
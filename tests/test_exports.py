@@ -0,0 +1,59 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+from exports import CHUNK_BYTES, iter_export_chunks
+
+
+async def documents(count):
+    for i in range(count):
+        yield {
+            "id": f"t{i}",
+            "name": f"Lead, \"{i}\"",
+            "tags": ["ml", "hiring"],
+            "email": None,
+            "created_at": datetime(2024, 1, 1, 12, 0, i % 60),
+        }
+
+
+async def collect(*args, **kwargs):
+    return [chunk async for chunk in iter_export_chunks(*args, **kwargs)]
+
+
+def test_ndjson_rows_roundtrip():
+    chunks = asyncio.run(collect(documents(3), "ndjson"))
+    rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+
+    assert [row["id"] for row in rows] == ["t0", "t1", "t2"]
+    assert rows[1]["name"] == 'Lead, "1"'
+    assert rows[0]["created_at"] == "2024-01-01T12:00:00"
+    assert rows[0]["email"] is None
+
+
+def test_csv_uses_columns_and_quotes_cells():
+    columns = ["id", "name", "tags", "email", "created_at"]
+    chunks = asyncio.run(collect(documents(2), "csv", columns=columns))
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+
+    assert rows[0] == columns
+    assert rows[1] == ["t0", 'Lead, "0"', '["ml", "hiring"]', "", "2024-01-01T12:00:00"]
+    assert len(rows) == 3
+
+
+def test_large_export_is_chunked_and_gzip_roundtrips():
+    plain = asyncio.run(collect(documents(5000), "ndjson"))
+    compressed = asyncio.run(collect(documents(5000), "ndjson", gzip=True))
+
+    # First row is flushed on its own, then roughly CHUNK_BYTES at a time
+    assert len(plain) > 3
+    assert plain[0].count(b"\n") == 1
+    assert all(len(chunk) < 2 * CHUNK_BYTES for chunk in plain)
+    assert gzip.decompress(b"".join(compressed)) == b"".join(plain)
+
+
+def test_empty_csv_export_still_has_header():
+    chunks = asyncio.run(collect(documents(0), "csv", columns=["id", "name"]))
+    assert b"".join(chunks) == b"id,name\r\n"
@@ -0,0 +1,73 @@
+import asyncio
+import os
+
+import pytest
+
+from indexes import INDEXES, QUERY_SHAPES, ensure_indexes, plan_stages, verify_query_plans
+
+
+def test_plan_stages_walks_nested_plans():
+    plan = {
+        "stage": "FETCH",
+        "inputStage": {
+            "stage": "OR",
+            "inputStages": [{"stage": "IXSCAN"}, {"stage": "COLLSCAN"}],
+        },
+    }
+    assert plan_stages(plan) == ["FETCH", "OR", "IXSCAN", "COLLSCAN"]
+    assert plan_stages({"queryPlan": {"stage": "IXSCAN"}}) == ["IXSCAN"]
+
+
+def test_every_query_shape_targets_a_known_collection():
+    indexed = set(INDEXES) | {"analytics_daily"}
+    assert {collection for collection, _, _ in QUERY_SHAPES} <= indexed
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_MONGO_URL"), reason="set TEST_MONGO_URL to run against a real MongoDB")
+def test_no_query_shape_falls_back_to_collscan():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def scenario():
+        client = AsyncIOMotorClient(os.environ["TEST_MONGO_URL"])
+        db = client["linkedin_index_plan_test"]
+        try:
+            await ensure_indexes(db)
+            return await verify_query_plans(db)
+        finally:
+            await client.drop_database("linkedin_index_plan_test")
+            client.close()
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_duplicate_urls_only_cost_the_unique_index(caplog):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["index_test"]
+        url = "https://www.linkedin.com/in/ada"
+        await db.targets.insert_many([{"id": "t1", "linkedin_url": url}, {"id": "t2", "linkedin_url": url}, {"id": "t3"}])
+        await ensure_indexes(db)
+        return await db.targets.index_information()
+
+    indexes = asyncio.run(scenario())
+    assert "linkedin_url_unique" not in indexes
+    assert {"id_unique", "created_at_id", "updated_at_id"} <= set(indexes)
+    assert "Index linkedin_url_unique on targets not created" in caplog.text
+    assert "['https://www.linkedin.com/in/ada']" in caplog.text
+
+
+def test_duplicate_viral_posts_keep_their_other_indexes(caplog):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["index_test"]
+        url = "https://www.linkedin.com/posts/jane-activity-1"
+        await db.viral_posts.insert_many([{"id": "p1", "linkedin_url": url}, {"id": "p2", "linkedin_url": url}])
+        await ensure_indexes(db)
+        return await db.viral_posts.index_information()
+
+    indexes = asyncio.run(scenario())
+    assert "linkedin_url_unique" not in indexes
+    assert {"id_unique", "hot_score_desc_scraped_at_desc"} <= set(indexes)
+    assert "Index linkedin_url_unique on viral_posts not created" in caplog.text
@@ -0,0 +1,207 @@
+import asyncio
+import time
+
+import pytest
+
+from fake_llm_server import start_fake_llm_server
+from job_queue import JobQueue, JobWorker, PermanentJobError, TokenBucket
+from llm_providers import OpenAIProvider
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def make_queue(**kwargs):
+    return JobQueue(mongomock_motor.AsyncMongoMockClient()["test"]["jobs"], **kwargs)
+
+
+async def wait_for_status(queue, status, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if await queue.collection.count_documents({"status": status}) >= count:
+            return
+        await asyncio.sleep(0.02)
+
+
+def test_token_bucket_limits_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.perf_counter()
+        for _ in range(5):
+            await bucket.acquire()
+        return time.perf_counter() - started
+
+    assert asyncio.run(scenario()) >= 0.18
+
+
+def test_backoff_grows_exponentially_and_is_capped():
+    queue = JobQueue(None, base_backoff=1.0, max_backoff=10.0)
+    assert 0.5 <= queue.backoff(1) <= 1.0
+    assert 2.0 <= queue.backoff(3) <= 4.0
+    assert queue.backoff(20) <= 10.0
+
+
+def test_worker_runs_jobs_against_fake_llm_server():
+    async def scenario():
+        runner, base_url = await start_fake_llm_server(latency=0.05, reply="drafted")
+        provider = OpenAIProvider(api_key="sk-test", base_url=f"{base_url}/v1")
+        queue = make_queue()
+
+        async def handler(payload):
+            return {"content": await provider.chat([{"role": "user", "content": payload["prompt"]}])}
+
+        worker = JobWorker(queue, {"generate": handler}, {"openai": TokenBucket(100)}, poll_interval=0.01)
+        jobs = [await queue.enqueue("generate", {"prompt": str(i)}, provider="openai") for i in range(5)]
+        worker.start()
+        await wait_for_status(queue, "completed", len(jobs))
+        await worker.stop()
+        await provider.aclose()
+        await runner.cleanup()
+        return [await queue.collection.find_one({"id": job["id"]}) for job in jobs]
+
+    for job in asyncio.run(scenario()):
+        assert job["status"] == "completed"
+        assert job["result"] == {"content": "drafted"}
+
+
+def test_failed_jobs_retry_then_dead_letter():
+    async def scenario():
+        queue = make_queue(max_attempts=3, base_backoff=0.01, max_backoff=0.02)
+        attempts = []
+
+        async def flaky(payload):
+            attempts.append(payload)
+            raise RuntimeError("429 Too Many Requests")
+
+        async def invalid(payload):
+            raise PermanentJobError("bad payload")
+
+        worker = JobWorker(queue, {"flaky": flaky, "invalid": invalid}, poll_interval=0.01)
+        flaky_job = await queue.enqueue("flaky", {})
+        invalid_job = await queue.enqueue("invalid", {})
+        worker.start()
+        await wait_for_status(queue, "dead_letter", 2)
+        await worker.stop()
+        return (
+            len(attempts),
+            await queue.collection.find_one({"id": flaky_job["id"]}),
+            await queue.collection.find_one({"id": invalid_job["id"]}),
+            queue,
+        )
+
+    attempts, flaky_job, invalid_job, queue = asyncio.run(scenario())
+    assert attempts == 3
+    assert flaky_job["status"] == "dead_letter"
+    assert flaky_job["last_error"] == "429 Too Many Requests"
+    assert invalid_job["status"] == "dead_letter"
+    assert invalid_job["attempts"] == 1
+
+
+def test_expired_lease_is_reclaimed():
+    async def scenario():
+        queue = make_queue(lease_seconds=0.05)
+        job = await queue.enqueue("generate", {})
+        first = await queue.claim("crashed-worker")
+        assert await queue.claim("other-worker") is None
+        await asyncio.sleep(0.1)
+        second = await queue.claim("other-worker")
+        return job, first, second
+
+    job, first, second = asyncio.run(scenario())
+    assert first["id"] == second["id"] == job["id"]
+    assert second["worker_id"] == "other-worker"
+    assert second["attempts"] == 2
+
+
+def test_job_whose_leases_keep_expiring_is_dead_lettered():
+    async def scenario():
+        queue = make_queue(lease_seconds=0.02, max_attempts=2)
+        job = await queue.enqueue("poison", {})
+        claims = []
+        for worker_id in ("crashed-1", "crashed-2", "other"):
+            claims.append(await queue.claim(worker_id))
+            await asyncio.sleep(0.05)
+        claims.append(await queue.claim("other"))
+        return job, claims, await queue.collection.find_one({"id": job["id"]})
+
+    job, claims, stored = asyncio.run(scenario())
+    assert [claim and claim["attempts"] for claim in claims] == [1, 2, None, None]
+    assert (stored["status"], stored["attempts"], stored["last_error"]) == ("dead_letter", 2, "lease expired")
+
+
+def test_worker_slot_survives_queue_errors():
+    async def scenario():
+        queue = make_queue()
+        complete = queue.complete
+        calls = []
+
+        async def flaky_complete(job, result):
+            calls.append(job["id"])
+            if len(calls) == 1:
+                raise RuntimeError("connection reset")
+            await complete(job, result)
+
+        queue.complete = flaky_complete
+
+        async def handler(payload):
+            return payload
+
+        worker = JobWorker(queue, {"generate": handler}, concurrency=1, poll_interval=0.01)
+        first = await queue.enqueue("generate", {"n": 1})
+        second = await queue.enqueue("generate", {"n": 2})
+        worker.start()
+        await wait_for_status(queue, "completed", 1)
+        await worker.stop()
+        return (await queue.collection.find_one({"id": first["id"]}), await queue.collection.find_one({"id": second["id"]}))
+
+    first, second = asyncio.run(scenario())
+    # The first outcome was lost, so its lease is left to expire; the slot went on to the next job
+    assert first["status"] == "running"
+    assert second["status"] == "completed" and second["result"] == {"n": 2}
+
+
+def test_resolved_provider_picks_the_rate_limiter():
+    async def scenario():
+        queue = make_queue()
+        handled = []
+
+        async def handler(payload):
+            handled.append(payload)
+
+        buckets = {"ollama": TokenBucket(rate=20, capacity=1)}
+        worker = JobWorker(queue, {"generate": handler}, buckets, concurrency=1, poll_interval=0.01,
+                           resolve_provider=lambda provider: "ollama" if provider == "auto" else provider)
+        for i in range(4):
+            await queue.enqueue("generate", {"n": i}, provider="auto")
+        started = time.perf_counter()
+        worker.start()
+        await wait_for_status(queue, "completed", 4)
+        elapsed = time.perf_counter() - started
+        await worker.stop()
+        return handled, elapsed
+
+    handled, elapsed = asyncio.run(scenario())
+    # "auto" jobs wait on the ollama bucket: one token up front, then 20/s
+    assert len(handled) == 4 and elapsed >= 0.14
+
+
+def test_lease_is_kept_while_waiting_on_the_rate_limit():
+    async def scenario():
+        queue = make_queue(lease_seconds=0.06)
+        handled = []
+
+        async def handler(payload):
+            handled.append(payload)
+
+        bucket = TokenBucket(rate=5, capacity=1)
+        await bucket.acquire()  # the next token is 0.2s away, over three leases
+        worker = JobWorker(queue, {"generate": handler}, {"openai": bucket}, concurrency=1, poll_interval=0.01)
+        await queue.enqueue("generate", {"n": 1}, provider="openai")
+        worker.start()
+        await asyncio.sleep(0.15)
+        stolen = await queue.claim("other-worker")
+        await wait_for_status(queue, "completed", 1)
+        await worker.stop()
+        return handled, stolen
+
+    handled, stolen = asyncio.run(scenario())
+    assert stolen is None and handled == [{"n": 1}]
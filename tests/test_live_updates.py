@@ -0,0 +1,176 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from analytics import record_messages_created, record_target_created
+from live_updates import LiveFeed, change_delta
+
+
+def test_change_delta_from_change_stream_events():
+    insert = {
+        "operationType": "insert", "ns": {"db": "d", "coll": "targets"}, "documentKey": {"_id": "oid"},
+        "fullDocument": {"_id": "oid", "id": "t1", "name": "Ada"},
+    }
+    update = {
+        "operationType": "update", "ns": {"db": "d", "coll": "targets"}, "documentKey": {"_id": "oid"},
+        "fullDocument": {"_id": "oid", "id": "t1", "name": "Ada", "connection_status": "connected"},
+        "updateDescription": {"updatedFields": {"connection_status": "connected"}, "removedFields": ["phone"]},
+    }
+    assert change_delta(insert) == {"collection": "targets", "op": "upsert", "id": "t1", "doc": {"id": "t1", "name": "Ada"}}
+    assert change_delta(update) == {
+        "collection": "targets", "op": "update", "id": "t1", "fields": {"connection_status": "connected"}, "removed": ["phone"],
+    }
+    assert change_delta({**update, "fullDocument": None}) is None
+    assert change_delta({"operationType": "delete", "ns": {"coll": "messages"}, "documentKey": {"_id": "oid"}}) == {
+        "collection": "messages", "op": "resync",
+    }
+    daily = {"operationType": "update", "ns": {"coll": "analytics_daily"}, "documentKey": {"_id": "2024-05-01"}}
+    assert change_delta(daily) == {"collection": "analytics", "op": "update", "day": "2024-05-01"}
+
+
+def test_record_merges_changes_to_the_same_document():
+    feed = LiveFeed(db=None)
+    feed.record({"collection": "targets", "op": "upsert", "id": "t1", "doc": {"id": "t1", "phone": "1", "status": "a"}})
+    feed.record({"collection": "targets", "op": "update", "id": "t1", "fields": {"status": "b"}, "removed": ["phone"]})
+    feed.record({"collection": "targets", "op": "update", "id": "t2", "fields": {"status": "b", "x": 1}, "removed": []})
+    feed.record({"collection": "targets", "op": "update", "id": "t2", "fields": {"status": "c"}, "removed": ["x"]})
+    feed.record({"collection": "messages", "op": "upsert", "id": "m1", "doc": {"id": "m1"}})
+    feed.record({"collection": "messages", "op": "resync"})
+    feed.record({"collection": "messages", "op": "upsert", "id": "m2", "doc": {"id": "m2"}})
+
+    pending = list(feed._pending.values())
+    assert pending == [
+        {"collection": "targets", "op": "upsert", "id": "t1", "doc": {"id": "t1", "status": "b"}},
+        {"collection": "targets", "op": "update", "id": "t2", "fields": {"status": "c"}, "removed": ["x"]},
+        {"collection": "messages", "op": "resync"},
+    ]
+
+
+def test_reconnecting_subscribers_get_missed_batches_or_a_resync():
+    async def scenario():
+        feed = LiveFeed(db=None, history=3, queue_size=2)
+        feed._ensure_running = lambda: None
+        first = feed.last_event_id
+        for i in range(5):
+            feed._publish([{"collection": "targets", "op": "upsert", "id": f"t{i}", "doc": {}}])
+
+        async def first_batch(last_event_id):
+            subscription = feed.subscribe(last_event_id)
+            batch = await subscription.__anext__()
+            await subscription.aclose()
+            return batch
+
+        replayed = await first_batch(first + 3)
+        too_old = await first_batch(first + 1)
+
+        slow = feed.subscribe()
+        waiting = asyncio.ensure_future(slow.__anext__())
+        await asyncio.sleep(0)
+        feed._publish([{"collection": "messages", "op": "upsert", "id": "m0", "doc": {}}])
+        await waiting
+        # Three more batches than the subscriber reads overflow its queue of two
+        for i in range(1, 4):
+            feed._publish([{"collection": "messages", "op": "upsert", "id": f"m{i}", "doc": {}}])
+        overflowed = await slow.__anext__()
+        await slow.aclose()
+        return first, replayed, too_old, overflowed, feed
+
+    first, replayed, too_old, overflowed, feed = asyncio.run(scenario())
+    assert replayed == (first + 4, [{"collection": "targets", "op": "upsert", "id": "t3", "doc": {}}])
+    assert too_old[0] == first + 5 and {delta["op"] for delta in too_old[1]} == {"resync"}
+    assert {delta["op"] for delta in overflowed[1]} == {"resync"}
+    assert feed.stats["resyncs"] == 1 and feed.stats["overflows"] == 1
+
+
+def test_polling_feed_streams_new_documents_and_analytics():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["live_test"]
+        feed = LiveFeed(db, mode="poll", poll_interval=0.02, flush_interval=0.02)
+        subscription = feed.subscribe(heartbeat=1)
+        received = asyncio.ensure_future(subscription.__anext__())
+        await asyncio.sleep(0.05)
+
+        now = datetime.utcnow()
+        target = {"id": "t1", "name": "Ada", "connection_status": "not_connected", "created_at": now, "updated_at": now}
+        message = {"id": "m1", "target_id": "t1", "status": "sent", "message_type": "connection_request", "created_at": now}
+        await db.targets.insert_one(dict(target))
+        await record_target_created(db, target)
+        await db.messages.insert_one(dict(message))
+        await record_messages_created(db, [message])
+
+        deltas = []
+        while not any(delta["collection"] == "messages" for delta in deltas):
+            _, batch = await asyncio.wait_for(received, 2)
+            deltas.extend(batch)
+            received = asyncio.ensure_future(subscription.__anext__())
+        received.cancel()
+        await subscription.aclose()
+        await feed.stop()
+        return deltas, now, feed
+
+    deltas, now, feed = asyncio.run(scenario())
+    by_collection = {delta["collection"]: delta for delta in deltas}
+    assert by_collection["targets"]["op"] == "upsert" and by_collection["targets"]["id"] == "t1"
+    assert by_collection["messages"]["doc"]["status"] == "sent"
+    fields = [delta for delta in deltas if delta["collection"] == "analytics"][-1]["fields"]
+    assert fields["total_targets"] == 1 and fields["messages_sent"] == 1
+    assert fields["daily_activity"] == {now.strftime("%Y-%m-%d"): 1}
+    assert feed.source is None and feed.snapshot()["subscribers"] == 0
+
+
+class FlakyDb:
+    """A database whose collections are held, so a test can patch their methods"""
+
+    def __init__(self, db, names):
+        self.collections = {name: db[name] for name in names}
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        return self.collections[name]
+
+
+def test_polling_survives_failing_reads_and_a_failed_source_ends_streams():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from pymongo.errors import AutoReconnect
+
+    async def scenario():
+        db = FlakyDb(mongomock_motor.AsyncMongoMockClient()["live_test"], ["targets", "analytics_counters", "analytics_daily"])
+        find = db.targets.find
+        failures = {"left": 3}
+
+        def flaky_find(*args, **kwargs):
+            if failures["left"]:
+                failures["left"] -= 1
+                raise AutoReconnect("primary stepped down")
+            return find(*args, **kwargs)
+
+        db.targets.find = flaky_find
+        feed = LiveFeed(db, collections=["targets"], mode="poll", poll_interval=0.01, flush_interval=0.01)
+        subscription = feed.subscribe(heartbeat=1)
+        received = asyncio.ensure_future(subscription.__anext__())
+        await asyncio.sleep(0.05)
+        now = datetime.utcnow()
+        await db.targets.insert_one({"id": "t1", "name": "Ada", "created_at": now, "updated_at": now})
+        _, batch = await asyncio.wait_for(received, 2)
+        survived = feed.source
+
+        # Anything other than a database error stops the source: the stream gets a resync, then ends
+        def broken_find(*args, **kwargs):
+            raise RuntimeError("boom")
+
+        db.targets.find = broken_find
+        rest = []
+        async for later in subscription:
+            rest.append(later)
+        return batch, survived, failures["left"], rest, feed
+
+    batch, survived, left, rest, feed = asyncio.run(scenario())
+    assert left == 0 and survived == "poll"
+    assert [(delta["op"], delta["id"]) for delta in batch if delta["collection"] == "targets"] == [("upsert", "t1")]
+    assert rest[-1][1] == [{"collection": "targets", "op": "resync"}, {"collection": "analytics", "op": "resync"}]
+    assert feed.source is None and feed.snapshot()["subscribers"] == 0
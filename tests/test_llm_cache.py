@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from llm_cache import LLMResponseCache
+
+
+class CountingGenerator:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"response {self.calls}"
+
+
+def test_key_depends_on_prompt_model_and_params():
+    key = LLMResponseCache.make_key("openai", "gpt-4.1", [{"role": "user", "content": "hi"}], temperature=0.7)
+    assert key == LLMResponseCache.make_key("openai", "gpt-4.1", [{"role": "user", "content": "hi"}], temperature=0.7)
+    assert key != LLMResponseCache.make_key("openai", "gpt-4.1", [{"role": "user", "content": "hi"}], temperature=0.8)
+    assert key != LLMResponseCache.make_key("openai", "gpt-4o", [{"role": "user", "content": "hi"}], temperature=0.7)
+    assert key != LLMResponseCache.make_key("ollama", "gpt-4.1", [{"role": "user", "content": "hi"}], temperature=0.7)
+
+
+def test_hits_bypass_and_refresh():
+    async def scenario():
+        cache = LLMResponseCache()
+        generate = CountingGenerator()
+        first = await cache.get_or_generate("k", generate)
+        second = await cache.get_or_generate("k", generate)
+        bypassed = await cache.get_or_generate("k", generate, use_cache=False)
+        refreshed = await cache.get_or_generate("k", generate, refresh=True)
+        after_refresh = await cache.get_or_generate("k", generate)
+        return cache, generate, [first, second, bypassed, refreshed, after_refresh]
+
+    cache, generate, results = asyncio.run(scenario())
+    assert results == ["response 1", "response 1", "response 2", "response 3", "response 3"]
+    assert generate.calls == 3
+    assert cache.stats["memory_hits"] == 2
+    assert cache.stats["bypassed"] == 1
+    assert cache.stats["refreshed"] == 1
+
+
+def test_lru_evicts_least_recently_used():
+    async def scenario():
+        cache = LLMResponseCache(max_entries=2)
+        for key in ("a", "b"):
+            await cache.set(key, key)
+        await cache.get("a")
+        await cache.set("c", "c")
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == ["a", None, "c"]
+
+
+def test_concurrent_misses_share_one_call():
+    async def scenario():
+        cache = LLMResponseCache()
+        generate = CountingGenerator(delay=0.05)
+        results = await asyncio.gather(*(cache.get_or_generate("k", generate) for _ in range(5)))
+        return cache, generate, results
+
+    cache, generate, results = asyncio.run(scenario())
+    assert generate.calls == 1
+    assert set(results) == {"response 1"}
+    assert cache.stats["coalesced"] == 4
+
+
+def test_mongo_tier_is_promoted_to_memory():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["test"]["llm_cache"]
+        writer = LLMResponseCache(collection)
+        await writer.set("k", "stored", provider="openai")
+        reader = LLMResponseCache(collection)
+        first = await reader.get("k")
+        second = await reader.get("k")
+        return reader, first, second
+
+    reader, first, second = asyncio.run(scenario())
+    assert first == second == "stored"
+    assert reader.stats["mongo_hits"] == 1
+    assert reader.stats["memory_hits"] == 1
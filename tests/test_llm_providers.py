@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+from fake_llm_server import start_fake_llm_server
+from llm_providers import OllamaProvider, OpenAIProvider
+
+
+def test_openai_provider_runs_generations_concurrently():
+    async def scenario():
+        runner, base_url = await start_fake_llm_server(latency=0.5, reply="  hello  ")
+        provider = OpenAIProvider(api_key="sk-test", base_url=f"{base_url}/v1", max_concurrency=10)
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(
+                provider.chat([{"role": "user", "content": "hi"}]) for _ in range(10)
+            ))
+            return results, time.perf_counter() - started
+        finally:
+            await provider.aclose()
+            await runner.cleanup()
+
+    results, elapsed = asyncio.run(scenario())
+    assert results == ["hello"] * 10
+    assert elapsed < 2.5
+
+
+def test_openai_provider_respects_concurrency_limit():
+    async def scenario():
+        runner, base_url = await start_fake_llm_server(latency=0.2)
+        provider = OpenAIProvider(api_key="sk-test", base_url=f"{base_url}/v1", max_concurrency=2)
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                provider.chat([{"role": "user", "content": "hi"}]) for _ in range(4)
+            ))
+            return time.perf_counter() - started
+        finally:
+            await provider.aclose()
+            await runner.cleanup()
+
+    assert asyncio.run(scenario()) >= 0.4
+
+
+def test_ollama_provider_reuses_one_session():
+    async def scenario():
+        runner, base_url = await start_fake_llm_server(latency=0.05, reply=" pooled ")
+        provider = OllamaProvider(base_url=base_url, model="llama3.2")
+        try:
+            first = await provider.generate("hi")
+            session = provider.session
+            results = await asyncio.gather(*(provider.generate("hi") for _ in range(5)))
+            return first, results, session is provider.session
+        finally:
+            await provider.aclose()
+            await runner.cleanup()
+
+    first, results, same_session = asyncio.run(scenario())
+    assert first == "pooled"
+    assert results == ["pooled"] * 5
+    assert same_session
+
+
+def test_streaming_yields_first_token_before_completion():
+    reply = "one two three four five six seven eight nine ten"
+
+    async def first_token_and_text(stream):
+        started = time.perf_counter()
+        first_token_at, parts = None, []
+        async for fragment in stream:
+            first_token_at = first_token_at or time.perf_counter() - started
+            parts.append(fragment)
+        return first_token_at, "".join(parts)
+
+    async def scenario():
+        runner, base_url = await start_fake_llm_server(latency=1.0, reply=reply)
+        ollama = OllamaProvider(base_url=base_url)
+        openai = OpenAIProvider(api_key="sk-test", base_url=f"{base_url}/v1")
+        try:
+            return (
+                await first_token_and_text(ollama.stream("hi")),
+                await first_token_and_text(openai.stream_chat([{"role": "user", "content": "hi"}])),
+            )
+        finally:
+            await ollama.aclose()
+            await openai.aclose()
+            await runner.cleanup()
+
+    for first_token_at, text in asyncio.run(scenario()):
+        assert text == reply
+        assert first_token_at < 0.5
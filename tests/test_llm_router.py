@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from llm_router import AllBackendsFailed, LLMRouter, percentile
+
+
+class MockBackends:
+    """Fake LLM backends with a fixed latency each; names in ``failing`` raise"""
+
+    def __init__(self, latencies, failing=()):
+        self.latencies = dict(latencies)
+        self.failing = set(failing)
+        self.calls = []
+        self.cancelled = []
+
+    async def __call__(self, backend):
+        self.calls.append(backend)
+        try:
+            await asyncio.sleep(self.latencies[backend])
+        except asyncio.CancelledError:
+            self.cancelled.append(backend)
+            raise
+        if backend in self.failing:
+            raise RuntimeError(f"{backend} is down")
+        return backend
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile([], 95) is None
+
+
+def test_auto_routing_prefers_the_fastest_measured_backend():
+    backends = MockBackends({"slow:a": 0.05, "fast:b": 0.01})
+    router = LLMRouter()
+
+    async def scenario():
+        # Unmeasured backends are tried first, so both get sampled
+        first = [await router.call(["slow:a", "fast:b"], backends) for _ in range(2)]
+        later = [await router.call(["slow:a", "fast:b"], backends) for _ in range(5)]
+        return first, later
+
+    first, later = asyncio.run(scenario())
+    assert first == ["slow:a", "fast:b"]
+    assert later == ["fast:b"] * 5
+    snapshot = router.snapshot()["backends"]
+    assert snapshot["fast:b"]["p95_seconds"] < snapshot["slow:a"]["p95_seconds"]
+
+
+def test_pinned_backend_fails_over_and_opens_circuit():
+    backends = MockBackends({"openai:x": 0.0, "ollama:y": 0.0}, failing={"openai:x"})
+    router = LLMRouter(failure_threshold=2, cooldown=60)
+
+    async def scenario():
+        return [
+            await router.call(["openai:x", "ollama:y"], backends, preferred="openai:x")
+            for _ in range(4)
+        ]
+
+    assert asyncio.run(scenario()) == ["ollama:y"] * 4
+    # After two consecutive failures the circuit is open and openai is skipped
+    assert backends.calls.count("openai:x") == 2
+    assert router.counters["failovers"] == 2
+    assert router.snapshot()["backends"]["openai:x"]["healthy"] is False
+
+
+def test_timeout_counts_as_failure():
+    backends = MockBackends({"hung:a": 1.0, "ok:b": 0.0})
+    router = LLMRouter(timeout=0.05)
+
+    result = asyncio.run(router.call(["hung:a", "ok:b"], backends, preferred="hung:a"))
+    assert result == "ok:b"
+    assert router.stats("hung:a").error_rate == 1.0
+
+
+def test_hedged_request_wins_and_cancels_the_slow_one():
+    backends = MockBackends({"slow:a": 0.5, "fast:b": 0.02})
+    router = LLMRouter(hedge_after=0.05)
+
+    async def scenario():
+        result = await router.call(["slow:a", "fast:b"], backends, preferred="slow:a")
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == "fast:b"
+    assert backends.cancelled == ["slow:a"]
+    assert router.counters["hedges"] == 1
+    assert router.counters["hedge_wins"] == 1
+    # The cancelled loser is neither a success nor a failure
+    assert router.stats("slow:a").calls == 0
+
+
+def test_all_backends_failing_raises_with_every_error():
+    backends = MockBackends({"a:1": 0.0, "b:2": 0.0}, failing={"a:1", "b:2"})
+    router = LLMRouter()
+
+    with pytest.raises(AllBackendsFailed) as excinfo:
+        asyncio.run(router.call(["a:1", "b:2"], backends))
+    assert [backend for backend, _ in excinfo.value.errors] == ["a:1", "b:2"]
@@ -0,0 +1,146 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from fastapi import APIRouter, FastAPI, HTTPException
+
+from fake_llm_server import start_fake_llm_server
+from llm_providers import OllamaProvider, OpenAIProvider
+from metrics import (
+    HTTP_DURATION,
+    HTTP_EXCEPTIONS,
+    HTTP_REQUESTS,
+    LLM_COST,
+    LLM_REQUESTS,
+    LLM_TOKENS,
+    MONGO_OPERATIONS,
+    MetricsMiddleware,
+    MongoCommandListener,
+    Registry,
+    RequestTimings,
+    TimedRoute,
+    request_timings,
+)
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    for seconds in (0.05, 0.5, 3.0):
+        latency.observe(seconds, route="/a")
+    registry.collector(lambda: [("entries", "gauge", "Entries", [({}, 7)])])
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/a\\"b"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{route="/a"} 3.55' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+    assert "# TYPE entries gauge" in lines and "entries 7" in lines
+
+
+def test_middleware_labels_routes_and_adds_server_timing_on_request():
+    router = APIRouter(route_class=TimedRoute)
+
+    @router.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        if item_id == "missing":
+            raise HTTPException(status_code=404)
+        await asyncio.sleep(0.01)
+        return {"id": item_id}
+
+    @router.get("/boom")
+    async def boom():
+        raise ValueError("boom")
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(MetricsMiddleware)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            plain = await client.get("/items/1")
+            timed = await client.get("/items/2", headers={"X-Server-Timing": "1"})
+            await client.get("/items/missing")
+            await client.get("/boom")
+            await client.get("/nowhere")
+        return plain, timed
+
+    before = HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="200")
+    plain, timed = asyncio.run(scenario())
+
+    assert "server-timing" not in plain.headers
+    phases = dict(entry.split(";", 1) for entry in timed.headers["server-timing"].split(", "))
+    assert set(phases) == {"handler", "app", "total"}
+    assert float(phases["handler"].split("=")[1]) >= 10
+    assert HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="200") == before + 2
+    assert HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="404") >= 1
+    assert HTTP_REQUESTS.value(method="GET", route="unmatched", status="404") >= 1
+    assert HTTP_EXCEPTIONS.value(route="/boom", exception="ValueError") >= 1
+    assert HTTP_DURATION.count(method="GET", route="/boom") >= 1
+
+
+def test_mongo_listener_counts_commands_per_collection():
+    listener = MongoCommandListener()
+
+    def event(request_id, command_name, command, duration_micros=0):
+        return SimpleNamespace(
+            connection_id=("localhost", 27017), request_id=request_id,
+            command_name=command_name, command=command, duration_micros=duration_micros,
+        )
+
+    before = MONGO_OPERATIONS.value(collection="targets", command="find", outcome="ok")
+    timings = RequestTimings()
+    token = request_timings.set(timings)
+    try:
+        listener.started(event(1, "find", {"find": "targets", "filter": {}}))
+        listener.started(event(2, "getMore", {"getMore": 123, "collection": "targets"}))
+        listener.started(event(3, "hello", {"hello": 1}))
+        listener.succeeded(event(1, "find", {}, 2000))
+        listener.failed(event(2, "getMore", {}, 500))
+        listener.succeeded(event(3, "hello", {}, 100))
+    finally:
+        request_timings.reset(token)
+
+    assert MONGO_OPERATIONS.value(collection="targets", command="find", outcome="ok") == before + 1
+    assert MONGO_OPERATIONS.value(collection="targets", command="getMore", outcome="error") >= 1
+    assert MONGO_OPERATIONS.value(collection="-", command="hello", outcome="ok") == 0
+    seconds, calls = timings.phases["mongo"]
+    assert calls == 2 and abs(seconds - 0.0025) < 1e-9
+
+
+def test_providers_record_tokens_and_cost():
+    async def scenario():
+        runner, base_url = await start_fake_llm_server(latency=0.05, reply="hello there")
+        openai = OpenAIProvider(api_key="sk-test", base_url=f"{base_url}/v1")
+        ollama = OllamaProvider(base_url=base_url, model="llama3.1")
+        try:
+            await openai.chat([{"role": "user", "content": "hi"}], model="gpt-4.1")
+            [part async for part in openai.stream_chat([{"role": "user", "content": "hi"}], model="gpt-4.1")]
+            await ollama.generate("hi")
+            [part async for part in ollama.stream("hi")]
+        finally:
+            await openai.aclose()
+            await ollama.aclose()
+            await runner.cleanup()
+
+    before = {
+        "requests": LLM_REQUESTS.value(provider="openai", model="gpt-4.1", outcome="ok"),
+        "prompt": LLM_TOKENS.value(provider="openai", model="gpt-4.1", kind="prompt"),
+        "cost": LLM_COST.value(provider="openai", model="gpt-4.1"),
+        "ollama": LLM_TOKENS.value(provider="ollama", model="llama3.1", kind="completion"),
+    }
+    asyncio.run(scenario())
+
+    assert LLM_REQUESTS.value(provider="openai", model="gpt-4.1", outcome="ok") == before["requests"] + 2
+    # The fake server reports 50 prompt and 20 completion tokens per call
+    assert LLM_TOKENS.value(provider="openai", model="gpt-4.1", kind="prompt") == before["prompt"] + 100
+    assert abs(LLM_COST.value(provider="openai", model="gpt-4.1") - before["cost"] - 2 * (50 * 2 + 20 * 8) / 1e6) < 1e-12
+    assert LLM_TOKENS.value(provider="ollama", model="llama3.1", kind="completion") == before["ollama"] + 40
+    assert LLM_COST.value(provider="ollama", model="llama3.1") == 0
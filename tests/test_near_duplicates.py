@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from near_duplicates import NearDuplicateIndex, build_index, choose_bands, generate_distinct
+
+MESSAGE = (
+    "Hi John, I came across your work on retrieval systems at Acme AI and was impressed by your talk "
+    "on evaluation. I'd love to connect and swap notes on shipping LLM products."
+)
+UNRELATED = "Congrats on the Series B! Curious how the data platform team is planning to scale hiring in Berlin."
+
+
+def random_texts(count, words=40, seed=0):
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"word{i}" for i in range(20000)])
+    return [" ".join(vocab[row]) for row in rng.integers(0, len(vocab), (count, words))]
+
+
+def test_choose_bands_keeps_recall_at_threshold():
+    bands, rows = choose_bands(64, 0.7)
+    assert bands * rows <= 64
+    assert 1 - (1 - 0.7 ** rows) ** bands >= 0.95
+
+
+def test_finds_near_copies_but_not_unrelated_text():
+    index = NearDuplicateIndex()
+    index.add("original", MESSAGE)
+
+    match = index.find(MESSAGE.replace("John", "Priya"))
+    assert match is not None and match[0] == "original" and match[1] >= 0.7
+    assert index.find(UNRELATED) is None
+    assert index.find("") is None
+
+
+def test_batch_signatures_match_single_ones():
+    index = NearDuplicateIndex()
+    texts = [MESSAGE, "", "two words", UNRELATED] + random_texts(3000)
+    batch = index.signatures_for(texts)
+    for i in (0, 1, 2, 3, 2500):
+        assert np.array_equal(batch[i], index.signature(texts[i]))
+
+
+def test_incremental_and_bulk_adds_are_both_searchable():
+    index = NearDuplicateIndex()
+    texts = random_texts(5000)
+    index.add_many([f"bulk-{i}" for i in range(4000)], index.signatures_for(texts[:4000]))
+    for i in range(4000, 5000):
+        index.add(f"one-{i}", texts[i])
+
+    assert len(index) == 5000
+    assert index.find(texts[10] + " extra")[0] == "bulk-10"
+    assert index.find(texts[4500])[0] == "one-4500"
+
+
+def test_check_records_the_draft_and_counts_duplicates():
+    index = NearDuplicateIndex()
+    assert index.check("a", MESSAGE) is None
+    assert index.check("b", MESSAGE)[0] == "a"
+    assert len(index) == 2
+    assert index.stats == {"checked": 2, "duplicates": 1, "regenerated": 0}
+
+
+def test_generate_distinct_regenerates_duplicates():
+    index = NearDuplicateIndex()
+    index.add("sent", MESSAGE)
+    drafts = iter([MESSAGE, MESSAGE.replace("John", "Sam"), UNRELATED])
+
+    async def generate(attempt):
+        return next(drafts)
+
+    content, match = asyncio.run(generate_distinct(index, "new", generate, retries=2))
+    assert (content, match) == (UNRELATED, None)
+    assert index.stats["regenerated"] == 2
+
+    content, match = asyncio.run(generate_distinct(index, "again", lambda attempt: asyncio.sleep(0, MESSAGE), retries=0))
+    assert match[0] == "sent"
+
+
+def test_build_index_loads_collection():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["messages"]
+    index = NearDuplicateIndex()
+
+    async def scenario():
+        await collection.insert_many([{"id": f"m{i}", "content": text} for i, text in enumerate(random_texts(30))])
+        await collection.insert_one({"id": "empty", "content": ""})
+        return await build_index(collection, index, batch_size=7)
+
+    assert asyncio.run(scenario()) == 31
+    assert len(index) == 30
+    assert index.find(random_texts(30)[12])[0] == "m12"
+
+
+def test_lookup_stays_under_a_millisecond():
+    index = NearDuplicateIndex()
+    texts = random_texts(50000)
+    index.add_many([str(i) for i in range(len(texts))], index.signatures_for(texts))
+    signatures = index.signatures_for(texts[:200])
+
+    started = time.perf_counter()
+    for signature in signatures:
+        index.find(signature=signature)
+    assert (time.perf_counter() - started) / len(signatures) < 0.001
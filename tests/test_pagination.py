@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from pagination import build_projection, decode_cursor, encode_cursor, fetch_page
+
+
+def test_cursor_round_trip():
+    doc = {"id": "abc", "created_at": datetime(2024, 3, 10, 12, 30, 0, 123000)}
+    assert decode_cursor(encode_cursor(doc, "created_at")) == (doc["created_at"], "abc")
+
+
+def test_malformed_cursor_raises_value_error():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_projection_always_keeps_cursor_fields():
+    assert build_projection(None, "created_at") == {"_id": 0}
+    assert build_projection("name, company,$where", "created_at") == {
+        "_id": 0, "name": 1, "company": 1, "id": 1, "created_at": 1,
+    }
+    assert build_projection("_id,name,_id.x", "created_at") == {"_id": 0, "name": 1, "id": 1, "created_at": 1}
+
+
+def test_fetch_page_walks_ties_in_created_at_without_gaps():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["test"]["targets"]
+        same_time = datetime(2024, 3, 10)
+        await collection.insert_many([
+            {"id": f"{i:02d}", "created_at": same_time if i < 5 else datetime(2024, 3, 11), "company": "Acme" if i % 2 else "Other"}
+            for i in range(9)
+        ])
+        seen, cursor = [], None
+        while True:
+            docs, cursor, total = await fetch_page(collection, {}, "created_at", limit=2, cursor=cursor, include_total=True)
+            seen.extend(doc["id"] for doc in docs)
+            if cursor is None:
+                return seen, total, await fetch_page(collection, {"company": "Acme"}, "created_at", limit=10)
+
+    seen, total, (filtered, next_cursor, _) = asyncio.run(scenario())
+    assert seen == [f"{i:02d}" for i in range(9)]
+    assert total == 9
+    assert [doc["id"] for doc in filtered] == ["01", "03", "05", "07"]
+    assert next_cursor is None
@@ -0,0 +1,143 @@
+import asyncio
+import io
+import json
+import zipfile
+from datetime import datetime
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel, Field
+
+from engagement import EngagementRanker
+from post_ingest import canonical_url, ingest_posts, iter_sources, iter_upload, parse_count, parse_post_html
+
+PUBLIC_PAGE = """<html><head>
+<link rel="canonical" href="https://www.linkedin.com/posts/jane-doe_evals-activity-1">
+<meta property="og:title" content="Jane Doe on LinkedIn: Shipping our eval harness">
+<script type="application/ld+json">{"@context": "http://schema.org", "@type": "SocialMediaPosting",
+ "url": "https://www.linkedin.com/posts/jane-doe_evals-activity-1?trk=public_post",
+ "author": {"@type": "Person", "name": "Jane Doe"}, "articleBody": "Shipping our eval harness\\ntook 3 tries.",
+ "interactionStatistic": [
+  {"@type": "InteractionCounter", "interactionType": "http://schema.org/LikeAction", "userInteractionCount": 1234},
+  {"@type": "InteractionCounter", "interactionType": {"@type": "CommentAction"}, "userInteractionCount": 56}]}
+</script></head><body></body></html>"""
+
+FEED_PAGE = """<html><head><meta property="og:description" content="fallback text"></head><body>
+<div data-urn="urn:li:activity:7000">
+ <span class="update-components-actor__name"><span aria-hidden="true">Raj  Patel</span><span>View profile</span></span>
+ <div class="update-components-text"><span>Vector search at scale<br>Lessons learned</span></div>
+ <span class="social-details-social-counts__reactions-count">2.3K</span>
+ <button aria-label="87 comments on Raj Patel's post">87 comments</button>
+ <button aria-label="12 reposts of Raj Patel's post">12 reposts</button>
+</div></body></html>"""
+
+
+class Post(BaseModel):
+    id: str = "new"
+    original_content: str
+    author: str
+    engagement_score: Optional[int] = None
+    reactions: int
+    comments: int
+    shares: int
+    linkedin_url: str
+    scraped_at: datetime
+    hot_score: Optional[float] = None
+
+
+def test_parse_counts_and_urls():
+    assert [parse_count(text) for text in ("1,234 reactions", "2.3K", "1M", "87", "", None, 5)] == [1234, 2300, 1000000, 87, None, None, 5]
+    assert canonical_url("https://WWW.linkedin.com/posts/a-activity-1/?utm_source=share#c") == "https://www.linkedin.com/posts/a-activity-1"
+    assert canonical_url("not a url") is None
+
+
+def test_parse_post_html_prefers_structured_data_then_markup():
+    public = parse_post_html(PUBLIC_PAGE.encode())
+    assert public == {
+        "author": "Jane Doe",
+        "original_content": "Shipping our eval harness\ntook 3 tries.",
+        "linkedin_url": "https://www.linkedin.com/posts/jane-doe_evals-activity-1?trk=public_post",
+        "reactions": 1234,
+        "comments": 56,
+    }
+
+    feed = parse_post_html(FEED_PAGE.encode())
+    assert feed == {
+        "author": "Raj Patel",
+        "original_content": "Vector search at scale\nLessons learned",
+        "linkedin_url": "https://www.linkedin.com/feed/update/urn:li:activity:7000",
+        "reactions": 2300,
+        "comments": 87,
+        "shares": 12,
+    }
+
+
+def test_ingest_upserts_posts_from_files_and_archives(tmp_path):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    (tmp_path / "public.html").write_text(PUBLIC_PAGE)
+    (tmp_path / "page_files").mkdir()
+    (tmp_path / "page_files" / "logo.png").write_bytes(b"\x89PNG")
+    (tmp_path / "export.jsonl").write_text("\n".join([
+        json.dumps({"text": "Agents in production", "author": {"name": "Li Wei"}, "numLikes": 10, "numComments": 2,
+                    "numShares": 1, "url": "https://www.linkedin.com/posts/li-wei-activity-2/"}),
+        json.dumps({"text": "No author or counts", "url": "https://www.linkedin.com/posts/x-activity-3"}),
+        "{not json",
+    ]))
+    with zipfile.ZipFile(tmp_path / "scrape.zip", "w") as archive:
+        archive.writestr("posts/feed.html", FEED_PAGE)
+        # The same post as public.html, saved again with newer counts
+        archive.writestr("posts/again.json", json.dumps([{
+            "content": "Shipping our eval harness", "author": "Jane Doe", "reactions": "1.5K", "comments": 60, "shares": 4,
+            "linkedin_url": "https://www.linkedin.com/posts/jane-doe_evals-activity-1", "scraped_at": "2024-05-02T10:00:00",
+        }]))
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["ingest_test"].viral_posts
+        ranker = EngagementRanker()
+        first = await ingest_posts(collection, iter_sources([tmp_path]), Post, ranker, workers=0, batch_size=2)
+        stored = {post["linkedin_url"]: post for post in await collection.find({}, {"_id": 0}).to_list(None)}
+        again = await ingest_posts(collection, iter_sources([tmp_path / "scrape.zip"]), Post, ranker, workers=2)
+        return first, stored, again, await collection.count_documents({})
+
+    first, stored, again, count = asyncio.run(scenario())
+    assert (first["documents"], first["posts"], first["inserted"], first["duplicates"], first["failed"]) == (4, 6, 3, 1, 2)
+    assert {error["source"].rsplit("/", 1)[-1] for error in first["errors"]} == {"export.jsonl:2", "export.jsonl:3"}
+    jane = stored["https://www.linkedin.com/posts/jane-doe_evals-activity-1"]
+    # Archive members are read after the plain files, so the re-saved copy wins
+    assert (jane["reactions"], jane["comments"], jane["shares"]) == (1500, 60, 4)
+    assert jane["scraped_at"] == datetime(2024, 5, 2, 10) and jane["hot_score"] > 0
+    assert jane["engagement_score"] == round(EngagementRanker().weighted(jane))
+    assert stored["https://www.linkedin.com/posts/li-wei-activity-2"]["author"] == "Li Wei"
+    assert (again["inserted"], again["updated"], again["failed"]) == (0, 2, 0) and count == 3
+
+
+class UploadedPost(Post):
+    scraped_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+def test_reingesting_keeps_a_defaulted_scraped_at():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    def upload(reactions, **fields):
+        row = {"content": "Evals", "author": "Jane Doe", "reactions": reactions, "comments": 1, "shares": 0, **fields}
+        return iter_upload("posts.json", io.BytesIO(json.dumps([
+            {**row, "linkedin_url": "https://www.linkedin.com/posts/undated-activity-1"},
+            {**row, "linkedin_url": "https://www.linkedin.com/posts/dated-activity-2", "scraped_at": fields.get("at", "2024-05-02T10:00:00")},
+        ]).encode()))
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["ingest_test"].viral_posts
+        ranker = EngagementRanker()
+        await ingest_posts(collection, upload(10), UploadedPost, ranker, workers=0)
+        first = {post["linkedin_url"]: post for post in await collection.find({}, {"_id": 0}).to_list(None)}
+        again = await ingest_posts(collection, upload(20, at="2024-06-01T00:00:00"), UploadedPost, ranker, workers=0)
+        second = {post["linkedin_url"]: post for post in await collection.find({}, {"_id": 0}).to_list(None)}
+        return first, again, second
+
+    first, again, second = asyncio.run(scenario())
+    undated, dated = "https://www.linkedin.com/posts/undated-activity-1", "https://www.linkedin.com/posts/dated-activity-2"
+    assert (again["inserted"], again["updated"]) == (0, 2)
+    assert second[undated]["reactions"] == 20 and second[undated]["scraped_at"] == first[undated]["scraped_at"]
+    assert second[undated]["id"] == first[undated]["id"]
+    assert second[dated]["scraped_at"] == datetime(2024, 6, 1)
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+from prompt_batching import PromptBatcher, parse_batch_response
+
+
+def test_parse_batch_response_tolerates_fences_and_drops_bad_entries():
+    text = "Sure! Here you go:\n```json\n" + json.dumps({"messages": [
+        {"target_id": "a", "content": " Hi A "},
+        {"target_id": "a", "content": "duplicate"},
+        {"target_id": "b", "content": ""},
+        {"target_id": "zzz", "content": "unknown target"},
+        "not an object",
+    ]}) + "\n```"
+
+    assert parse_batch_response(text, ["a", "b"]) == {"a": "Hi A"}
+    assert parse_batch_response('[{"target_id": "b", "content": "Hi B"}]', ["a", "b"]) == {"b": "Hi B"}
+    assert parse_batch_response("I cannot help with that.", ["a"]) == {}
+    assert parse_batch_response('{"messages": [', ["a"]) == {}
+
+
+def test_batcher_groups_targets_and_falls_back_for_missing_rows():
+    batch_calls, single_calls = [], []
+
+    async def generate_batch(targets):
+        batch_calls.append([t["id"] for t in targets])
+        # The model "forgets" every third target
+        return json.dumps({"messages": [
+            {"target_id": t["id"], "content": f"batched {t['id']}"} for t in targets if int(t["id"]) % 3
+        ]})
+
+    async def generate_single(target):
+        single_calls.append(target["id"])
+        return f"single {target['id']}"
+
+    async def scenario():
+        batcher = PromptBatcher(generate_batch, generate_single, batch_size=4, linger=0.01)
+        results = await asyncio.gather(*(batcher.generate({"id": str(i)}) for i in range(10)))
+        return batcher, results
+
+    batcher, results = asyncio.run(scenario())
+    assert [len(call) for call in batch_calls] == [4, 4, 2]
+    assert sorted(single_calls, key=int) == ["0", "3", "6", "9"]
+    assert results[1] == "batched 1" and results[3] == "single 3"
+    assert batcher.stats == {"batches": 3, "batched_rows": 6, "fallback_rows": 4, "failed_batches": 0}
+
+
+def test_failed_batch_falls_back_to_singles_and_surfaces_single_errors():
+    async def generate_batch(targets):
+        raise RuntimeError("context length exceeded")
+
+    async def generate_single(target):
+        if target["id"] == "bad":
+            raise ValueError("provider down")
+        return "ok"
+
+    async def scenario():
+        batcher = PromptBatcher(generate_batch, generate_single, batch_size=2)
+        return batcher, await asyncio.gather(
+            batcher.generate({"id": "good"}), batcher.generate({"id": "bad"}), return_exceptions=True
+        )
+
+    batcher, (good, bad) = asyncio.run(scenario())
+    assert good == "ok"
+    assert isinstance(bad, ValueError)
+    assert batcher.stats["failed_batches"] == 1
@@ -0,0 +1,84 @@
+from collections import Counter
+
+import pytest
+
+from prompts import (
+    MESSAGE_TEMPLATES,
+    CompiledTemplate,
+    choose_version,
+    count_tokens,
+    fit_to_budget,
+    message_template,
+    parse_version_weights,
+    post_template,
+    truncate_to_tokens,
+)
+
+
+def test_compiled_template_renders_fields_and_escaped_braces():
+    template = CompiledTemplate('Hi {name}, reply as {{"ok": true}}')
+    assert template.fields == {"name"}
+    assert template.render({"name": "Ada"}) == 'Hi Ada, reply as {"ok": true}'
+
+
+def test_v1_message_prompt_matches_the_original_inline_prompt():
+    profile = {"name": "Ada", "title": "CTO", "company": "Acme", "profile_summary": None}
+    system, user = message_template("follow_up", "v1").render(profile, "follow_up")
+
+    assert system.startswith("You are an expert at writing personalized LinkedIn follow_up messages.\n        \n")
+    assert "        Name: Ada\n        Title: CTO\n" in user
+    # v1 keeps dict.get semantics, so an explicit None renders as before
+    assert "Profile Summary: None\n" in user
+    assert "Recent Activity: No recent activity\n" in user
+
+
+def test_v2_budgets_long_profile_fields():
+    profile = {"name": "Ada", "profile_summary": "Ships ML platforms at scale. " * 200}
+    _, user = message_template("connection_request", "v2").render(profile, "connection_request")
+    _, legacy_user = message_template("connection_request", "v1").render(profile, "connection_request")
+
+    assert count_tokens(user) < 200 < count_tokens(legacy_user)
+    assert "…" in user
+    assert "Summary: Ships ML platforms" in user
+
+
+def test_unknown_message_type_uses_the_versions_default_template():
+    template = message_template("viral_post", "v2")
+    assert template is MESSAGE_TEMPLATES["v2"]["*"]
+    with pytest.raises(ValueError):
+        message_template("follow_up", "v0")
+
+
+def test_truncate_and_fit_to_budget():
+    text = "alpha beta gamma delta " * 50
+    cut = truncate_to_tokens(text, 20)
+    assert count_tokens(cut) <= 20 and cut.endswith("…")
+    assert truncate_to_tokens("short", 20) == "short"
+
+    short, long_a, long_b = "tiny post", "long " * 400, "longer " * 600
+    fitted = fit_to_budget([short, long_a, long_b], 100)
+    assert fitted[0] == short
+    assert sum(count_tokens(text) for text in fitted) <= 100
+
+
+def test_post_prompt_uses_original_content_with_budgeted_excerpts():
+    posts = [{"original_content": f"Post body {i} " * 200, "engagement_score": 100 - i} for i in range(5)]
+    _, legacy_user = post_template("v1").render(posts)
+    _, user = post_template("v2").render(posts, topic="LLM evaluation")
+
+    assert "Post 1: Post body 0" in legacy_user
+    assert "[1] (100 engagement) Post body 0" in user
+    assert "LLM evaluation" in user
+    assert count_tokens(user) < 400
+
+
+def test_version_split_is_deterministic_and_weighted():
+    weights = parse_version_weights("v1:20,v2:80", MESSAGE_TEMPLATES)
+    assert weights == [("v1", 20.0), ("v2", 80.0)]
+    assert choose_version(weights, "target-42") == choose_version(weights, "target-42")
+
+    arms = Counter(choose_version(weights, f"target-{i}") for i in range(2000))
+    assert 300 < arms["v1"] < 500
+    assert parse_version_weights("v2", MESSAGE_TEMPLATES) == [("v2", 1.0)]
+    with pytest.raises(ValueError):
+        parse_version_weights("v7:100", MESSAGE_TEMPLATES)
@@ -0,0 +1,159 @@
+import asyncio
+import math
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from scheduler import TargetScorer, activity_age_days, parse_quotas, plan_day, rebuild_queue
+
+NOW = datetime(2024, 6, 1)
+TODAY = date(2024, 6, 1)
+
+
+def target(target_id, title="Engineer", company="Acme", activity=None, status="not_connected", account=None):
+    return {
+        "id": target_id, "title": title, "company": company, "recent_activity": activity,
+        "connection_status": status, "account": account, "updated_at": NOW - timedelta(days=30),
+    }
+
+
+def test_activity_age_from_relative_phrases():
+    assert activity_age_days("Posted about RAG 3 days ago", None, NOW) == 3
+    assert activity_age_days("Shared a paper a week ago", None, NOW) == 7
+    assert activity_age_days("Commented yesterday", None, NOW) == 1
+    assert activity_age_days("Published a paper on transformers", NOW - timedelta(days=5), NOW) == 5
+    assert math.isnan(activity_age_days("", NOW, NOW))
+    assert parse_quotas("alice:80, bob:40") == {"alice": 80, "bob": 40}
+
+
+def test_scores_favour_titles_recent_activity_and_replying_companies():
+    scorer = TargetScorer(companies=["globex"])
+    targets = [
+        target("plain"),
+        target("senior", title="Head of ML"),
+        target("active", activity="posted 2 days ago"),
+        target("company", company="Globex"),
+        target("replies", company="Initech"),
+        target("connected", status="connected"),
+    ]
+    scores = dict(zip([t["id"] for t in targets], scorer.score(targets, {"initech": (10, 6), "acme": (10, 0)}, NOW)))
+    for better in ("senior", "active", "company", "replies"):
+        assert scores[better] > scores["plain"]
+    assert scores["connected"] < scores["plain"]
+
+
+def make_db():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["scheduler_test"]
+
+
+def test_rebuild_queue_writes_only_changes_and_drops_uncontactable_targets():
+    db = make_db()
+
+    async def scenario():
+        await db.targets.insert_many([target(f"t{i}") for i in range(5)] + [target("pending", status="pending")])
+        first = await rebuild_queue(db, TargetScorer(), TODAY, batch_size=2)
+        second = await rebuild_queue(db, TargetScorer(), TODAY, batch_size=2)
+        await db.targets.update_one({"id": "t0"}, {"$set": {"connection_status": "pending"}})
+        await db.targets.update_one({"id": "t1"}, {"$set": {"title": "CTO"}})
+        third = await rebuild_queue(db, TargetScorer(), TODAY, batch_size=2)
+        queued = [entry["target_id"] async for entry in db.outreach_queue.find().sort("priority", -1)]
+        return first, second, third, queued
+
+    first, second, third, queued = asyncio.run(scenario())
+    assert first == {"scored": 5, "updated": 5, "removed": 0}
+    assert second == {"scored": 5, "updated": 0, "removed": 0}
+    assert third == {"scored": 4, "updated": 1, "removed": 1}
+    assert queued[0] == "t1" and "t0" not in queued and "pending" not in queued
+
+
+def test_plan_day_respects_global_and_account_quotas():
+    db = make_db()
+    targets = [target(f"free{i}", title="CTO") for i in range(6)] + [target(f"bob{i}", account="bob") for i in range(4)]
+
+    async def scenario():
+        await db.targets.insert_many(targets)
+        await rebuild_queue(db, TargetScorer(), TODAY)
+        monday = await plan_day(db, TODAY, daily_quota=6, account_quotas={"alice": 3, "bob": 4})
+        again = await plan_day(db, TODAY, daily_quota=6, account_quotas={"alice": 3, "bob": 4})
+        tuesday = await plan_day(db, TODAY + timedelta(days=1), daily_quota=6, account_quotas={"alice": 3, "bob": 4})
+        replanned = await plan_day(db, TODAY, daily_quota=2, account_quotas={"alice": 3, "bob": 4}, replan=True)
+        return monday, again, tuesday, replanned
+
+    monday, again, tuesday, replanned = asyncio.run(scenario())
+    assert monday["total"] == 6 and monday["accounts"] == {"alice": 3, "bob": 3}
+    # The high-priority unpinned targets come first, spread over whichever account has quota left
+    assert all(item["target_id"].startswith("free") for item in monday["items"])
+    assert [item["target_id"] for item in again["items"]] == [item["target_id"] for item in monday["items"]]
+    assert not {item["target_id"] for item in tuesday["items"]} & {item["target_id"] for item in monday["items"]}
+    assert tuesday["total"] == 4
+    assert replanned["total"] == 2
+
+
+def test_concurrent_plans_never_share_a_target():
+    db = make_db()
+    targets = [target(f"free{i}", title="CTO") for i in range(8)]
+
+    async def scenario():
+        await db.targets.insert_many(targets)
+        await rebuild_queue(db, TargetScorer(), TODAY)
+        queue = db.outreach_queue
+        update_many = queue.update_many
+
+        async def slow_update_many(*args, **kwargs):
+            # Let the other plan read the queue before this one claims anything
+            await asyncio.sleep(0.01)
+            return await update_many(*args, **kwargs)
+
+        queue.update_many = slow_update_many
+        racing_db = SimpleNamespace(outreach_queue=queue, send_plans=db.send_plans)
+        return await asyncio.gather(*(
+            plan_day(racing_db, TODAY + timedelta(days=offset), daily_quota=5, account_quotas={"alice": 5}) for offset in (0, 1)
+        ))
+
+    first, second = asyncio.run(scenario())
+    first_ids = {item["target_id"] for item in first["items"]}
+    second_ids = {item["target_id"] for item in second["items"]}
+    assert not first_ids & second_ids
+    assert len(first_ids | second_ids) == 8 and first["total"] + second["total"] == 8
+
+
+def test_concurrent_plans_for_one_day_store_one_plan():
+    db = make_db()
+    targets = [target(f"free{i}", title="CTO") for i in range(8)]
+
+    async def scenario():
+        await db.targets.insert_many(targets)
+        await rebuild_queue(db, TargetScorer(), TODAY)
+        plans = db.send_plans
+        update_one, replace_one = plans.update_one, plans.replace_one
+
+        async def slow_update_one(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return await update_one(*args, **kwargs)
+
+        async def slow_replace_one(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return await replace_one(*args, **kwargs)
+
+        plans.update_one, plans.replace_one = slow_update_one, slow_replace_one
+        racing_db = SimpleNamespace(outreach_queue=db.outreach_queue, send_plans=plans)
+
+        async def plan(delay, replan):
+            # The later run starts after the first has claimed, but before it stores its plan
+            await asyncio.sleep(delay)
+            return await plan_day(racing_db, TODAY, daily_quota=5, account_quotas={"alice": 5}, replan=replan)
+
+        results = []
+        for replan in (False, True):
+            returned = await asyncio.gather(plan(0, replan), plan(0.02, replan))
+            stored = await db.send_plans.find_one({"id": TODAY.isoformat()}, {"_id": 0})
+            planned = {entry["target_id"] async for entry in db.outreach_queue.find({"status": "planned"})}
+            results.append((returned, stored, planned))
+        return results
+
+    for returned, stored, planned in asyncio.run(scenario()):
+        # Both runs return the stored plan, and only its entries stay planned
+        assert returned[0]["plan_run"] == returned[1]["plan_run"] == stored["plan_run"]
+        assert {item["target_id"] for item in stored["items"]} == planned and stored["total"] == 5
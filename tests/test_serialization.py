@@ -0,0 +1,40 @@
+import json
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+from serialization import model_defaults, model_projection, rows_response
+
+
+class Row(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    status: str = "draft"
+    tags: List[str] = []
+    score: Optional[float] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = None
+
+
+def test_projection_and_defaults_follow_the_model():
+    assert model_projection(Row) == {"_id": 0, "id": 1, "name": 1, "status": 1, "tags": 1, "score": 1, "created_at": 1, "sent_at": 1}
+    assert model_defaults(Row) == (("status", "draft"), ("tags", []), ("score", None), ("sent_at", None))
+
+
+def test_rows_response_matches_the_pydantic_encoding():
+    docs = [
+        {"id": "a", "name": "Ada", "status": "sent", "tags": ["x"], "score": 0.5,
+         "created_at": datetime(2024, 5, 1, 12, 30, 1, 123000), "sent_at": datetime(2024, 5, 2)},
+        # Written before status, tags, score and sent_at existed
+        {"id": "b", "name": "Bo é", "created_at": datetime(2024, 5, 1)},
+    ]
+    expected = TypeAdapter(List[Row]).dump_python([Row(**doc) for doc in docs], mode="json")
+
+    response = rows_response(Row, [dict(doc) for doc in docs], headers={"X-Next-Cursor": "c"})
+
+    assert response.media_type == "application/json"
+    assert response.headers["x-next-cursor"] == "c"
+    assert json.loads(response.body) == expected
+    assert b'"2024-05-01T12:30:01.123000"' in response.body
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from prompts import count_tokens, message_template
+from target_context import TargetContextCache, summarize_history
+
+TARGET = {"id": "t1", "name": "Ada Lovelace", "title": "CTO", "company": "Acme", "recent_activity": "Posted about evals"}
+
+
+def message(i, message_type="follow_up", status="sent", **fields):
+    return {
+        "id": f"m{i}", "target_id": "t1", "message_type": message_type, "status": status,
+        "content": f"Message {i}: " + "thoughts on evaluation harnesses " * 20,
+        "created_at": datetime(2024, 5, i), **fields,
+    }
+
+
+def test_history_summary_stays_small_as_messages_grow():
+    counts = [
+        {"_id": {"type": "connection_request", "status": "replied"}, "count": 1,
+         "last_sent": datetime(2024, 5, 1), "last_reply": datetime(2024, 5, 3)},
+        {"_id": {"type": "follow_up", "status": "sent"}, "count": 40, "last_sent": datetime(2024, 6, 9), "last_reply": None},
+    ]
+    recent = [message(9), message(8)]
+    summary = summarize_history(counts, recent, budget=60)
+
+    lines = summary.splitlines()
+    assert lines[0] == ("41 earlier messages (1 connection_request, 40 follow_up); statuses: 1 replied, 40 sent; "
+                        "last sent 2024-06-09; replied 2024-05-03")
+    # Oldest of the recent ones first, each cut to share the budget
+    assert lines[1].startswith("- 2024-05-08 follow_up (sent): Message 8:") and lines[2].startswith("- 2024-05-09")
+    assert count_tokens("\n".join(lines[1:])) < 100
+    assert summarize_history([], [], budget=60) == ""
+
+
+def test_prompts_include_history_only_when_present():
+    template = message_template("follow_up", "v2")
+    _, without = template.render(TARGET, "follow_up")
+    _, with_history = template.render({**TARGET, "message_history": "1 earlier message (1 connection_request)"}, "follow_up")
+    assert "Earlier messages" not in without
+    assert with_history.startswith(without) and with_history.endswith("never repeat them):\n1 earlier message (1 connection_request)")
+
+    _, batch = template.render_batch([{**TARGET, "message_history": "2 earlier messages"}, {**TARGET, "id": "t2"}], "follow_up", "JSON")
+    assert batch.count("Earlier messages") == 1 and "Target id: t2" in batch
+
+
+def test_context_cache_loads_caches_and_invalidates():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["context_test"]
+        await db.targets.insert_one(dict(TARGET))
+        await db.messages.insert_many([message(1, "connection_request", "replied", replied_at=datetime(2024, 5, 2)), message(2)])
+        cache = TargetContextCache(db.targets, db.messages, recent_messages=1)
+
+        first = await cache.get("t1")
+        await db.messages.insert_one(message(3))
+        cached = await cache.get("t1")
+        cache.invalidate("t1")
+        fresh = await cache.get("t1")
+        missing = await cache.get("nobody")
+        return first, cached, fresh, missing, cache.snapshot()
+
+    first, cached, fresh, missing, snapshot = asyncio.run(scenario())
+    assert first["name"] == "Ada Lovelace" and "_id" not in first
+    assert first["message_history"].startswith("2 earlier messages (1 connection_request, 1 follow_up)")
+    assert "replied 2024-05-02" in first["message_history"] and "Message 2:" in first["message_history"]
+    assert cached == first
+    assert fresh["message_history"].startswith("3 earlier messages") and "Message 3:" in fresh["message_history"]
+    assert "Message 2:" not in fresh["message_history"]
+    assert missing is None
+    assert (snapshot["hits"], snapshot["misses"], snapshot["not_found"], snapshot["entries"]) == (1, 3, 1, 1)
+
+
+def test_message_job_for_a_missing_target_is_dead_lettered(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    # The OpenAI client is built when the server module is imported; no request reaches it
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    server = pytest.importorskip("server")
+    from job_queue import JobQueue, JobWorker
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["context_job_test"]
+        queue = JobQueue(db.jobs, max_attempts=3, base_backoff=0.01, max_backoff=0.02)
+        worker = JobWorker(queue, {"generate_message": server.run_generate_message_job}, poll_interval=0.01)
+        job = await queue.enqueue("generate_message", {"target_id": "nobody"})
+        worker.start()
+        for _ in range(200):
+            stored = await queue.collection.find_one({"id": job["id"]})
+            if stored["status"] == "dead_letter":
+                break
+            await asyncio.sleep(0.01)
+        await worker.stop()
+        return stored
+
+    contexts = server.target_contexts
+    collections = contexts.targets, contexts.messages
+    empty = mongomock_motor.AsyncMongoMockClient()["context_job_test"]
+    contexts.targets, contexts.messages = empty.targets, empty.messages
+    contexts.clear()
+    try:
+        job = asyncio.run(scenario())
+    finally:
+        contexts.targets, contexts.messages = collections
+    assert (job["status"], job["attempts"], job["last_error"]) == ("dead_letter", 1, "Target not found")
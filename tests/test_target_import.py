@@ -0,0 +1,98 @@
+import asyncio
+import io
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from target_import import detect_format, import_targets, iter_rows
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+class Lead(BaseModel):
+    name: str
+    title: str
+    company: str
+    linkedin_url: str
+    location: str = "India"
+    email: Optional[str] = None
+
+
+def test_detect_format():
+    assert detect_format("leads.CSV") == "csv"
+    assert detect_format("leads.ndjson") == "jsonl"
+    assert detect_format("upload", "jsonl") == "jsonl"
+    with pytest.raises(ValueError):
+        detect_format("leads.xlsx")
+
+
+def test_csv_rows_keep_quoted_newlines_and_row_numbers():
+    data = 'name,title,company,linkedin_url\n"Ann","Head\nof ML",Acme,u1\nBob,CTO,Beta,u2\n'
+    rows = list(iter_rows(io.StringIO(data, newline=""), "csv"))
+    assert rows[0] == (2, {"name": "Ann", "title": "Head\nof ML", "company": "Acme", "linkedin_url": "u1"})
+    assert rows[1][1]["name"] == "Bob"
+
+
+def test_import_upserts_dedupes_and_reports_errors():
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["test"]["targets"]
+        await collection.insert_one({"id": "existing", "linkedin_url": "u1", "name": "Old", "location": "Pune"})
+        lines = io.StringIO(
+            '{"name": "Ann", "title": "CTO", "company": "Acme", "linkedin_url": "u1"}\n'
+            '{"name": "Bob", "title": "VP", "company": "Beta", "linkedin_url": "u2"}\n'
+            '{"name": "Bobby", "title": "VP", "company": "Beta", "linkedin_url": "u2"}\n'
+            '{"title": "VP", "company": "Beta", "linkedin_url": "u3"}\n'
+            'not json\n'
+            '{"name": "Cy", "title": "ML", "company": "Gamma", "linkedin_url": "u4", "email": ""}\n'
+        )
+        report = await import_targets(collection, iter_rows(lines, "jsonl"), Lead, chunk_size=3)
+        docs = {doc["linkedin_url"]: doc async for doc in collection.find({}, {"_id": 0})}
+        return report, docs
+
+    report, docs = asyncio.run(scenario())
+    assert report["total_rows"] == 6
+    assert report["failed"] == 2
+    assert [error["row"] for error in report["errors"]] == [4, 5]
+    assert report["errors"][0]["errors"] == ["name: Field required"]
+    assert report["inserted"] == 2
+    assert report["updated"] == 1
+    assert report["duplicates"] == 1
+    # Existing target keeps its id and location; new ones get defaults
+    assert docs["u1"]["id"] == "existing"
+    assert docs["u1"]["name"] == "Ann"
+    assert docs["u1"]["location"] == "Pune"
+    assert docs["u2"]["name"] == "Bobby"
+    assert docs["u4"]["location"] == "India"
+    assert docs["u4"]["connection_status"] == "not_connected"
+    assert docs["u4"]["email"] is None
+
+
+def test_upsert_that_loses_an_insert_race_is_retried_as_an_update():
+    from pymongo.errors import BulkWriteError
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["test"]["targets"]
+        bulk_write = collection.bulk_write
+
+        async def racing_bulk_write(operations, ordered=True):
+            if not racing_bulk_write.raced:
+                racing_bulk_write.raced = True
+                # Another writer inserts u1 first; our upsert of it fails on the unique index, u2 goes in
+                await collection.insert_one({"id": "other", "linkedin_url": "u1", "name": "Other"})
+                await bulk_write(operations[1:], ordered=ordered)
+                raise BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000"}], "nUpserted": 1, "nMatched": 0})
+            return await bulk_write(operations, ordered=ordered)
+
+        racing_bulk_write.raced = False
+        collection.bulk_write = racing_bulk_write
+        lines = io.StringIO(
+            '{"name": "Ann", "title": "CTO", "company": "Acme", "linkedin_url": "u1"}\n'
+            '{"name": "Bob", "title": "VP", "company": "Beta", "linkedin_url": "u2"}\n'
+        )
+        report = await import_targets(collection, iter_rows(lines, "jsonl"), Lead)
+        return report, await collection.find_one({"linkedin_url": "u1"}), await collection.count_documents({})
+
+    report, u1, count = asyncio.run(scenario())
+    assert (report["inserted"], report["updated"], count) == (1, 1, 2)
+    assert u1["id"] == "other" and u1["name"] == "Ann"
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from target_search import TargetSearchIndex, build_search_index, fetch_ranked, prefix_edit_distance, words
+
+TARGETS = [
+    {"id": "t1", "name": "Priya Raman", "title": "Head of Machine Learning", "company": "Stripe", "location": "Dublin"},
+    {"id": "t2", "name": "José Martínez", "title": "ML Engineer", "company": "Datadog", "location": "Madrid"},
+    {"id": "t3", "name": "Machiko Sato", "title": "Recruiter", "company": "Mercari", "location": "Tokyo"},
+    {"id": "t4", "name": "Sam Stripe", "title": "Staff Engineer", "company": "Acme", "location": "Dublin",
+     "profile_summary": "Previously machine learning platform at Stripe"},
+]
+
+
+def index_of(targets):
+    index = TargetSearchIndex()
+    index.add_many(targets)
+    return index
+
+
+def ids(hits):
+    return [doc_id for doc_id, _ in hits]
+
+
+def test_words_fold_case_and_accents():
+    assert words("José MARTÍNEZ, ML-Engineer") == ["jose", "martinez", "ml", "engineer"]
+    assert prefix_edit_distance("machne", "machine", 1) == 1
+    assert prefix_edit_distance("mach", "machine", 1) == 0
+    assert prefix_edit_distance("zzzz", "machine", 1) == 2
+
+
+def test_prefix_typo_and_accent_matches():
+    index = index_of(TARGETS)
+    assert ids(index.search("mart")) == ["t2"]
+    assert ids(index.search("martinez")) == ids(index.search("Martínez")) == ["t2"]
+    # One typo, and a prefix of the misspelt word while typing
+    assert ids(index.search("Datdog")) == ["t2"]
+    assert ids(index.search("recuiter")) == ids(index.search("recuit")) == ["t3"]
+    assert index.search("qqqq") == [] and index.search("  ") == []
+
+
+def test_every_word_must_match_and_field_weights_rank():
+    index = index_of(TARGETS)
+    assert ids(index.search("stripe dublin")) == ["t4", "t1"]
+    # A name match (weight 3) outranks a company match (2) for the same word
+    hits = index.search("stripe")
+    assert ids(hits) == ["t4", "t1"] and hits[0][1] > hits[1][1]
+    # An exact word outranks a longer word it prefixes
+    assert ids(index.search("machi"))[:2] == ["t3", "t1"]
+    assert ids(index.search("machine learning")) == ["t1", "t4"]
+    assert ids(index.search("dublin", limit=1)) == ["t1"]
+
+
+def test_updates_replace_the_indexed_version():
+    index = index_of(TARGETS)
+    index.add({**TARGETS[2], "company": "Mercari", "title": "Recruiter"})
+    assert index.stats["replaced"] == 0
+    index.add({**TARGETS[2], "title": "Engineering Manager", "company": "Rakuten"})
+    assert index.search("recruiter") == [] and ids(index.search("rakuten")) == ["t3"]
+    index.remove("t3")
+    assert index.search("rakuten") == []
+    snapshot = index.snapshot()
+    assert (snapshot["targets"], snapshot["rows"], snapshot["replaced"], snapshot["removed"]) == (3, 5, 1, 1)
+
+
+def test_dead_rows_are_compacted_away():
+    index = TargetSearchIndex(compact_fraction=0.5, compact_min_rows=2)
+    index.add_many(TARGETS)
+    index.add({**TARGETS[2], "title": "Engineering Manager", "company": "Rakuten"})
+    assert index.stats["compactions"] == 0
+    index.remove("t2")
+    snapshot = index.snapshot()
+    assert (snapshot["targets"], snapshot["rows"], snapshot["compactions"]) == (3, 5, 0)
+
+    index.add({**TARGETS[0], "location": "London"})
+    snapshot = index.snapshot()
+    # 3 of 6 rows were dead: only the live ones are left, renumbered, and words only they used are gone
+    assert (snapshot["targets"], snapshot["rows"], snapshot["compactions"]) == (3, 3, 1)
+    assert index.ids == ["t4", "t3", "t1"] and index.rows == {"t4": 0, "t3": 1, "t1": 2}
+    assert "martinez" not in index.vocabulary and "recruiter" not in index.vocabulary
+    assert ids(index.search("stripe")) == ["t4", "t1"] and ids(index.search("rakuten")) == ["t3"]
+    assert ids(index.search("lond")) == ["t1"] and index.search("dublin machine") == [("t4", 2.0)]
+    assert index.search("mart") == [] and ids(index.search("Datdog")) == []
+    index.add(TARGETS[1])
+    assert ids(index.search("martinez")) == ["t2"] and index.rows["t2"] == 3
+
+
+def test_build_search_index_and_fetch_ranked():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["search_test"].targets
+        await collection.insert_many([dict(target) for target in TARGETS])
+        index = TargetSearchIndex()
+        loaded = await build_search_index(collection, index, batch_size=2)
+        docs = await fetch_ranked(collection, index.search("dublin"), {"_id": 0, "id": 1, "name": 1})
+        return loaded, docs
+
+    loaded, docs = asyncio.run(scenario())
+    assert loaded == 4
+    assert [(doc["id"], doc["name"]) for doc in docs] == [("t1", "Priya Raman"), ("t4", "Sam Stripe")]
+    assert docs[0]["score"] == docs[1]["score"] == 1.0
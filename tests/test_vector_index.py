@@ -0,0 +1,130 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+import pytest
+
+from vector_index import HashingEmbedder, VectorIndex, sync_index, text_fingerprint
+
+POSTS = {
+    "eval": ("How we evaluate LLM outputs with rubrics and golden sets", 40),
+    "eval-prod": ("Evaluating language models in production", 5),
+    "hiring": ("Hiring ML engineers: what we look for in interviews", 900),
+    "gpu": ("GPU shortages and what they mean for startups", 30),
+}
+
+
+def embed(embedder, texts):
+    return asyncio.run(embedder.embed(texts))
+
+
+def build(path=None):
+    embedder = HashingEmbedder()
+    index = VectorIndex(path, embedder.dim, embedder.name, initial_capacity=2)
+    ids = list(POSTS)
+    texts = [POSTS[i][0] for i in ids]
+    index.add(ids, embed(embedder, texts), [POSTS[i][1] for i in ids], [text_fingerprint(text) for text in texts])
+    return embedder, index
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = HashingEmbedder(dim=64)
+    first, second = embed(embedder, ["LLM evaluation", "LLM evaluation"])
+    assert np.array_equal(first, second)
+    assert np.linalg.norm(first) == pytest.approx(1.0)
+    assert embed(embedder, [""]).shape == (1, 64)
+
+
+def test_search_ranks_by_similarity_and_can_blend_engagement():
+    embedder, index = build()
+    query = embed(embedder, ["evaluating LLMs"])[0]
+
+    assert {doc_id for doc_id, _ in index.search(query, k=2)} == {"eval", "eval-prod"}
+    # A strong engagement weight pulls the most engaging post up the ranking
+    assert index.search(query, k=1, engagement_weight=0.9)[0][0] == "hiring"
+    assert len(index.search(query, k=10)) == len(POSTS)
+
+
+def test_index_persists_grows_and_upserts(tmp_path):
+    embedder, index = build(tmp_path / "viral_posts")
+    assert len(index.vectors) >= len(POSTS)
+
+    reopened = VectorIndex(tmp_path / "viral_posts", embedder.dim, embedder.name)
+    assert reopened.ids == index.ids
+    query = embed(embedder, ["GPU shortage"])[0]
+    assert reopened.search(query, k=1)[0][0] == "gpu"
+
+    reopened.add(["gpu"], embed(embedder, ["Kubernetes operators for ML"]), [1])
+    assert len(reopened) == len(POSTS)
+    assert reopened.search(embed(embedder, ["kubernetes operators"])[0], k=1)[0][0] == "gpu"
+
+    # A different embedder cannot reuse the stored vectors
+    assert len(VectorIndex(tmp_path / "viral_posts", 64, "hashing-64")) == 0
+
+
+def test_sync_index_only_embeds_missing_documents():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["viral_posts"]
+    embedder, index = build()
+
+    async def scenario():
+        await collection.insert_many([
+            {"id": doc_id, "original_content": text, "engagement_score": score}
+            for doc_id, (text, score) in {**POSTS, "new": ("Fine-tuning small models", 12)}.items()
+        ])
+        return await sync_index(collection, index, embedder, "original_content", "engagement_score", batch_size=2)
+
+    assert asyncio.run(scenario()) == 1
+    assert "new" in index
+
+
+def test_sync_index_reembeds_changed_text_and_refreshes_weights():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["viral_posts"]
+    embedder = HashingEmbedder()
+    index = VectorIndex(None, embedder.dim, embedder.name)
+
+    async def scenario():
+        await collection.insert_many([
+            {"id": doc_id, "original_content": text, "engagement_score": score} for doc_id, (text, score) in POSTS.items()
+        ])
+        first = await sync_index(collection, index, embedder, "original_content", "engagement_score")
+        await collection.update_one({"id": "gpu"}, {"$set": {"original_content": "Kubernetes operators for ML"}})
+        await collection.update_one({"id": "eval"}, {"$set": {"engagement_score": 5000}})
+        second = await sync_index(collection, index, embedder, "original_content", "engagement_score")
+        return first, second
+
+    assert asyncio.run(scenario()) == (4, 1)
+    assert index.search(embed(embedder, ["kubernetes operators"])[0], k=1)[0][0] == "gpu"
+    assert index.fingerprint("gpu") == text_fingerprint("Kubernetes operators for ML")
+    assert index.weights[index.positions["eval"]] == 5000
+
+
+def test_flush_appends_only_new_ids_and_discards_other_formats(tmp_path):
+    embedder = HashingEmbedder()
+    path = tmp_path / "viral_posts"
+    index = VectorIndex(path, embedder.dim, embedder.name, initial_capacity=2)
+    index.add(["a", "b"], embed(embedder, ["first", "second"]), [1, 2])
+    index.add(["c"], embed(embedder, ["third"]), [3], flush=False)
+    assert path.with_suffix(".ids").read_text() == "a\nb\n"
+    index.flush()
+    assert path.with_suffix(".ids").read_text() == "a\nb\nc\n"
+    assert VectorIndex(path, embedder.dim, embedder.name).weights.tolist() == [1, 2, 3]
+
+    # A header from another format is not trusted: the index starts empty and is rebuilt
+    path.with_suffix(".json").write_text(json.dumps({"format": 1, "embedder": embedder.name, "dim": embedder.dim}))
+    assert len(VectorIndex(path, embedder.dim, embedder.name)) == 0
+    assert path.with_suffix(".ids").read_text() == ""
+
+
+def test_search_over_many_posts_takes_milliseconds():
+    index = VectorIndex(None, 256, "random", initial_capacity=16)
+    rng = np.random.default_rng(0)
+    index.add([str(i) for i in range(20000)], rng.standard_normal((20000, 256)), rng.integers(0, 1000, 20000))
+    query = rng.standard_normal(256)
+
+    started = time.perf_counter()
+    for _ in range(10):
+        index.search(query, k=5, engagement_weight=0.2)
+    assert (time.perf_counter() - started) / 10 < 0.05